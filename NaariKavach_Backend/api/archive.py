@@ -0,0 +1,109 @@
+import time
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import (
+    ArchivedLocationUpdate, ArchivedOfficerAssignment, ArchivedSOS, ArchivedSOSImage, ArchivedTrackSegment,
+    LocationTrackSegment, LocationUpdate, OfficerAssignment, SOS, SOSImage, SOSImageUpload
+)
+
+# Hot model -> archive model for the children of one SOS, copied parents first
+ARCHIVED_CHILDREN = (
+    (OfficerAssignment, ArchivedOfficerAssignment),
+    (LocationUpdate, ArchivedLocationUpdate),
+    (LocationTrackSegment, ArchivedTrackSegment),
+    (SOSImage, ArchivedSOSImage),
+)
+
+
+def _copy_rows(queryset, archive_model, chunk_size=1000, **extra):
+    """
+    Insert the rows of ``queryset`` into ``archive_model``, keeping their
+    ids. Rows are streamed and inserted ``chunk_size`` at a time, so memory
+    does not grow with the number of rows.
+    """
+    fields = [field.attname for field in archive_model._meta.concrete_fields if field.attname not in extra]
+    rows = queryset.order_by('id').values(*fields).iterator(chunk_size=chunk_size)
+    copied = 0
+    while True:
+        chunk = [archive_model(**row, **extra) for row in islice(rows, chunk_size)]
+        if not chunk:
+            return copied
+        archive_model.objects.bulk_create(chunk)
+        copied += len(chunk)
+
+
+def _within_point_budget(sos_ids, max_points):
+    """
+    The longest prefix of ``sos_ids`` with at most ``max_points`` location
+    updates between them, and always at least the first SOS
+    """
+    counts = dict(
+        LocationUpdate.objects.filter(sos_request_id__in=sos_ids)
+        .values_list('sos_request_id').annotate(points=Count('id'))
+    )
+    total = 0
+    for index, sos_id in enumerate(sos_ids):
+        total += counts.get(sos_id, 0)
+        if index and total > max_points:
+            return sos_ids[:index]
+    return sos_ids
+
+
+def archivable_sos(older_than):
+    """Resolved SOS not updated since ``older_than``"""
+    return SOS.objects.filter(status_flag=1, updated_at__lt=older_than)
+
+
+def archive_batch(older_than, batch_size, max_points=None):
+    """
+    Move up to ``batch_size`` archivable SOS and their children to the
+    archive tables in one transaction. Rows another transaction has locked
+    are skipped rather than waited for. With ``max_points``, the batch stops
+    early once its SOS hold that many location updates between them, so a
+    few long tracks do not make one huge transaction. Returns the number of
+    SOS moved.
+    """
+    with transaction.atomic():
+        sos_ids = list(
+            archivable_sos(older_than).select_for_update(skip_locked=True)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not sos_ids:
+            return 0
+        if max_points:
+            sos_ids = _within_point_budget(sos_ids, max_points)
+        _copy_rows(SOS.objects.filter(id__in=sos_ids), ArchivedSOS, archived_at=timezone.now())
+        for model, archive_model in ARCHIVED_CHILDREN:
+            _copy_rows(model.objects.filter(sos_request_id__in=sos_ids), archive_model)
+
+        # The archived images now hold the file references; clearing the
+        # name stops the delete signal from releasing them
+        SOSImage.objects.filter(sos_request_id__in=sos_ids).update(image='')
+        for upload in SOSImageUpload.objects.filter(sos_request_id__in=sos_ids):
+            upload.delete()
+        # Cascades to the hot children and leaves sync tombstones
+        SOS.objects.filter(id__in=sos_ids).delete()
+    return len(sos_ids)
+
+
+def archive_resolved(older_than, batch_size=100, limit=None, pause=0, max_points=None):
+    """
+    Archive resolved SOS in batches of ``batch_size`` (and at most
+    ``max_points`` location updates) until none are left or ``limit`` have
+    been moved, sleeping ``pause`` seconds between batches. Returns the
+    number of SOS moved.
+    """
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        moved = archive_batch(older_than, size, max_points)
+        archived += moved
+        if not moved:
+            break
+        if pause:
+            time.sleep(pause)
+    return archived
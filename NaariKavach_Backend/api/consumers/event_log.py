@@ -0,0 +1,353 @@
+import collections
+import hashlib
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one server per directory is up to the operator
+    fcntl = None
+
+# Every record is a (seq, payload length) header followed by a JSON payload
+RECORD_HEADER = struct.Struct('<QI')
+
+
+class ChannelLog:
+    """
+    Append-only log of one channel split into two segment files: the active
+    segment and the previous one. When the active segment grows past the
+    size limit it replaces the previous segment, so disk use per channel is
+    bounded at roughly twice the segment size.
+
+    Sequence numbers are contiguous within a segment, so the in-memory
+    index is just one file offset per record.
+    """
+    __slots__ = ('path', 'previous_path', 'next_seq', 'first_seq', 'offsets',
+                 'previous_first_seq', 'previous_offsets', 'size', 'last_used')
+
+    def __init__(self, path):
+        self.path = path
+        self.last_used = time.monotonic()
+        self.previous_path = path + '.1'
+        self.previous_first_seq, self.previous_offsets, _, _ = self._scan(self.previous_path, truncate=False)
+        self.first_seq, self.offsets, self.size, last_seq = self._scan(self.path, truncate=True)
+        if last_seq is None and self.previous_offsets:
+            last_seq = self.previous_first_seq + len(self.previous_offsets) - 1
+        self.next_seq = (last_seq or 0) + 1
+        if not self.offsets:
+            self.first_seq = self.next_seq
+
+    @staticmethod
+    def _scan(path, truncate):
+        """Index a segment file, cutting off a torn record left by a crash"""
+        offsets = array('Q')
+        first_seq = last_seq = None
+        if not os.path.exists(path):
+            return first_seq, offsets, 0, last_seq
+        with open(path, 'r+b') as handle:
+            offset = 0
+            while True:
+                header = handle.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                seq, length = RECORD_HEADER.unpack(header)
+                if len(handle.read(length)) < length:
+                    break
+                if first_seq is None:
+                    first_seq = seq
+                offsets.append(offset)
+                last_seq = seq
+                offset += RECORD_HEADER.size + length
+            if truncate:
+                handle.truncate(offset)
+        return first_seq, offsets, offset, last_seq
+
+    def oldest_seq(self):
+        if self.previous_offsets:
+            return self.previous_first_seq
+        return self.first_seq
+
+    def rotate(self):
+        os.replace(self.path, self.previous_path)
+        self.previous_first_seq = self.first_seq
+        self.previous_offsets = self.offsets
+        self.first_seq = self.next_seq
+        self.offsets = array('Q')
+        self.size = 0
+
+    def read_from(self, seq, limit):
+        """Records with sequence >= seq, oldest first, at most ``limit``"""
+        records = []
+        segments = (
+            (self.previous_path, self.previous_first_seq, self.previous_offsets),
+            (self.path, self.first_seq, self.offsets),
+        )
+        for path, first_seq, offsets in segments:
+            if not offsets or seq >= first_seq + len(offsets):
+                continue
+            start = max(seq - first_seq, 0)
+            with open(path, 'rb') as handle:
+                handle.seek(offsets[start])
+                for _ in range(start, len(offsets)):
+                    if len(records) >= limit:
+                        return records
+                    record_seq, length = RECORD_HEADER.unpack(handle.read(RECORD_HEADER.size))
+                    records.append((record_seq, json.loads(handle.read(length))))
+        return records
+
+
+class EventLog:
+    """
+    Sequenced, disk-backed event log per Socket.IO room/channel.
+
+    append() assigns the next sequence number of the channel and writes the
+    event to the channel's active segment; replay() returns the events a
+    client missed after the last sequence number it saw.
+
+    Sequence numbers are only meaningful to the process that owns the
+    directory, so it is locked for as long as the log is open; a second
+    process pointed at it fails to start instead of interleaving sequences.
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, max_open_files=256):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_open_files = max_open_files
+        self._channels = {}
+        self._handles = collections.OrderedDict()  # LRU of open append handles
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._directory_lock = self._lock_directory(directory)
+
+    @staticmethod
+    def _lock_directory(directory):
+        if fcntl is None:
+            return None
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(f'Event log {directory} is in use by another process; give each server its own EVENT_LOG_DIR')
+        return fd
+
+    def close(self):
+        """Close every file and release the directory"""
+        with self._lock:
+            for path in list(self._handles):
+                self._close(path)
+            self._channels.clear()
+            if self._directory_lock is not None:
+                os.close(self._directory_lock)
+                self._directory_lock = None
+
+    def _path(self, channel):
+        # Channel names come from clients, so keep them filesystem safe
+        safe = re.sub(r'[^A-Za-z0-9_-]', '_', channel)[:80]
+        digest = hashlib.sha1(channel.encode()).hexdigest()[:8]
+        return os.path.join(self.directory, f'{safe}-{digest}.log')
+
+    def _channel(self, channel):
+        log = self._channels.get(channel)
+        if log is None:
+            log = self._channels[channel] = ChannelLog(self._path(channel))
+        log.last_used = time.monotonic()
+        return log
+
+    def _handle(self, log):
+        handle = self._handles.get(log.path)
+        if handle is None:
+            handle = self._handles[log.path] = open(log.path, 'ab')
+            if len(self._handles) > self.max_open_files:
+                _, oldest = self._handles.popitem(last=False)
+                oldest.close()
+        else:
+            self._handles.move_to_end(log.path)
+        return handle
+
+    def _close(self, path):
+        handle = self._handles.pop(path, None)
+        if handle is not None:
+            handle.close()
+
+    def append(self, channel, event, data):
+        """Log an event and return its sequence number within the channel"""
+        payload = json.dumps({'event': event, 'data': data}, separators=(',', ':'), default=str).encode()
+        with self._lock:
+            log = self._channel(channel)
+            if log.size and log.size + RECORD_HEADER.size + len(payload) > self.segment_bytes:
+                self._close(log.path)
+                log.rotate()
+            seq = log.next_seq
+            handle = self._handle(log)
+            handle.write(RECORD_HEADER.pack(seq, len(payload)))
+            handle.write(payload)
+            handle.flush()
+            log.offsets.append(log.size)
+            log.size += RECORD_HEADER.size + len(payload)
+            log.next_seq += 1
+        return seq
+
+    def latest_seq(self, channel):
+        with self._lock:
+            return self._channel(channel).next_seq - 1
+
+    def replay(self, channel, last_seq, limit=1000):
+        """
+        Events after ``last_seq`` as (seq, event, data) tuples, plus whether
+        the gap could be filled completely. It is only complete when this
+        log still holds ``last_seq + 1``, or that is the next sequence number
+        to be assigned, and at most ``limit`` events were missed. Otherwise
+        (rotated away, a dropped or foreign log) the client should fall
+        back to a full REST reload.
+        """
+        with self._lock:
+            log = self._channel(channel)
+            complete = log.oldest_seq() <= last_seq + 1 <= log.next_seq
+            # Flush pending writes before reading the files back
+            handle = self._handles.get(log.path)
+            if handle is not None:
+                handle.flush()
+            records = log.read_from(last_seq + 1, limit)
+            if records and records[-1][0] < log.next_seq - 1:
+                complete = False
+        return [(seq, record['event'], record['data']) for seq, record in records], complete
+
+    def drop(self, channel):
+        """Delete a channel's log, e.g. once its SOS is resolved"""
+        with self._lock:
+            log = self._channels.pop(channel, None)
+            path = log.path if log else self._path(channel)
+            self._close(path)
+            for segment in (path, path + '.1'):
+                if os.path.exists(segment):
+                    os.remove(segment)
+
+    def release_idle(self, idle_seconds, now=None):
+        """
+        Close files and forget the in-memory index of channels unused for
+        ``idle_seconds``. Their logs stay on disk and are re-indexed on the
+        next access. Returns how many channels were released.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [name for name, log in self._channels.items() if now - log.last_used > idle_seconds]
+            for name in idle:
+                self._close(self._channels.pop(name).path)
+        return len(idle)
+
+
+class DatabaseEventLog:
+    """
+    EventLog with the same interface, kept in the SocketEvent table for
+    servers sharing a message queue. A room broadcast is sequenced once, by
+    the server that emits it, and a client can replay the gap from any
+    server. Events older than ``retention`` seconds are pruned by
+    release_idle(), except the newest of each channel so sequence numbers
+    keep counting up.
+    """
+
+    def __init__(self, retention=3600, attempts=5):
+        self.retention = retention
+        self.attempts = attempts
+
+    def append(self, channel, event, data):
+        from django.db import IntegrityError, transaction
+        from django.db.models import Max
+        from api.models import SocketEvent
+
+        data = json.loads(json.dumps(data, default=str))
+        for attempt in range(self.attempts):
+            seq = (SocketEvent.objects.filter(channel=channel).aggregate(seq=Max('seq'))['seq'] or 0) + 1
+            try:
+                with transaction.atomic():
+                    SocketEvent.objects.create(channel=channel, seq=seq, event=event, data=data)
+                return seq
+            except IntegrityError:
+                # Another server took this number first
+                if attempt == self.attempts - 1:
+                    raise
+
+    def latest_seq(self, channel):
+        from django.db.models import Max
+        from api.models import SocketEvent
+        return SocketEvent.objects.filter(channel=channel).aggregate(seq=Max('seq'))['seq'] or 0
+
+    def replay(self, channel, last_seq, limit=1000):
+        """See EventLog.replay()"""
+        from api.models import SocketEvent
+
+        rows = list(
+            SocketEvent.objects.filter(channel=channel, seq__gt=last_seq)
+            .order_by('seq').values_list('seq', 'event', 'data')[:limit + 1]
+        )
+        if len(rows) > limit:
+            return rows[:limit], False
+        if rows:
+            return rows, rows[0][0] == last_seq + 1
+        return rows, last_seq <= self.latest_seq(channel)
+
+    def drop(self, channel):
+        from api.models import SocketEvent
+        SocketEvent.objects.filter(channel=channel).delete()
+
+    def release_idle(self, idle_seconds=None, now=None):
+        """Prune events past the retention period; returns how many went"""
+        from django.db.models import OuterRef, Subquery
+        from django.utils import timezone
+        from api.models import SocketEvent
+
+        newest = SocketEvent.objects.filter(channel=OuterRef('channel')).order_by('-seq').values('seq')[:1]
+        deleted, _ = (
+            SocketEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=self.retention))
+            .exclude(seq=Subquery(newest)).delete()
+        )
+        return deleted
+
+    def close(self):
+        pass
+
+
+def build_event_log(message_queue=''):
+    """
+    Event log for a Socket.IO server, configured from the environment. With
+    a message queue, clients may reconnect to any server, so sequence
+    numbers come from the database (DatabaseEventLog). A lone server logs
+    to disk, in EVENT_LOG_DIR or event_log/<host>-<port> beside the project.
+    """
+    if message_queue:
+        return DatabaseEventLog(retention=int(os.environ.get('EVENT_LOG_RETENTION', 3600)))
+    directory = os.environ.get('EVENT_LOG_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        'event_log', f"{socket.gethostname()}-{os.environ.get('PORT', 8001)}"
+    )
+    return EventLog(directory, segment_bytes=int(os.environ.get('EVENT_LOG_SEGMENT_BYTES', 4 * 1024 * 1024)))
+
+
+class NullEventLog:
+    """EventLog of a server that keeps no history: every event is seq 0 and a reconnect has nothing to replay"""
+
+    def append(self, channel, event, data):
+        return 0
+
+    def latest_seq(self, channel):
+        return 0
+
+    def replay(self, channel, last_seq, limit=1000):
+        return [], False
+
+    def drop(self, channel):
+        pass
+
+    def release_idle(self, idle_seconds=None, now=None):
+        return 0
+
+    def close(self):
+        pass
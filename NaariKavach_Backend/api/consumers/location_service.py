@@ -0,0 +1,263 @@
+import threading
+import time
+from array import array
+from datetime import datetime, timezone as dt_timezone
+
+from api.geo import haversine_m
+
+
+def parse_timestamp(value):
+    """ISO 8601 string (as emitted by the API) to epoch seconds, or None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def format_timestamp(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc).isoformat()
+
+
+class LocationRing:
+    """
+    Fixed-capacity ring buffer of location points for one SOS room.
+
+    Points live in three parallel typed arrays (8 bytes per value) instead
+    of one dict per point, and the oldest point is overwritten once the
+    buffer is full.
+    """
+    __slots__ = ('capacity', 'sos_id', 'last_active', '_lat', '_lon', '_ts', '_start', '_size')
+
+    def __init__(self, capacity, sos_id=None):
+        self.capacity = capacity
+        self.sos_id = sos_id
+        self.last_active = time.monotonic()
+        self._lat = array('d', bytes(8 * capacity))
+        self._lon = array('d', bytes(8 * capacity))
+        self._ts = array('d', bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, latitude, longitude, timestamp):
+        index = (self._start + self._size) % self.capacity
+        self._lat[index] = latitude
+        self._lon[index] = longitude
+        self._ts[index] = timestamp
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+        self.last_active = time.monotonic()
+
+    def points(self, after=None):
+        """Points oldest first as (latitude, longitude, epoch_seconds) tuples"""
+        result = []
+        for offset in range(self._size):
+            index = (self._start + offset) % self.capacity
+            if after is not None and self._ts[index] <= after:
+                continue
+            result.append((self._lat[index], self._lon[index], self._ts[index]))
+        return result
+
+    def nbytes(self):
+        return 3 * self._lat.itemsize * self.capacity
+
+
+class LocationHistoryStore:
+    """
+    Recent location history per SOS room with bounded memory: each room
+    keeps at most ``capacity`` points, rooms idle for ``idle_ttl`` seconds
+    are dropped by evict_idle(), and a resolved SOS is dropped with evict().
+    """
+
+    def __init__(self, capacity=200, idle_ttl=3600):
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl
+        self._rooms = {}  # {room_id: LocationRing}
+        self._lock = threading.Lock()
+        self._evicted_rooms = 0
+
+    def __contains__(self, room_id):
+        return room_id in self._rooms
+
+    def append(self, room_id, sos_id, latitude, longitude, timestamp=None):
+        """Record a point; returns False if the coordinates are unusable"""
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (TypeError, ValueError):
+            return False
+        epoch = parse_timestamp(timestamp)
+        if epoch is None:
+            epoch = time.time()
+        with self._lock:
+            ring = self._rooms.get(room_id)
+            if ring is None:
+                ring = self._rooms[room_id] = LocationRing(self.capacity, sos_id)
+            if sos_id is not None:
+                ring.sos_id = sos_id
+            ring.append(latitude, longitude, epoch)
+        return True
+
+    def history(self, room_id):
+        """Room history oldest first, in the same dict shape as live updates"""
+        ring = self._rooms.get(room_id)
+        if ring is None:
+            return []
+        with self._lock:
+            points = ring.points()
+            sos_id = ring.sos_id
+        return [
+            {
+                'sos_id': sos_id,
+                'latitude': latitude,
+                'longitude': longitude,
+                'timestamp': format_timestamp(epoch)
+            }
+            for latitude, longitude, epoch in points
+        ]
+
+    def evict(self, room_id):
+        with self._lock:
+            if self._rooms.pop(room_id, None) is not None:
+                self._evicted_rooms += 1
+                return True
+        return False
+
+    def evict_idle(self, now=None):
+        """Drop rooms without updates for idle_ttl seconds; returns how many"""
+        if not self.idle_ttl:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [room_id for room_id, ring in self._rooms.items() if now - ring.last_active > self.idle_ttl]
+            for room_id in idle:
+                del self._rooms[room_id]
+            self._evicted_rooms += len(idle)
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            rings = list(self._rooms.values())
+            evicted = self._evicted_rooms
+        return {
+            'rooms': len(rings),
+            'points': sum(len(ring) for ring in rings),
+            'capacity_per_room': self.capacity,
+            'buffer_bytes': sum(ring.nbytes() for ring in rings),
+            'evicted_rooms': evicted,
+        }
+
+
+class BroadcastThrottle:
+    """
+    Filter for live location broadcasts, one stream per SOS room or unit.
+
+    offer() returns the update to broadcast now, or None. Points within
+    ``deadband_m`` metres of the last broadcast position are not sent, and
+    a stream is broadcast at most once per ``min_interval`` seconds: points
+    arriving in between replace the stream's pending update (latest wins)
+    and due() hands it out once the interval has passed. Only broadcasts
+    are filtered; callers still store every point. due() also drops streams
+    with nothing pending that have not broadcast for ``idle_ttl`` seconds,
+    so rooms and units that go quiet do not accumulate.
+    """
+
+    def __init__(self, deadband_m=5, min_interval=1.0, idle_ttl=300, clock=time.monotonic):
+        self.deadband_m = deadband_m
+        self.min_interval = min_interval
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._streams = {}  # {key: [latitude, longitude, sent_at, pending update]}
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.sent = 0
+        self.suppressed = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    def offer(self, key, latitude, longitude, update):
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (TypeError, ValueError):
+            return update  # nothing to filter on, pass it through
+        now = self.clock()
+        with self._lock:
+            self.offered += 1
+            stream = self._streams.get(key)
+            if stream is None:
+                self._streams[key] = [latitude, longitude, now, None]
+                self.sent += 1
+                return update
+            if self.deadband_m and haversine_m(stream[0], stream[1], latitude, longitude) < self.deadband_m:
+                # Back near the last broadcast position: any pending move is stale too
+                if stream[3] is not None:
+                    self.coalesced += 1
+                    stream[3] = None
+                self.suppressed += 1
+                return None
+            if now - stream[2] >= self.min_interval:
+                stream[:] = [latitude, longitude, now, None]
+                self.sent += 1
+                return update
+            if stream[3] is not None:
+                self.coalesced += 1
+            stream[3] = (latitude, longitude, update)
+            return None
+
+    def due(self):
+        """Pending updates whose interval has passed, as (key, update) pairs"""
+        now = self.clock()
+        ready = []
+        idle = []
+        with self._lock:
+            for key, stream in self._streams.items():
+                if stream[3] is not None:
+                    if now - stream[2] >= self.min_interval:
+                        latitude, longitude, update = stream[3]
+                        stream[:] = [latitude, longitude, now, None]
+                        ready.append((key, update))
+                elif self.idle_ttl and now - stream[2] > self.idle_ttl:
+                    idle.append(key)
+            for key in idle:
+                del self._streams[key]
+            self.sent += len(ready)
+            self.evicted += len(idle)
+        return ready
+
+    def mark_sent(self, key, latitude, longitude):
+        """Record a broadcast made outside offer(), e.g. a batch, dropping what is pending"""
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._streams[key] = [latitude, longitude, self.clock(), None]
+
+    def forget(self, key):
+        """Drop a stream's state, returning its pending update (if any) so it can be flushed"""
+        with self._lock:
+            stream = self._streams.pop(key, None)
+        if stream is None or stream[3] is None:
+            return None
+        self.sent += 1
+        return stream[3][2]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': len(self._streams),
+                'pending': sum(1 for stream in self._streams.values() if stream[3] is not None),
+                'offered': self.offered,
+                'sent': self.sent,
+                'suppressed': self.suppressed,
+                'coalesced': self.coalesced,
+                'evicted': self.evicted,
+            }
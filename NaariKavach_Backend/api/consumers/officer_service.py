@@ -0,0 +1,283 @@
+import heapq
+import math
+import threading
+import time
+
+from api.geo import EARTH_RADIUS_M, haversine_m
+
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+class UnitPosition:
+    __slots__ = ('unit_number', 'latitude', 'longitude', 'available', 'updated_at', 'cell')
+
+    def __init__(self, unit_number, latitude, longitude, available, updated_at, cell):
+        self.unit_number = unit_number
+        self.latitude = latitude
+        self.longitude = longitude
+        self.available = available
+        self.updated_at = updated_at
+        self.cell = cell
+
+
+class UnitLocationIndex:
+    """
+    Latest known position and availability of every officer unit, bucketed
+    into a uniform lat/lon grid.
+
+    Nearest-unit queries search outwards ring by ring from the query cell and
+    stop as soon as no unvisited cell can hold anything closer than the k-th
+    best candidate, so a lookup only touches units near the query point.
+    """
+
+    def __init__(self, cell_size_deg=0.05, max_age_seconds=300, max_rings=64):
+        self.cell_size_deg = cell_size_deg
+        self.max_age_seconds = max_age_seconds
+        self.max_rings = max_rings
+        self._units = {}  # {unit_number: UnitPosition}
+        self._cells = {}  # {(row, col): {unit_number, ...}}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._units)
+
+    def _cell_for(self, latitude, longitude):
+        return (
+            int(math.floor(latitude / self.cell_size_deg)),
+            int(math.floor(longitude / self.cell_size_deg))
+        )
+
+    def update(self, unit_number, latitude, longitude, available=None, timestamp=None):
+        """Record a unit's latest position; availability is kept unless given"""
+        timestamp = time.time() if timestamp is None else timestamp
+        cell = self._cell_for(latitude, longitude)
+        with self._lock:
+            position = self._units.get(unit_number)
+            if position is None:
+                position = UnitPosition(unit_number, latitude, longitude,
+                                        True if available is None else available, timestamp, cell)
+                self._units[unit_number] = position
+            else:
+                if position.cell != cell:
+                    self._discard_from_cell(position)
+                position.latitude = latitude
+                position.longitude = longitude
+                position.updated_at = timestamp
+                position.cell = cell
+                if available is not None:
+                    position.available = available
+            self._cells.setdefault(cell, set()).add(unit_number)
+
+    def set_available(self, unit_number, available):
+        with self._lock:
+            position = self._units.get(unit_number)
+            if position is not None:
+                position.available = available
+
+    def remove(self, unit_number):
+        with self._lock:
+            position = self._units.pop(unit_number, None)
+            if position is not None:
+                self._discard_from_cell(position)
+
+    def get(self, unit_number):
+        return self._units.get(unit_number)
+
+    def evict_stale(self, now=None):
+        """Drop units not seen within max_age_seconds; returns how many went"""
+        if not self.max_age_seconds:
+            return 0
+        oldest = (time.time() if now is None else now) - self.max_age_seconds
+        with self._lock:
+            stale = [position for position in self._units.values() if position.updated_at < oldest]
+            for position in stale:
+                del self._units[position.unit_number]
+                self._discard_from_cell(position)
+        return len(stale)
+
+    def _discard_from_cell(self, position):
+        members = self._cells.get(position.cell)
+        if members is not None:
+            members.discard(position.unit_number)
+            if not members:
+                del self._cells[position.cell]
+
+    def _ring(self, row, col, radius):
+        """Cells exactly ``radius`` steps away from (row, col) in Chebyshev distance"""
+        if radius == 0:
+            yield row, col
+            return
+        for dc in range(-radius, radius + 1):
+            yield row - radius, col + dc
+            yield row + radius, col + dc
+        for dr in range(-radius + 1, radius):
+            yield row + dr, col - radius
+            yield row + dr, col + radius
+
+    def nearest(self, latitude, longitude, k=5, only_available=True, exclude=(), now=None):
+        """
+        Up to ``k`` units nearest to the point, as (UnitPosition, distance_m)
+        pairs ordered by great-circle distance. Units whose last position is
+        older than ``max_age_seconds`` are ignored.
+        """
+        now = time.time() if now is None else now
+        oldest = now - self.max_age_seconds if self.max_age_seconds else None
+        row, col = self._cell_for(latitude, longitude)
+
+        # Any cell outside ring r is at least r cell-widths away along its
+        # shorter side, which bounds how far the search must go
+        cos_lat = max(math.cos(math.radians(min(abs(latitude) + self.cell_size_deg, 89.9))), 0.01)
+        ring_step_m = self.cell_size_deg * METRES_PER_DEGREE * cos_lat
+
+        best = []  # max-heap of (-distance, unit_number, position)
+
+        def consider(position):
+            if only_available and not position.available:
+                return
+            if oldest is not None and position.updated_at < oldest:
+                return
+            if position.unit_number in exclude:
+                return
+            distance = haversine_m(latitude, longitude, position.latitude, position.longitude)
+            if len(best) < k:
+                heapq.heappush(best, (-distance, position.unit_number, position))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, position.unit_number, position))
+
+        with self._lock:
+            seen = 0
+            radius = 0
+            while seen < len(self._units):
+                if radius > self.max_rings:
+                    # Sparse outliers far away: finish with a plain scan
+                    best = []
+                    for position in self._units.values():
+                        consider(position)
+                    break
+                for cell in self._ring(row, col, radius):
+                    members = self._cells.get(cell)
+                    if not members:
+                        continue
+                    seen += len(members)
+                    for unit_number in members:
+                        consider(self._units[unit_number])
+                if len(best) == k and -best[0][0] <= radius * ring_step_m:
+                    break
+                radius += 1
+
+        return [(position, -neg_distance) for neg_distance, _, position in sorted(best, reverse=True)]
+
+
+class UnitLocationStore:
+    """
+    Latest unit positions shared between processes through the UnitLocation
+    table. The Socket.IO servers record() officer_location_update events and
+    suggest_units() ranks index(), so the REST API and every server see the
+    same units. A unit's row is rewritten at most once per
+    ``write_interval`` seconds unless its availability changes.
+
+    Each process keeps one UnitLocationIndex. At most once per
+    ``refresh_interval`` seconds it reads the rows updated since its last
+    refresh (less ``overlap_seconds`` for writes that committed late) and
+    drops units not seen within ``max_age_seconds``.
+    """
+
+    def __init__(self, write_interval=10, max_age_seconds=300, refresh_interval=1.0, overlap_seconds=2,
+                 clock=time.monotonic):
+        self.write_interval = write_interval
+        self.max_age_seconds = max_age_seconds
+        self.refresh_interval = refresh_interval
+        self.overlap_seconds = overlap_seconds
+        self.clock = clock
+        self._index = UnitLocationIndex(max_age_seconds=max_age_seconds)
+        self._written = {}  # {unit_number: (written_at, available)}, only units written within write_interval
+        self._pruned_at = clock()
+        self._refreshed_at = None
+        self._synced_until = None  # newest updated_at read from the table
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def record(self, unit_number, latitude, longitude, available=None):
+        """Store a unit's position; returns False if the row was skipped as too recent"""
+        from django.utils import timezone
+        from api.models import UnitLocation
+
+        # This process sees every position straight away
+        self._index.update(unit_number, latitude, longitude, available=available)
+        now = self.clock()
+        with self._lock:
+            if now - self._pruned_at >= self.write_interval:
+                self._written = {
+                    unit: written for unit, written in self._written.items() if now - written[0] < self.write_interval
+                }
+                self._pruned_at = now
+            last = self._written.get(unit_number)
+            if last is not None and now - last[0] < self.write_interval and available in (None, last[1]):
+                return False
+            self._written[unit_number] = (now, last[1] if available is None and last else available)
+        defaults = {'latitude': latitude, 'longitude': longitude, 'updated_at': timezone.now()}
+        if available is not None:
+            defaults['available'] = available
+        UnitLocation.objects.update_or_create(unit_number=unit_number, defaults=defaults)
+        return True
+
+    def index(self):
+        """This process's UnitLocationIndex, refreshed from the table if refresh_interval passed"""
+        now = self.clock()
+        with self._refresh_lock:
+            if self._refreshed_at is None or now - self._refreshed_at >= self.refresh_interval:
+                self._refresh()
+                self._refreshed_at = now
+        return self._index
+
+    def _refresh(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from api.models import UnitLocation
+
+        if self._synced_until is None:
+            since = timezone.now() - timedelta(seconds=self.max_age_seconds)
+        else:
+            since = self._synced_until - timedelta(seconds=self.overlap_seconds)
+        changed = UnitLocation.objects.filter(updated_at__gte=since).values_list(
+            'unit_number', 'latitude', 'longitude', 'available', 'updated_at'
+        )
+        for unit_number, latitude, longitude, available, updated_at in changed:
+            self._synced_until = max(self._synced_until or updated_at, updated_at)
+            current = self._index.get(unit_number)
+            if current is not None and current.updated_at > updated_at.timestamp():
+                # Recorded here after that row was written
+                continue
+            self._index.update(unit_number, latitude, longitude, available=available,
+                               timestamp=updated_at.timestamp())
+        self._index.evict_stale()
+
+
+# Fed by officer_location_update events on the Socket.IO servers
+unit_locations = UnitLocationStore()
+
+
+def suggest_units(sos, k=5, units=None):
+    """
+    Rank the k nearest free units for an SOS by great-circle distance from
+    its initial location. Units already dispatched to an unresolved SOS are
+    skipped even if their client still reports itself available.
+    """
+    from api.models import SOS
+
+    index = (unit_locations if units is None else units).index()
+    busy = set(
+        SOS.objects.filter(status_flag=0, unit_number_dispatched__isnull=False)
+        .exclude(unit_number_dispatched='')
+        .values_list('unit_number_dispatched', flat=True)
+    )
+    return [
+        {
+            'unit_number': position.unit_number,
+            'latitude': position.latitude,
+            'longitude': position.longitude,
+            'distance_m': round(distance, 1),
+            'last_seen': position.updated_at,
+        }
+        for position, distance in index.nearest(sos.initial_latitude, sos.initial_longitude, k=k, exclude=busy)
+    ]
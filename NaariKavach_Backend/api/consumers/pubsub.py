@@ -0,0 +1,343 @@
+import abc
+import collections
+import threading
+import time
+from datetime import timedelta
+
+import socketio
+from asgiref.sync import sync_to_async
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+
+class MemoryPresence:
+    """
+    Connected officers and citizens by sid: {sid: (host_id, type, unit_number)}.
+
+    Private to one server when no message queue is configured. Managers of
+    one InProcessBroker share a registry through for_host(), each joining
+    and leaving under its own host id.
+    """
+
+    def __init__(self, host_id='local', sessions=None, lock=None):
+        self.host_id = host_id
+        self._sessions = {} if sessions is None else sessions
+        self._lock = lock or threading.Lock()
+
+    def for_host(self, host_id):
+        """View of the same registry for another server"""
+        return MemoryPresence(host_id, self._sessions, self._lock)
+
+    def join(self, sid, user_type, unit_number=None):
+        with self._lock:
+            self._sessions[sid] = (self.host_id, user_type, unit_number)
+
+    def leave(self, sid):
+        """Forget a session; returns its (type, unit_number) or None"""
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        return session[1:] if session else None
+
+    def heartbeat(self):
+        pass
+
+    def unit_members(self, unit_number):
+        """Sids of a unit's officers across all servers"""
+        with self._lock:
+            return [sid for sid, (_, _, unit) in self._sessions.items() if unit == unit_number]
+
+    def units_online(self):
+        """{unit_number: connected officers} across all servers"""
+        with self._lock:
+            return dict(collections.Counter(unit for _, _, unit in self._sessions.values() if unit))
+
+    def stats(self):
+        with self._lock:
+            hosts = {host for host, _, _ in self._sessions.values()}
+            return {'sessions': len(self._sessions), 'hosts': len(hosts)}
+
+
+class DatabasePresence:
+    """
+    Presence kept in the SocketPresence table so every server sees it.
+
+    Each server refreshes the heartbeat of its own rows; rows of a server
+    that stopped heartbeating for ``ttl`` seconds (crashed, killed) are
+    ignored and eventually deleted.
+    """
+
+    def __init__(self, host_id, ttl=30):
+        self.host_id = host_id
+        self.ttl = ttl
+
+    def _live(self):
+        from django.utils import timezone
+        from api.models import SocketPresence
+        return SocketPresence.objects.filter(heartbeat_at__gte=timezone.now() - timedelta(seconds=self.ttl))
+
+    def join(self, sid, user_type, unit_number=None):
+        from django.utils import timezone
+        from api.models import SocketPresence
+        SocketPresence.objects.update_or_create(sid=sid, defaults={
+            'host_id': self.host_id,
+            'user_type': user_type,
+            'unit_number': unit_number or '',
+            'heartbeat_at': timezone.now(),
+        })
+
+    def leave(self, sid):
+        from api.models import SocketPresence
+        session = SocketPresence.objects.filter(sid=sid).values_list('user_type', 'unit_number').first()
+        SocketPresence.objects.filter(sid=sid).delete()
+        if session is None:
+            return None
+        return session[0], session[1] or None
+
+    def heartbeat(self):
+        """Keep this server's rows alive and purge dead servers' rows; call well within ttl"""
+        from django.utils import timezone
+        from api.models import SocketPresence
+        current = timezone.now()
+        SocketPresence.objects.filter(host_id=self.host_id).update(heartbeat_at=current)
+        SocketPresence.objects.filter(heartbeat_at__lt=current - timedelta(seconds=self.ttl * 2)).delete()
+
+    def unit_members(self, unit_number):
+        return list(self._live().filter(unit_number=unit_number).values_list('sid', flat=True))
+
+    def units_online(self):
+        from django.db.models import Count
+        rows = self._live().exclude(unit_number='').values('unit_number').annotate(count=Count('sid'))
+        return {row['unit_number']: row['count'] for row in rows}
+
+    def stats(self):
+        live = self._live()
+        return {'sessions': live.count(), 'hosts': live.values('host_id').distinct().count()}
+
+
+class PollingQueue(abc.ABC):
+    """
+    Message queue read by polling: _receive() returns whatever was
+    published since the last call. Backends subclass this and are combined
+    with PollingPubSubManager for eventlet/threading servers or with
+    AsyncPollingPubSubManager for asyncio servers.
+    """
+    name = 'polling'
+    # _send/_receive block on I/O, so asyncio servers run them in a worker thread
+    blocking = False
+
+    def __init__(self, channel='socketio', write_only=False, logger=None, poll_interval=0.05):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.poll_interval = poll_interval
+        self.presence = MemoryPresence(self.host_id)
+        self.published = 0
+        self.received = 0
+        self._stopped = False
+
+    def stop(self):
+        """End the listener loop, e.g. when a test server is torn down"""
+        self._stopped = True
+
+    @abc.abstractmethod
+    def _send(self, message):
+        """Publish one encoded message"""
+
+    @abc.abstractmethod
+    def _receive(self):
+        """Messages published since the last call, oldest first"""
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'host_id': self.host_id,
+            'published': self.published,
+            'received': self.received,
+        }
+
+
+class PollingPubSubManager(PollingQueue, socketio.PubSubManager):
+    """
+    PubSubManager for backends that are read by polling.
+
+    _listen() asks _receive() for whatever was published since the last
+    call and sleeps ``poll_interval`` through the server when nothing
+    arrived, so it cooperates with both eventlet and threading servers.
+    """
+
+    def _publish(self, data):
+        self._send(self.json.dumps(data))
+        self.published += 1
+
+    def _listen(self):
+        while not self._stopped:
+            messages = self._receive()
+            self.received += len(messages)
+            yield from messages
+            if not messages:
+                self.server.sleep(self.poll_interval)
+
+
+class AsyncPollingPubSubManager(PollingQueue, AsyncPubSubManager):
+    """PollingPubSubManager for asyncio servers"""
+
+    async def _call(self, method, *args):
+        if self.blocking:
+            return await sync_to_async(method)(*args)
+        return method(*args)
+
+    async def _publish(self, data):
+        await self._call(self._send, self.json.dumps(data))
+        self.published += 1
+
+    async def _listen(self):
+        while not self._stopped:
+            messages = await self._call(self._receive)
+            self.received += len(messages)
+            for message in messages:
+                yield message
+            if not messages:
+                await self.server.sleep(self.poll_interval)
+
+
+class InProcessBroker:
+    """
+    Fan-out of published messages to every subscribed manager in this
+    process, plus a shared presence registry. Lets several Socket.IO
+    servers run side by side in one process (tests, benchmarks).
+    """
+
+    def __init__(self):
+        self.presence = MemoryPresence()
+        self._subscribers = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        inbox = collections.deque()
+        with self._lock:
+            self._subscribers[channel].append(inbox)
+        return inbox
+
+    def publish(self, channel, message):
+        with self._lock:
+            inboxes = list(self._subscribers[channel])
+        for inbox in inboxes:
+            inbox.append(message)
+
+
+default_broker = InProcessBroker()
+
+
+class InProcessQueue(PollingQueue):
+    """Messages fanned out to every subscriber of an InProcessBroker"""
+    name = 'memory'
+
+    def __init__(self, channel='socketio', broker=None, write_only=False, logger=None, poll_interval=0.01):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, poll_interval=poll_interval)
+        self.broker = broker or default_broker
+        self.presence = self.broker.presence.for_host(self.host_id)
+        # Subscribe up front so nothing published before the listener starts is lost
+        self._inbox = None if write_only else self.broker.subscribe(channel)
+
+    def _send(self, message):
+        self.broker.publish(self.channel, message)
+
+    def _receive(self):
+        messages = []
+        while self._inbox:
+            messages.append(self._inbox.popleft())
+        return messages
+
+
+class InProcessManager(InProcessQueue, PollingPubSubManager):
+    """Client manager sharing rooms and presence through an InProcessBroker"""
+
+
+class AsyncInProcessManager(InProcessQueue, AsyncPollingPubSubManager):
+    """InProcessManager for asyncio servers"""
+
+
+class DatabaseQueue(PollingQueue):
+    """
+    The SocketMessage table as a message queue, for several server
+    processes on one machine (SQLite) or several nodes sharing a database.
+    Presence lives in the SocketPresence table.
+
+    Readers follow the auto-increment id, so this relies on ids becoming
+    visible in order, which holds for SQLite's single writer. With many
+    concurrent writers on a server database prefer redis:// or kafka://.
+    Messages older than ``retention`` seconds are pruned by the listeners.
+    """
+    name = 'db'
+    blocking = True
+
+    def __init__(self, channel='socketio', write_only=False, logger=None, poll_interval=0.05,
+                 batch_size=500, retention=60, presence_ttl=30):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, poll_interval=poll_interval)
+        self.batch_size = batch_size
+        self.retention = retention
+        self.presence = DatabasePresence(self.host_id, ttl=presence_ttl)
+        self._last_id = None
+        self._last_prune = time.monotonic()
+
+    def _send(self, message):
+        from api.models import SocketMessage
+        SocketMessage.objects.create(channel=self.channel, payload=message)
+
+    def _receive(self):
+        from django.db.models import Max
+        from api.models import SocketMessage
+        messages = SocketMessage.objects.filter(channel=self.channel)
+        if self._last_id is None:
+            # Only what is published after this server started
+            self._last_id = messages.aggregate(last=Max('id'))['last'] or 0
+            return []
+        rows = list(messages.filter(id__gt=self._last_id).order_by('id').values_list('id', 'payload')[:self.batch_size])
+        if rows:
+            self._last_id = rows[-1][0]
+        self._prune()
+        return [payload for _, payload in rows]
+
+    def _prune(self):
+        from django.utils import timezone
+        from api.models import SocketMessage
+        if time.monotonic() - self._last_prune < self.retention:
+            return
+        self._last_prune = time.monotonic()
+        SocketMessage.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=self.retention)).delete()
+
+
+class DatabaseManager(DatabaseQueue, PollingPubSubManager):
+    """Client manager sharing rooms and presence through the database"""
+
+
+class AsyncDatabaseManager(DatabaseQueue, AsyncPollingPubSubManager):
+    """DatabaseManager for asyncio servers"""
+
+
+def build_client_manager(url, channel='socketio', async_mode=False, **kwargs):
+    """
+    Client manager and presence registry for a message queue URL:
+    ``memory://`` (one process), ``db://`` (the Django database), or any
+    URL python-socketio understands (``redis://``, ``kafka://``, ``amqp://``),
+    whose presence is then kept in the database. An empty URL means a
+    single server: (None, MemoryPresence()). With ``async_mode`` the
+    manager is one for socketio.AsyncServer; there is no asyncio Kafka
+    manager.
+    """
+    if not url:
+        return None, MemoryPresence()
+    scheme = url.split('://', 1)[0]
+    if scheme == 'memory':
+        manager = (AsyncInProcessManager if async_mode else InProcessManager)(channel=channel, **kwargs)
+    elif scheme == 'db':
+        manager = (AsyncDatabaseManager if async_mode else DatabaseManager)(channel=channel, **kwargs)
+    else:
+        if scheme in ('redis', 'rediss', 'unix'):
+            manager_class = socketio.AsyncRedisManager if async_mode else socketio.RedisManager
+        elif scheme == 'kafka':
+            if async_mode:
+                raise ValueError('kafka:// needs the eventlet server (socketio_server.py)')
+            manager_class = socketio.KafkaManager
+        else:
+            manager_class = socketio.AsyncAioPikaManager if async_mode else socketio.KombuManager
+        manager = manager_class(url, channel=channel, **kwargs)
+        return manager, DatabasePresence(manager.host_id)
+    return manager, manager.presence
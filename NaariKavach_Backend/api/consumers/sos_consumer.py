@@ -0,0 +1,137 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import socketio
+from asgiref.sync import sync_to_async
+
+from api.emitter import LocalEventBus, set_emitter
+from .event_log import build_event_log
+from .pubsub import build_client_manager
+from .sos_events import Outbox, SOSEvents, build_sos_events
+from .upstream import run_with_fresh_connection
+
+logger = logging.getLogger('socketio')
+
+
+class SOSNamespace(socketio.AsyncNamespace):
+    """
+    The SOSEvents of socketio_server.py, plus in-process create_sos and
+    update_location, served by one asyncio Socket.IO server inside the
+    Django ASGI process.
+
+    Handlers may block on the database, so they run on a pool of
+    ``workers`` threads, side by side, and record what to send in an
+    Outbox, replayed here on the event loop. ``workers=0`` runs them one at
+    a time on asgiref's thread-sensitive executor instead (tests, where the
+    ORM must stay on the test's thread). API events (sos_created,
+    location_update_to_room, ...) come through dispatch() on the
+    in-process event bus instead of a loopback Socket.IO connection.
+    """
+
+    def __init__(self, namespace='/', events=None, workers=8, **kwargs):
+        super().__init__(namespace)
+        self.events = events or SOSEvents(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='socketio-handler') if workers else None
+        self.client_events = frozenset(SOSEvents.CLIENT_EVENTS + SOSEvents.API_CALLS)
+
+    @property
+    def location_history(self):
+        return self.events.location_history
+
+    @property
+    def throttle(self):
+        return self.events.throttle
+
+    async def send_outbox(self, out):
+        for action, args, kwargs in out.actions:
+            await getattr(self, action)(*args, **kwargs)
+
+    def in_worker(self, function):
+        """function as a coroutine running on the handler pool"""
+        if self._executor is None:
+            return sync_to_async(function)
+        return sync_to_async(partial(run_with_fresh_connection, function), thread_sensitive=False,
+                             executor=self._executor)
+
+    async def run(self, handler, *args):
+        """Run an SOSEvents handler and send what it recorded"""
+        out = Outbox(self.rooms)
+        if handler.__name__ in SOSEvents.INLINE_EVENTS:
+            result = handler(out, *args)
+        else:
+            result = await self.in_worker(handler)(out, *args)
+        await self.send_outbox(out)
+        return result
+
+    async def handle(self, event, sid, data=None):
+        """Entry point for client events"""
+        return await self.run(getattr(self.events, event), sid, data)
+
+    async def dispatch(self, event, data):
+        """Entry point of the in-process event bus for API events"""
+        if event not in SOSEvents.API_EVENTS:
+            logger.warning(f'Ignoring unknown API event: {event}')
+            return
+        await self.run(getattr(self.events, event), data or {})
+
+    async def trigger_event(self, event, *args):
+        # Frames from a SocketIOEmitter in another process still work here
+        if event in SOSEvents.API_EVENTS:
+            return await self.dispatch(event, args[-1] if len(args) > 1 else None)
+        if event in self.client_events:
+            return await self.handle(event, args[0], args[1] if len(args) > 1 else None)
+        return await super().trigger_event(event, *args)
+
+    async def sweep_location_history(self):
+        """Background task evicting idle rooms from the location history"""
+        while True:
+            await self.server.sleep(self.events.sweep_interval)
+            await self.in_worker(self.events.sweep)()
+
+    async def heartbeat_presence(self):
+        """Background task keeping this server's presence entries alive"""
+        while True:
+            await self.server.sleep(self.events.heartbeat_interval)
+            await self.in_worker(self.events.heartbeat)()
+
+    async def flush_location_broadcasts(self):
+        """Background task sending the latest coalesced position of each stream once its interval passed"""
+        while True:
+            await self.server.sleep(self.events.flush_interval)
+            await self.run(self.events.flush_due)
+
+
+def build_asgi_app(django_app):
+    """
+    Mount an asyncio Socket.IO server in front of Django's ASGI app and
+    route API events through an in-process event bus. Configured from the
+    same environment variables as socketio_server.py, including
+    SOCKETIO_MESSAGE_QUEUE: several ASGI workers (or ASGI and eventlet
+    servers) then share rooms, presence and the event log.
+    """
+    message_queue = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    client_manager, presence = build_client_manager(message_queue, async_mode=True)
+    sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', client_manager=client_manager)
+    events = build_sos_events(build_event_log(message_queue), client_manager, presence)
+    namespace = SOSNamespace('/', events=events, workers=int(os.environ.get('SOCKETIO_HANDLER_WORKERS', 8)))
+    sio.register_namespace(namespace)
+
+    bus = LocalEventBus(namespace.dispatch)
+    set_emitter(bus)
+    socket_app = socketio.ASGIApp(sio, other_asgi_app=django_app)
+
+    async def application(scope, receive, send):
+        if bus.loop is None:
+            # First call runs on the server's loop: bind the bus to it
+            bus.bind()
+            sio.start_background_task(namespace.sweep_location_history)
+            sio.start_background_task(namespace.heartbeat_presence)
+            sio.start_background_task(namespace.flush_location_broadcasts)
+        await socket_app(scope, receive, send)
+
+    application.sio = sio
+    application.namespace = namespace
+    application.event_bus = bus
+    return application
@@ -0,0 +1,498 @@
+import json
+import logging
+import os
+
+from .event_log import NullEventLog
+from .location_service import BroadcastThrottle, LocationHistoryStore
+from .officer_service import UnitLocationStore, suggest_units, unit_locations
+from .pubsub import MemoryPresence
+from .wire import (BINARY_ROOM_SUFFIX, ENCODINGS, KIND_SOS_ROOM, KIND_TRACKING, KIND_UNIT, binary_room,
+                   encode_location_body, is_stream_room, location_frame)
+
+logger = logging.getLogger('socketio')
+
+
+def parse_last_seq(data):
+    """last_seq sent by a reconnecting client, or None for a fresh join"""
+    if not isinstance(data, dict) or data.get('last_seq') is None:
+        return None
+    try:
+        return max(int(data['last_seq']), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_request(data):
+    """Socket payloads may arrive as a JSON string or an object; returns (dict, error)"""
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError:
+            return None, 'Invalid JSON format'
+    if not isinstance(data, dict):
+        return None, 'Data must be a JSON object'
+    return data, None
+
+
+def _create_sos(data):
+    from api.services import create_sos, sos_created_response
+    sos, errors = create_sos(data)
+    if errors is not None:
+        return None, errors
+    return sos_created_response(sos), None
+
+
+def _record_location(data):
+    from api.services import record_location
+    _, errors = record_location(data)
+    if errors is not None:
+        return None, errors
+    return {'status': 'Location updated successfully'}, None
+
+
+def _get_sos(sos_id):
+    """Cached id, room, status, unit and initial location of an SOS, or None"""
+    from api.sos_cache import sos_cache
+    return sos_cache.get(sos_id)
+
+
+class Outbox:
+    """
+    Emits and room changes of a handler, recorded so a server that cannot
+    send from the handler's thread (the asyncio one) replays them in order
+    afterwards. ``rooms`` answers rooms(sid) for INLINE_EVENTS handlers.
+    """
+
+    def __init__(self, rooms=None):
+        self.actions = []
+        self._rooms = rooms
+
+    def emit(self, event, data=None, to=None, room=None):
+        self.actions.append(('emit', (event, data), {'to': to, 'room': room}))
+
+    def enter_room(self, sid, room):
+        self.actions.append(('enter_room', (sid, room), {}))
+
+    def leave_room(self, sid, room):
+        self.actions.append(('leave_room', (sid, room), {}))
+
+    def rooms(self, sid):
+        return self._rooms(sid)
+
+
+class SOSEvents:
+    """
+    The Socket.IO events served by socketio_server.py (eventlet) and by
+    SOSNamespace (asyncio, inside the Django ASGI process), independent of
+    the server.
+
+    Handlers send through ``out``, anything with emit(), enter_room(),
+    leave_room() and rooms(): the eventlet server passes its
+    socketio.Server, the asyncio server an Outbox. Client events are called
+    as handler(out, sid, data), API events as handler(out, data). Any
+    handler may block on the event log, presence or the database, except
+    those in INLINE_EVENTS, which only touch memory.
+    """
+    CLIENT_EVENTS = (
+        'connect', 'disconnect', 'set_location_encoding', 'join_sos_room', 'join_officer_room',
+        'join_sos_channel', 'join_location_tracking_channel', 'join_officer_update',
+        'officer_location_update', 'nearest_units', 'location_history_stats', 'presence_stats',
+    )
+    # In-process API calls, served by the ASGI namespace; sos_socketio_server.py has the HTTP version
+    API_CALLS = ('create_sos', 'update_location')
+    # Events triggered by the Django API, directly or inside an event_batch frame
+    API_EVENTS = (
+        'sos_created', 'location_update_to_room', 'location_batch_to_room', 'location_update_to_unit',
+        'sos_resolved', 'event_batch',
+    )
+    INLINE_EVENTS = frozenset({'connect', 'set_location_encoding', 'join_officer_update', 'location_history_stats'})
+
+    def __init__(self, location_history=None, throttle=None, event_log=None, presence=None, units=None,
+                 client_manager=None, sweep_interval=60, heartbeat_interval=10):
+        self.location_history = location_history or LocationHistoryStore()
+        self.throttle = throttle or BroadcastThrottle()
+        self.event_log = event_log or NullEventLog()
+        self.presence = presence or MemoryPresence()
+        self.units = unit_locations if units is None else units
+        self.client_manager = client_manager
+        self.sweep_interval = sweep_interval
+        self.heartbeat_interval = heartbeat_interval
+        # Clients that negotiated binary location frames (see api/consumers/wire.py)
+        self.binary_clients = set()
+
+    @property
+    def flush_interval(self):
+        return max(self.throttle.min_interval / 4, 0.05)
+
+    # Helpers
+
+    def binary_frames_wanted(self):
+        """Binary clients may be on this server or, with a message queue, on any other"""
+        return bool(self.binary_clients) or self.client_manager is not None
+
+    def emit_location(self, out, event, kind, data, room, body):
+        """Log a live position once, then send it as JSON to the room and as a binary frame to its binary variant"""
+        seq = self.event_log.append(room, event, data)
+        out.emit(event, dict(data, seq=seq), room=room)
+        if body is not None:
+            out.emit('location_frame', location_frame(kind, seq, body), room=binary_room(room))
+
+    def emit_logged(self, out, event, data, room):
+        """Emit to a room (JSON and binary members), stamping the event with its sequence number in the room's log"""
+        seq = self.event_log.append(room, event, data)
+        out.emit(event, dict(data, seq=seq), room=[room, binary_room(room)])
+
+    def broadcast_room_location(self, out, room_id, update):
+        """Send a live position to an SOS room"""
+        body = encode_location_body(update) if self.binary_frames_wanted() else None
+        self.emit_location(out, 'location_history', KIND_SOS_ROOM, update, f'sos_{room_id}', body)
+
+    def broadcast_unit_location(self, out, unit_number, update):
+        """Send a live position to a unit room and the general tracking channel"""
+        # One binary body for both rooms; only the frame header differs
+        body = encode_location_body(update, unit_number) if self.binary_frames_wanted() else None
+        self.emit_location(out, 'unit_location_update', KIND_UNIT, update, f'unit_{unit_number}', body)
+        self.emit_location(out, 'location_tracking_update', KIND_TRACKING, dict(update, unit_number=unit_number),
+                           'location_tracking_channel', body)
+
+    def replay_missed_events(self, out, sid, room, last_seq):
+        """Send a reconnecting client only the events it missed in a room"""
+        events, complete = self.event_log.replay(room, last_seq)
+        for seq, event, data in events:
+            out.emit(event, dict(data, seq=seq), to=sid)
+        out.emit('replay_complete', {
+            'channel': room,
+            'replayed': len(events),
+            'last_seq': events[-1][0] if events else last_seq,
+            # False means the gap is no longer on record: reload over REST
+            'complete': complete
+        }, to=sid)
+
+    def join_channel(self, out, sid, data, room, joined):
+        """Enter a room (or its binary variant), confirm with its latest seq and replay the gap on reconnect"""
+        out.enter_room(sid, binary_room(room) if sid in self.binary_clients else room)
+        logger.info(f'Client {sid} joined {room}')
+        out.emit('room_joined', dict(joined, last_seq=self.event_log.latest_seq(room)), to=sid)
+        last_seq = parse_last_seq(data)
+        if last_seq is not None:
+            self.replay_missed_events(out, sid, room, last_seq)
+        return last_seq
+
+    @staticmethod
+    def _update(data):
+        return {
+            'sos_id': data.get('sos_id'),
+            'latitude': data.get('latitude'),
+            'longitude': data.get('longitude'),
+            'timestamp': data.get('timestamp')
+        }
+
+    def _append_history(self, room_id, update):
+        self.location_history.append(room_id, update['sos_id'], update['latitude'],
+                                     update['longitude'], update['timestamp'])
+
+    # Background work, run periodically by the server
+
+    def flush_due(self, out):
+        """Send the latest coalesced position of each stream once its interval passed"""
+        for (kind, target), update in self.throttle.due():
+            if kind == 'room':
+                self.broadcast_room_location(out, target, update)
+            else:
+                self.broadcast_unit_location(out, target, update)
+
+    def sweep(self):
+        """Evict idle rooms from the location history and release idle event log channels"""
+        evicted = self.location_history.evict_idle()
+        if evicted:
+            logger.info(f'Evicted {evicted} idle location history rooms: {self.location_history.stats()}')
+        self.event_log.release_idle(self.location_history.idle_ttl)
+
+    def heartbeat(self):
+        """Keep this server's presence entries alive"""
+        try:
+            self.presence.heartbeat()
+        except Exception as e:
+            logger.warning(f'Presence heartbeat failed: {e}')
+
+    # Client events
+
+    def connect(self, out, sid, data=None):
+        logger.info(f'Client connected: {sid}')
+        out.emit('connection_established', {'message': 'Connected to server'}, to=sid)
+
+    def disconnect(self, out, sid, data=None):
+        logger.info(f'Client disconnected: {sid}')
+        self.presence.leave(sid)
+        self.binary_clients.discard(sid)
+
+    def set_location_encoding(self, out, sid, data):
+        """Choose how live locations are delivered: {'encoding': 'json' | 'binary'}"""
+        encoding = data.get('encoding') if isinstance(data, dict) else data
+        if encoding not in ENCODINGS:
+            out.emit('error', {'message': f'Encoding must be one of: {", ".join(ENCODINGS)}'}, to=sid)
+            return
+        binary = encoding == 'binary'
+        if binary:
+            self.binary_clients.add(sid)
+        else:
+            self.binary_clients.discard(sid)
+
+        # Move rooms already joined to the matching variant
+        for room in list(out.rooms(sid)):
+            if room.endswith(BINARY_ROOM_SUFFIX):
+                if not binary:
+                    out.leave_room(sid, room)
+                    out.enter_room(sid, room[:-len(BINARY_ROOM_SUFFIX)])
+            elif binary and is_stream_room(room):
+                out.leave_room(sid, room)
+                out.enter_room(sid, binary_room(room))
+
+        response = {'encoding': encoding}
+        out.emit('location_encoding', response, to=sid)
+        return response
+
+    def join_sos_room(self, out, sid, data):
+        """Join a specific SOS room"""
+        # Handle both string and dict inputs
+        if isinstance(data, str):
+            room_id = data
+        elif isinstance(data, dict):
+            room_id = data.get('room_id')
+        else:
+            out.emit('error', {'message': 'Invalid data format'}, to=sid)
+            return
+
+        if not room_id:
+            out.emit('error', {'message': 'Room ID is required'}, to=sid)
+            return
+
+        last_seq = self.join_channel(out, sid, data, f'sos_{room_id}', {
+            'room_id': room_id,
+            'message': f'Joined SOS room {room_id}'
+        })
+        if last_seq is None and room_id in self.location_history:
+            # Send any existing location updates for this room
+            out.emit('location_history', {'updates': self.location_history.history(room_id)}, to=sid)
+
+    def join_officer_room(self, out, sid, data):
+        """Officers join rooms based on their unit number"""
+        if isinstance(data, str):
+            unit_number = data
+        elif isinstance(data, dict):
+            unit_number = data.get('unit_number')
+        else:
+            out.emit('error', {'message': 'Invalid data format'}, to=sid)
+            return
+
+        if not unit_number:
+            out.emit('error', {'message': 'Unit number is required'}, to=sid)
+            return
+
+        # Store officer data, visible to every server sharing the message queue
+        self.presence.join(sid, 'officer', unit_number)
+        self.join_channel(out, sid, data, f'unit_{unit_number}', {
+            'unit_number': unit_number,
+            'message': f'Joined unit room {unit_number}'
+        })
+
+    def join_sos_channel(self, out, sid, data=None):
+        """Join the main SOS channel to receive all SOS creation notifications"""
+        self.join_channel(out, sid, data, 'sos_channel', {
+            'channel': 'sos_channel',
+            'message': 'Joined SOS channel'
+        })
+
+    def join_location_tracking_channel(self, out, sid, data=None):
+        """Join the location tracking channel to receive all unit location updates"""
+        self.join_channel(out, sid, data, 'location_tracking_channel', {
+            'channel': 'location_tracking_channel',
+            'message': 'Joined location tracking channel'
+        })
+
+    def join_officer_update(self, out, sid, data=None):
+        """Join the channel relaying raw officer_location_update events"""
+        out.enter_room(sid, 'officer_tracking_channel')
+        out.emit('room_joined', {'channel': 'location_tracking_channel',
+                                 'message': 'Joined location tracking channel'}, to=sid)
+
+    def officer_location_update(self, out, sid, data):
+        # Store the latest position of each unit for dispatch suggestions
+        if isinstance(data, dict):
+            unit_number = data.get('unit_number') or data.get('unit_id')
+            try:
+                latitude = float(data.get('latitude'))
+                longitude = float(data.get('longitude'))
+            except (TypeError, ValueError):
+                unit_number = None
+            if unit_number:
+                available = data.get('available')
+                self.units.record(str(unit_number), latitude, longitude,
+                                  available=None if available is None else bool(available))
+
+        out.emit('unit_loc', data, room='officer_tracking_channel')
+
+    def nearest_units(self, out, sid, data):
+        """Rank the nearest free units for an SOS: {'sos_id': int, 'k': int}"""
+        if not isinstance(data, dict) or not data.get('sos_id'):
+            out.emit('error', {'message': 'SOS ID is required'}, to=sid)
+            return
+
+        sos = _get_sos(data.get('sos_id'))
+        if sos is None:
+            out.emit('error', {'message': 'SOS not found'}, to=sid)
+            return
+
+        try:
+            k = max(1, min(int(data.get('k', 5)), 50))
+        except (TypeError, ValueError):
+            k = 5
+        response = {'sos_id': sos.id, 'units': suggest_units(sos, k, self.units)}
+        out.emit('nearest_units', response, to=sid)
+        return response
+
+    def location_history_stats(self, out, sid, data=None):
+        """Report memory held by the location history"""
+        stats = dict(self.location_history.stats(), broadcasts=self.throttle.stats())
+        out.emit('location_history_stats', stats, to=sid)
+        return stats
+
+    def presence_stats(self, out, sid, data=None):
+        """Report connected officers per unit across all servers"""
+        stats = dict(self.presence.stats(), units=self.presence.units_online())
+        if self.client_manager is not None and hasattr(self.client_manager, 'stats'):
+            stats['message_queue'] = self.client_manager.stats()
+        out.emit('presence_stats', stats, to=sid)
+        return stats
+
+    def create_sos(self, out, sid, data):
+        """Create an SOS in-process; same contract as sos_socketio_server.py"""
+        self._call_api(out, sid, 'create_sos_response', data,
+                       ('name', 'initial_latitude', 'initial_longitude'), _create_sos)
+
+    def update_location(self, out, sid, data):
+        """Store a location update in-process; same contract as sos_socketio_server.py"""
+        self._call_api(out, sid, 'update_location_response', data,
+                       ('sos_request', 'latitude', 'longitude'), _record_location)
+
+    def _call_api(self, out, sid, response_event, data, required_fields, operation):
+        data, error = parse_request(data)
+        if error is None:
+            missing = [field for field in required_fields if field not in data]
+            if missing:
+                error = f'Missing required field: {missing[0]}'
+        if error is not None:
+            out.emit(response_event, {'success': False, 'error': error}, to=sid)
+            return
+        try:
+            result, errors = operation(data)
+        except Exception as e:
+            logger.exception(f'{response_event} failed for client {sid}')
+            out.emit(response_event, {'success': False, 'error': f'Server error: {e}'}, to=sid)
+            return
+        if errors is not None:
+            out.emit(response_event, {'success': False, 'error': errors, 'status_code': 400}, to=sid)
+        else:
+            out.emit(response_event, {'success': True, 'data': result}, to=sid)
+
+    # API events
+
+    def sos_created(self, out, data):
+        """Broadcast a new SOS to SOS channel subscribers"""
+        self.emit_logged(out, 'new_sos', data, 'sos_channel')
+        logger.info(f'New SOS created: {data.get("sos_id")} - broadcast to SOS channel')
+
+    def location_update_to_room(self, out, data):
+        """Record a location update for an SOS room and broadcast it, unless filtered or coalesced"""
+        room_id = data.get('room_id')
+        if not room_id:
+            return
+        update = self._update(data)
+        # Every point goes into the location history
+        self._append_history(room_id, update)
+        if self.throttle.offer(('room', room_id), update['latitude'], update['longitude'], update):
+            self.broadcast_room_location(out, room_id, update)
+
+    def location_batch_to_room(self, out, data):
+        """Record a batch of buffered location points for one SOS"""
+        room_id = data.get('room_id')
+        points = data.get('points') or []
+        if not room_id or not points:
+            return
+
+        updates = [self._update(dict(point, sos_id=data.get('sos_id'))) for point in points]
+        for update in updates:
+            self._append_history(room_id, update)
+
+        # One frame for the whole batch, same shape as the history sent on join
+        self.emit_logged(out, 'location_history', {'sos_id': data.get('sos_id'), 'updates': updates}, f'sos_{room_id}')
+        self.throttle.mark_sent(('room', room_id), updates[-1]['latitude'], updates[-1]['longitude'])
+
+        # Units only need the latest position
+        if data.get('unit_number'):
+            self.location_update_to_unit(out, dict(updates[-1], unit_number=data['unit_number']))
+
+    def location_update_to_unit(self, out, data):
+        """Send a location update to a unit room and the tracking channel, unless filtered or coalesced"""
+        unit_number = data.get('unit_number')
+        if not unit_number:
+            return
+        update = self._update(data)
+        if self.throttle.offer(('unit', unit_number), update['latitude'], update['longitude'], update):
+            self.broadcast_unit_location(out, unit_number, update)
+
+    def sos_resolved(self, out, data):
+        """Notify the room of the resolution and drop its history"""
+        room_id = data.get('room_id')
+        if not room_id:
+            return
+        # Flush the last coalesced position before the room closes
+        pending = self.throttle.forget(('room', room_id))
+        if pending:
+            self.broadcast_room_location(out, room_id, pending)
+        self.emit_logged(out, 'sos_resolved', {'sos_id': data.get('sos_id'), 'room_id': room_id}, f'sos_{room_id}')
+        self.location_history.evict(room_id)
+        self.event_log.drop(f'sos_{room_id}')
+        logger.info(f'SOS {data.get("sos_id")} resolved - history for sos_{room_id} released')
+
+    def event_batch(self, out, data):
+        """Handle several queued API events delivered in one frame"""
+        for item in (data or {}).get('events', []):
+            event = item.get('event')
+            if event not in self.API_EVENTS or event == 'event_batch':
+                logger.warning(f'Ignoring unknown batched event: {event}')
+                continue
+            getattr(self, event)(out, item.get('data') or {})
+
+
+def build_sos_events(event_log, client_manager=None, presence=None):
+    """
+    SOSEvents configured from the environment, the same for the eventlet
+    and the ASGI server: LOCATION_HISTORY_* for the per-room history,
+    LOCATION_BROADCAST_* for the broadcast throttle and
+    UNIT_LOCATION_WRITE_INTERVAL for unit positions.
+    """
+    return SOSEvents(
+        # Bounded per-room location history; idle rooms expire and resolved SOS are dropped
+        location_history=LocationHistoryStore(
+            capacity=int(os.environ.get('LOCATION_HISTORY_LENGTH', 200)),
+            idle_ttl=int(os.environ.get('LOCATION_HISTORY_IDLE_TTL', 3600))
+        ),
+        # Live location broadcasts skip moves under the dead-band and go out at most
+        # once per interval per SOS room/unit, latest position wins
+        throttle=BroadcastThrottle(
+            deadband_m=float(os.environ.get('LOCATION_BROADCAST_DEADBAND_M', 5)),
+            min_interval=float(os.environ.get('LOCATION_BROADCAST_MIN_INTERVAL', 1.0)),
+            idle_ttl=int(os.environ.get('LOCATION_BROADCAST_IDLE_TTL', 300))
+        ),
+        event_log=event_log,
+        presence=presence,
+        # Unit positions for dispatch suggestions, shared with the API and the
+        # other servers through the database
+        units=UnitLocationStore(
+            write_interval=float(os.environ.get('UNIT_LOCATION_WRITE_INTERVAL', 10))
+        ),
+        client_manager=client_manager,
+        sweep_interval=int(os.environ.get('LOCATION_HISTORY_SWEEP_INTERVAL', 60)),
+        heartbeat_interval=int(os.environ.get('SOCKETIO_PRESENCE_HEARTBEAT_INTERVAL', 10)),
+    )
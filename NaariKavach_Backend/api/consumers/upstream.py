@@ -0,0 +1,251 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class UpstreamError(Exception):
+    """The upstream call failed before a response was received"""
+
+
+class UpstreamUnavailable(UpstreamError):
+    """The call was refused locally: circuit open or too many calls in flight"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then a single trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def cancel(self):
+        """Give back a half-open trial call that never reached the upstream"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class UpstreamClient:
+    """
+    Keep-alive HTTP client for the Django API.
+
+    One pooled session is shared by all green threads, so events reuse
+    connections instead of opening one per call. At most ``max_concurrency``
+    calls are in flight; callers past that wait only until their deadline.
+    Every call has a total ``deadline`` (seconds) covering the wait for a
+    slot and the request itself, and a circuit breaker fails calls fast
+    while the API is down. 5xx responses count as failures; 4xx do not.
+    """
+
+    def __init__(self, base_url, pool_size=100, max_concurrency=200, deadline=5, connect_timeout=1,
+                 breaker=None, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        if session is None:
+            session = requests.Session()
+            # pool_block keeps the number of open sockets at pool_size
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def post(self, path, payload, deadline=None):
+        """POST JSON and return (status_code, parsed body or None)"""
+        deadline = self.deadline if deadline is None else deadline
+        expires = time.monotonic() + deadline
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise UpstreamUnavailable('API circuit open, failing fast')
+        if not self._slots.acquire(timeout=deadline):
+            self.rejected += 1
+            # Refused without reaching the API, so not a breaker failure
+            self.breaker.cancel()
+            raise UpstreamUnavailable('Too many API calls in flight')
+        try:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout('Deadline exceeded waiting for a connection slot')
+            self.calls += 1
+            response = self.session.post(
+                f'{self.base_url}{path}',
+                json=payload,
+                timeout=(min(self.connect_timeout, remaining), remaining)
+            )
+        except requests.exceptions.RequestException as e:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise UpstreamError(str(e)) from e
+        finally:
+            self._slots.release()
+
+        if response.status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def stats(self):
+        return {
+            'mode': 'http',
+            'calls': self.calls,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'circuit': self.breaker.state,
+        }
+
+
+def run_with_fresh_connection(function, *args):
+    """Call function on a pool thread, dropping a broken or expired connection before and after"""
+    from django.db import close_old_connections, connection
+
+    # As Django's request_started/request_finished handlers do
+    if not connection.in_atomic_block:
+        close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        if not connection.in_atomic_block:
+            close_old_connections()
+
+
+class OrmUpstream:
+    """
+    Same interface as UpstreamClient, but runs the API's service functions
+    in-process through the Django ORM, skipping HTTP altogether. Django must
+    be set up before the first call.
+
+    Calls run on a fixed pool of ``workers`` threads (green threads once
+    eventlet has patched threading), so the gateway holds at most that many
+    database connections and each is reused between calls until
+    CONN_MAX_AGE expires, like Django does across requests. ``workers=0``
+    runs calls in the caller's thread.
+
+    A call that misses its deadline is not cancelled: it keeps running and
+    the caller gets UpstreamError. Within ``retry_window`` seconds, a retry
+    with the same path and payload waits for that call instead of starting
+    another, so a retried create_sos reports the SOS the first attempt
+    created rather than making a duplicate.
+    """
+
+    def __init__(self, workers=8, deadline=None, retry_window=60, clock=time.monotonic):
+        self.calls = 0
+        self.deadline = deadline
+        self.retry_window = retry_window
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='orm-upstream') if workers else None
+        self._timed_out = {}  # {(path, payload): (future, timed_out_at)}
+        self._lock = threading.Lock()
+
+    def post(self, path, payload, deadline=None):
+        from api import services
+
+        operations = {
+            '/api/create-sos/': self._create_sos,
+            '/api/update-location/': self._record_location,
+        }
+        operation = operations.get(path)
+        if operation is None:
+            return 404, {'error': f'Unsupported path in ORM mode: {path}'}
+        self.calls += 1
+        if self._executor is None:
+            return self._run(operation, services, payload)
+        key = (path, json.dumps(payload, sort_keys=True, default=str))
+        now = self.clock()
+        with self._lock:
+            self._timed_out = {
+                pending_key: (pending, timed_out_at) for pending_key, (pending, timed_out_at) in self._timed_out.items()
+                if now - timed_out_at < self.retry_window
+            }
+            # A retry of a call that missed its deadline picks up that call
+            future = self._timed_out.pop(key, (None, None))[0]
+            if future is None:
+                future = self._executor.submit(self._run, operation, services, payload)
+        try:
+            return future.result(timeout=deadline or self.deadline)
+        except FutureTimeout:
+            with self._lock:
+                self._timed_out[key] = (future, self.clock())
+            raise UpstreamError(f'{path} did not finish before the deadline; it still completes, '
+                                f'and retrying the same request returns its result')
+
+    @staticmethod
+    def _run(operation, services, payload):
+        return run_with_fresh_connection(operation, services, payload)
+
+    @staticmethod
+    def _create_sos(services, payload):
+        sos, errors = services.create_sos(payload)
+        if errors is not None:
+            return 400, errors
+        return 201, services.sos_created_response(sos)
+
+    @staticmethod
+    def _record_location(services, payload):
+        _, errors = services.record_location(payload)
+        if errors is not None:
+            return 400, errors
+        return 201, {'status': 'Location updated successfully'}
+
+    def stats(self):
+        return {
+            'mode': 'orm',
+            'calls': self.calls,
+            'workers': self._executor._max_workers if self._executor else 0,
+            'timed_out': len(self._timed_out),
+        }
@@ -0,0 +1,86 @@
+import struct
+import time
+
+from .location_service import parse_timestamp
+
+# Binary location frames, sent as the ``location_frame`` event to clients
+# that asked for them with set_location_encoding. Little-endian layout:
+#   header  version u8, kind u8, seq u32        (per room)
+#   body    sos_id u64, latitude i32 (microdegrees), longitude i32
+#           (microdegrees), timestamp i64 (epoch ms), unit_number length u8
+#           + UTF-8 bytes                       (shared by every room)
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<BBI')
+FRAME_BODY = struct.Struct('<Qiiq')
+
+# Which stream a frame belongs to, i.e. the JSON event it replaces
+KIND_SOS_ROOM = 1  # location_history
+KIND_UNIT = 2  # unit_location_update
+KIND_TRACKING = 3  # location_tracking_update
+FRAME_KINDS = {
+    KIND_SOS_ROOM: 'location_history',
+    KIND_UNIT: 'unit_location_update',
+    KIND_TRACKING: 'location_tracking_update',
+}
+
+ENCODINGS = ('json', 'binary')
+
+# Binary clients join this variant of every stream room instead of the room
+# itself; control events are emitted to both
+BINARY_ROOM_SUFFIX = '~bin'
+
+
+def binary_room(room):
+    return room + BINARY_ROOM_SUFFIX
+
+
+def is_stream_room(room):
+    """Rooms whose live location events have a binary variant"""
+    return room in ('sos_channel', 'location_tracking_channel') or room.startswith(('sos_', 'unit_'))
+
+
+def encode_location_body(update, unit_number=None):
+    """
+    Pack the room-independent part of a location frame once, so it can be
+    shared by every room it is broadcast to. Returns None when the update
+    has no usable coordinates.
+    """
+    try:
+        latitude = round(float(update.get('latitude')) * 1e6)
+        longitude = round(float(update.get('longitude')) * 1e6)
+    except (TypeError, ValueError):
+        return None
+    epoch = parse_timestamp(update.get('timestamp'))
+    if epoch is None:
+        epoch = time.time()
+    try:
+        sos_id = int(update.get('sos_id') or 0)
+    except (TypeError, ValueError):
+        sos_id = 0
+    # At most 255 bytes, cut on a character boundary so the unit still decodes
+    unit = str(unit_number or '').encode()[:255].decode('utf-8', 'ignore').encode()
+    return FRAME_BODY.pack(sos_id, latitude, longitude, round(epoch * 1000)) + bytes([len(unit)]) + unit
+
+
+def location_frame(kind, seq, body):
+    """A complete frame: per-room header in front of a shared body"""
+    return FRAME_HEADER.pack(FRAME_VERSION, kind, seq or 0) + body
+
+
+def decode_location_frame(data):
+    """Frame bytes back to the fields of the JSON event it replaces"""
+    version, kind, seq = FRAME_HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise ValueError(f'Unsupported location frame version {version}')
+    sos_id, latitude, longitude, epoch_ms = FRAME_BODY.unpack_from(data, FRAME_HEADER.size)
+    offset = FRAME_HEADER.size + FRAME_BODY.size
+    unit = bytes(data[offset + 1:offset + 1 + data[offset]]).decode()
+    return {
+        'event': FRAME_KINDS.get(kind),
+        'seq': seq,
+        'sos_id': sos_id or None,
+        'latitude': latitude / 1e6,
+        'longitude': longitude / 1e6,
+        'timestamp_ms': epoch_ms,
+        'unit_number': unit or None,
+    }
@@ -0,0 +1,89 @@
+import logging
+import os
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .jobs import task
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIR = 'sos_images/derivatives'
+
+
+def derivative_name(image_name, variant):
+    """
+    Storage name of one variant of an image. It depends only on the
+    original name and the variant's settings, so serializers can build
+    URLs without a query and changing a size yields a new file.
+    """
+    width, height, quality = settings.SOS_IMAGE_VARIANTS[variant]
+    stem = os.path.splitext(posixpath.basename(image_name))[0]
+    return posixpath.join(DERIVATIVE_DIR, variant, f'{stem}-{width}x{height}q{quality}.jpg')
+
+
+def derivative_url(image_name, variant):
+    """URL of a variant that has been generated, else None"""
+    name = derivative_name(image_name, variant)
+    if not default_storage.exists(name):
+        return None
+    return default_storage.url(name)
+
+
+def render_variant(source, width, height, quality):
+    """Downscale an open image into progressive JPEG bytes"""
+    image = source.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def generate_derivatives(image_name):
+    """
+    Write every missing variant of a stored image. The original is decoded
+    once; for JPEGs, draft() lets the decoder skip straight to roughly the
+    largest variant's size. Returns the names written.
+    """
+    missing = {
+        variant: derivative_name(image_name, variant)
+        for variant in settings.SOS_IMAGE_VARIANTS
+        if not default_storage.exists(derivative_name(image_name, variant))
+    }
+    if not missing:
+        return []
+    largest = max((settings.SOS_IMAGE_VARIANTS[variant][:2] for variant in missing), key=lambda size: size[0] * size[1])
+    with default_storage.open(image_name, 'rb') as handle:
+        with Image.open(handle) as original:
+            original.draft('RGB', largest)
+            source = ImageOps.exif_transpose(original)
+            source.load()
+    written = []
+    for variant, name in missing.items():
+        width, height, quality = settings.SOS_IMAGE_VARIANTS[variant]
+        default_storage.save(name, ContentFile(render_variant(source, width, height, quality)))
+        written.append(name)
+    return written
+
+
+def delete_derivatives(image_name):
+    for variant in settings.SOS_IMAGE_VARIANTS:
+        name = derivative_name(image_name, variant)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+@task(name='generate_image_derivatives', priority=-10)
+def generate_derivatives_task(image_name):
+    generate_derivatives(image_name)
+
+
+def schedule_derivatives(image_name):
+    """Queue variant generation for a worker, off the request path"""
+    return generate_derivatives_task.enqueue(image_name)
@@ -0,0 +1,231 @@
+import asyncio
+import atexit
+import collections
+import logging
+import threading
+
+import socketio
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SocketIOEmitter:
+    """
+    Fire-and-forget delivery of API events to the Socket.IO server.
+
+    emit() only appends to an in-process queue, so request latency never
+    depends on the socket server. A single background thread owns one
+    persistent client connection, sends queued events in batches (as one
+    ``event_batch`` frame) and reconnects with exponential backoff. The
+    queue is bounded: when it is full the oldest events are dropped, since
+    for location streams the newest data matters most.
+    """
+
+    def __init__(self, url, max_queue=1000, batch_size=50, connect_timeout=2,
+                 initial_backoff=0.5, max_backoff=30, client_factory=None):
+        self.url = url
+        self.batch_size = batch_size
+        self.connect_timeout = connect_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._client_factory = client_factory or (lambda: socketio.Client(reconnection=False))
+        self._client = None
+        self._queue = collections.deque(maxlen=max_queue)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._stop_event = threading.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.failed_attempts = 0
+
+    def emit(self, event, data):
+        """Queue an event for delivery; never blocks on the network"""
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((event, data))
+            self._condition.notify()
+        self._ensure_started()
+
+    def pending(self):
+        return len(self._queue)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name='socketio-emitter', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=2):
+        """Flush what can be sent within ``timeout`` seconds and stop the thread"""
+        with self._condition:
+            self._stopping = True
+            self._stop_event.set()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._client is not None and self._client.connected:
+            try:
+                self._client.disconnect()
+            except Exception:
+                pass
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue and not self._stopping:
+                self._condition.wait()
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _requeue(self, batch):
+        # Put an unsent batch back in front, still honouring the queue bound
+        with self._condition:
+            for item in reversed(batch):
+                if len(self._queue) == self._queue.maxlen:
+                    self.dropped += 1
+                    continue
+                self._queue.appendleft(item)
+
+    def _connect(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        if not self._client.connected:
+            self._client.connect(self.url, wait_timeout=self.connect_timeout)
+
+    def _send(self, batch):
+        if len(batch) == 1:
+            event, data = batch[0]
+            self._client.emit(event, data)
+        else:
+            self._client.emit('event_batch', {
+                'events': [{'event': event, 'data': data} for event, data in batch]
+            })
+
+    def _run(self):
+        backoff = self.initial_backoff
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # stopping with an empty queue
+            try:
+                self._connect()
+                self._send(batch)
+            except Exception as e:
+                self.failed_attempts += 1
+                self._requeue(batch)
+                if self._stopping:
+                    return
+                logger.warning(f'Socket.IO emit failed ({e}); retrying in {backoff:.1f}s')
+                # New events must not cut the backoff short, only stop() may
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self.sent += len(batch)
+            backoff = self.initial_backoff
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'failed_attempts': self.failed_attempts,
+            'connected': bool(self._client is not None and self._client.connected),
+        }
+
+
+class LocalEventBus:
+    """
+    Drop-in replacement for SocketIOEmitter when the Socket.IO server runs
+    in the same ASGI process as Django. emit() schedules ``handler(event,
+    data)`` on the server's event loop instead of sending a frame over a
+    client connection, so an API event costs no serialization and no
+    network round-trip.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.loop = None
+        self.sent = 0
+        self.dropped = 0
+        self._pending = 0
+
+    def bind(self, loop=None):
+        """Attach to the event loop running the Socket.IO server"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def emit(self, event, data):
+        """Schedule delivery on the bound loop; callable from any thread"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            self.dropped += 1
+            logger.warning(f'Event bus not bound to a running loop, dropping {event}')
+            return
+        self._pending += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(self._deliver(event, data))
+        else:
+            # Sync Django views run in a worker thread under ASGI
+            asyncio.run_coroutine_threadsafe(self._deliver(event, data), loop)
+
+    async def _deliver(self, event, data):
+        try:
+            await self.handler(event, data)
+            self.sent += 1
+        except Exception:
+            self.dropped += 1
+            logger.exception(f'Event bus handler failed for {event}')
+        finally:
+            self._pending -= 1
+
+    def pending(self):
+        return self._pending
+
+    def stop(self, timeout=2):
+        pass
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'failed_attempts': 0,
+            'connected': bool(self.loop is not None and not self.loop.is_closed()),
+        }
+
+
+_emitter = None
+_emitter_lock = threading.Lock()
+
+
+def set_emitter(emitter):
+    """Replace the process-wide emitter, e.g. with a LocalEventBus"""
+    global _emitter
+    with _emitter_lock:
+        _emitter = emitter
+
+
+def get_emitter():
+    """Process-wide emitter configured from settings, created on first use"""
+    global _emitter
+    if _emitter is None:
+        with _emitter_lock:
+            if _emitter is None:
+                _emitter = SocketIOEmitter(
+                    settings.SOCKETIO_SERVER_URL,
+                    max_queue=settings.SOCKETIO_EMIT_QUEUE_SIZE,
+                    batch_size=settings.SOCKETIO_EMIT_BATCH_SIZE
+                )
+                atexit.register(_emitter.stop)
+    return _emitter
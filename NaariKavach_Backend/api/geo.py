@@ -0,0 +1,104 @@
+import math
+
+EARTH_RADIUS_M = 6371008.8
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells
+
+# Sorts after every geohash character, used as an exclusive upper bound for
+# prefix range scans so lookups stay on the B-tree index
+GEOHASH_RANGE_END = '~'
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in metres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a geohash string of the given length"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(height, width) in degrees of a geohash cell of the given length"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def covering_precision(latitude, radius_m):
+    """
+    Longest geohash length whose cells are still at least ``radius_m`` on
+    each side, so a circle of that radius touches at most a 3x3 block.
+    """
+    metres_per_degree = math.pi * EARTH_RADIUS_M / 180
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        if height * metres_per_degree >= radius_m and width * metres_per_degree * cos_lat >= radius_m:
+            return precision
+    return 1
+
+
+def covering_cells(latitude, longitude, radius_m):
+    """Set of geohash prefixes whose cells together cover the search circle"""
+    precision = covering_precision(latitude, radius_m)
+    height, width = geohash_cell_size(precision)
+    metres_per_degree = math.pi * EARTH_RADIUS_M / 180
+    dlat = radius_m / metres_per_degree
+    dlon = dlat / max(math.cos(math.radians(latitude)), 0.01)
+
+    south = max(latitude - dlat, -90.0)
+    north = min(latitude + dlat, 90.0)
+    west = longitude - dlon
+    east = longitude + dlon
+
+    cells = set()
+    lat = south
+    while True:
+        lon = west
+        while True:
+            wrapped = (lon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(min(lat, 89.999999), wrapped, precision))
+            if lon >= east:
+                break
+            lon = min(lon + width, east)
+        if lat >= north:
+            break
+        lat = min(lat + height, north)
+    return cells
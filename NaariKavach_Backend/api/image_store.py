@@ -0,0 +1,115 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .derivatives import delete_derivatives
+from .models import ImageBlob, SOSImage
+from .storage import content_digest, hamming_distance, perceptual_hash
+
+logger = logging.getLogger(__name__)
+
+
+def attach_blob(image):
+    """
+    Count a newly saved SOSImage as a reference to its stored file. Run it
+    in the transaction that saved the file, so the blob row locked by the
+    storage stays locked until the reference is counted.
+    """
+    name = image.image.name
+    digest = content_digest(name)
+    if digest is None:
+        return None
+    with transaction.atomic():
+        blob, _ = ImageBlob.objects.get_or_create(
+            digest=digest, defaults={'name': name, 'size': image.image.storage.size(name)}
+        )
+        ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        SOSImage.objects.filter(pk=image.pk).update(blob=blob)
+    image.blob = blob
+    return blob
+
+
+def blob_perceptual_hash(blob, storage):
+    """Perceptual hash of a stored file, computed once and kept on the blob"""
+    if blob.perceptual_hash is None:
+        try:
+            with storage.open(blob.name, 'rb') as handle:
+                blob.perceptual_hash = perceptual_hash(handle)
+        except OSError:
+            logger.exception(f'Could not hash {blob.name}')
+            return None
+        ImageBlob.objects.filter(pk=blob.pk).update(perceptual_hash=blob.perceptual_hash)
+    return blob.perceptual_hash
+
+
+def flag_near_duplicate(image):
+    """
+    Point ``near_duplicate_of`` at the most recent earlier image of the same
+    SOS whose perceptual hash is within SOS_IMAGE_NEAR_DUPLICATE_DISTANCE
+    bits. Chains collapse onto the first image of a group. Images stored
+    while detection was off are hashed the first time they are compared.
+    """
+    if settings.SOS_IMAGE_NEAR_DUPLICATE_DISTANCE is None or image.blob is None:
+        return None
+    storage = image.image.storage
+    phash = blob_perceptual_hash(image.blob, storage)
+    if phash is None:
+        return None
+    candidates = SOSImage.objects.filter(
+        sos_request_id=image.sos_request_id, blob__isnull=False
+    ).exclude(pk=image.pk).select_related('blob').order_by('-uploaded_at', '-id')
+    for candidate in candidates[:settings.SOS_IMAGE_NEAR_DUPLICATE_WINDOW]:
+        other = blob_perceptual_hash(candidate.blob, storage)
+        if other is not None and hamming_distance(other, phash) <= settings.SOS_IMAGE_NEAR_DUPLICATE_DISTANCE:
+            image.near_duplicate_of_id = candidate.near_duplicate_of_id or candidate.id
+            SOSImage.objects.filter(pk=image.pk).update(near_duplicate_of=image.near_duplicate_of_id)
+            return image.near_duplicate_of_id
+    return None
+
+
+def register_image(image):
+    attach_blob(image)
+    flag_near_duplicate(image)
+
+
+def _delete_files(storage, name):
+    delete_derivatives(name)
+    storage.delete(name)
+
+
+def _delete_blob(blob_id, storage, name):
+    """
+    Delete a blob nothing refers to any more, and its file. The row is
+    locked while the file goes: an upload of the same content either
+    locked it first and has counted its reference by now (the blob is kept),
+    or waits and writes the file again (see ContentAddressedStorage).
+    """
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+        if blob is None:
+            return
+        blob.delete()
+        _delete_files(storage, name)
+
+
+def release_image(image):
+    """
+    Drop a deleted SOSImage's reference to its file. The file and its
+    derivatives go once nothing refers to them; images stored outside the
+    content-addressed store own their file outright.
+    """
+    name = image.image.name
+    if not name:
+        return
+    storage = image.image.storage
+    if image.blob_id is None:
+        transaction.on_commit(lambda: _delete_files(storage, name))
+        return
+    blob_id = image.blob_id
+    with transaction.atomic():
+        ImageBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        unreferenced = ImageBlob.objects.filter(pk=blob_id, ref_count=0).exists()
+    if unreferenced:
+        transaction.on_commit(lambda: _delete_blob(blob_id, storage, name))
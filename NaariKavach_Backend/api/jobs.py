@@ -0,0 +1,214 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Task:
+    """A function that can run in a worker; see task()"""
+
+    def __init__(self, func, name, priority, max_attempts, timeout):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        """Queue a call with the task's defaults; arguments must be JSON"""
+        return enqueue(self.name, args, kwargs)
+
+
+def task(name=None, priority=0, max_attempts=None, timeout=None):
+    """
+    Register a function as a background task. The module defining it must
+    be imported when the app loads, so workers know the name.
+    """
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', priority, max_attempts, timeout)
+        _registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def enqueue(name, args=(), kwargs=None, priority=None, delay=0):
+    """
+    Queue a registered task. With JOB_QUEUE_EAGER it runs right away
+    instead, which suits development without a worker.
+    """
+    registered = _registry[name]
+    if settings.JOB_QUEUE_EAGER:
+        registered.func(*args, **(kwargs or {}))
+        return None
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        priority=registered.priority if priority is None else priority,
+        available_at=timezone.now() + timedelta(seconds=delay),
+        timeout=registered.timeout or settings.JOB_DEFAULT_TIMEOUT,
+        max_attempts=registered.max_attempts or settings.JOB_DEFAULT_MAX_ATTEMPTS,
+    )
+
+
+def _lease(job, worker_id, now):
+    job.status = Job.RUNNING
+    job.attempts += 1
+    job.available_at = now + timedelta(seconds=job.timeout)
+    job.locked_by = worker_id
+    return dict(status=job.status, attempts=job.attempts, available_at=job.available_at,
+                locked_by=worker_id, updated_at=now)
+
+
+def claim_jobs(worker_id, limit=1):
+    """
+    Lease up to ``limit`` runnable jobs, highest priority first. Running
+    jobs whose lease has expired count as runnable again, so a crashed
+    worker's jobs are retried once their visibility timeout passes.
+    """
+    now = timezone.now()
+    runnable = Job.objects.filter(
+        status__in=(Job.QUEUED, Job.RUNNING), available_at__lte=now
+    ).order_by('-priority', 'available_at', 'id')
+    claimed = []
+    if connection.features.has_select_for_update_skip_locked:
+        # Rows locked by another worker's claim are skipped, not waited for
+        with transaction.atomic():
+            for job in runnable.select_for_update(skip_locked=True)[:limit]:
+                Job.objects.filter(pk=job.pk).update(**_lease(job, worker_id, now))
+                claimed.append(job)
+    else:
+        # SQLite serializes writes: a conditional update on the state that
+        # was read succeeds for exactly one of several racing workers
+        for job in runnable[:limit * 4]:
+            expected = dict(pk=job.pk, status=job.status, attempts=job.attempts, available_at=job.available_at)
+            if Job.objects.filter(**expected).update(**_lease(job, worker_id, now)):
+                claimed.append(job)
+                if len(claimed) == limit:
+                    break
+    ready = []
+    for job in claimed:
+        if job.attempts > job.max_attempts:
+            # Its last attempt timed out
+            _finish(job, status=Job.FAILED, last_error=job.last_error or 'Visibility timeout expired')
+        else:
+            ready.append(job)
+    return ready
+
+
+def _finish(job, **fields):
+    """Record an outcome unless the lease was lost to another worker meanwhile"""
+    return Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts, locked_by=job.locked_by
+    ).update(updated_at=timezone.now(), **fields)
+
+
+def run_job(job):
+    """Run a claimed job and record success, a retry with backoff, or failure"""
+    registered = _registry.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'Unknown task {job.name}')
+        registered.func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error(f'Job {job.id} {job.name} failed after {job.attempts} attempts:\n{error}')
+            _finish(job, status=Job.FAILED, last_error=error)
+        else:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            logger.warning(f'Job {job.id} {job.name} failed, retrying in {delay}s:\n{error}')
+            _finish(job, status=Job.QUEUED, available_at=timezone.now() + timedelta(seconds=delay), last_error=error)
+        return False
+    _finish(job, status=Job.DONE, last_error='')
+    return True
+
+
+def purge_jobs(older_than_hours=None):
+    """Delete finished jobs; failed ones are kept for inspection"""
+    hours = settings.JOB_RETENTION_HOURS if older_than_hours is None else older_than_hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+    return Job.objects.filter(status=Job.DONE, updated_at__lt=cutoff).delete()[0]
+
+
+class Worker:
+    """
+    Runs queued jobs on ``threads`` threads until stopped. In burst mode
+    each thread exits once it finds the queue empty.
+    """
+
+    def __init__(self, threads=1, poll_interval=None, burst=False, worker_id=None):
+        self.threads = threads
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.burst = burst
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.stop_event = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        workers = [
+            threading.Thread(target=self._loop, name=f'job-worker-{index}', daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        purged_at = None
+        try:
+            while any(thread.is_alive() for thread in workers):
+                if purged_at is None or time.monotonic() - purged_at > 3600:
+                    purge_jobs()
+                    purged_at = time.monotonic()
+                if self.stop_event.wait(timeout=self.poll_interval):
+                    break
+        finally:
+            # Jobs in progress are finished first
+            self.stop()
+            for thread in workers:
+                thread.join()
+            connection.close()
+
+    def work_once(self):
+        """Claim and run one job if there is one; returns how many ran"""
+        jobs = claim_jobs(self.worker_id)
+        for job in jobs:
+            succeeded = run_job(job)
+            with self._lock:
+                if succeeded:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+        return len(jobs)
+
+    def _loop(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                if self.work_once():
+                    continue
+                if self.burst:
+                    return
+                self.stop_event.wait(self.poll_interval)
+        finally:
+            connection.close()
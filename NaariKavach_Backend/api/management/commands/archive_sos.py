@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archivable_sos, archive_resolved
+
+
+class Command(BaseCommand):
+    help = (
+        'Move resolved SOS, with their location history, officer assignments '
+        'and images, from the hot tables to the archive tables. Archived SOS '
+        'stay readable through /api/sos/<id>/.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=settings.SOS_ARCHIVE_AFTER_DAYS,
+                            help='Only archive SOS resolved (last updated) at least this long ago')
+        parser.add_argument('--batch-size', type=int, default=settings.SOS_ARCHIVE_BATCH_SIZE,
+                            help='SOS moved per transaction')
+        parser.add_argument('--max-points', type=int, default=settings.SOS_ARCHIVE_MAX_POINTS,
+                            help='Close a batch early once its SOS hold this many location updates')
+        parser.add_argument('--limit', type=int, help='Maximum SOS to archive in this run')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        if options['dry_run']:
+            self.stdout.write(f'{archivable_sos(cutoff).count()} SOS would be archived')
+            return
+        archived = archive_resolved(
+            cutoff, options['batch_size'], options['limit'], options['pause'], options['max_points']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} SOS'))
@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.geo import geohash_encode
+from api.models import SOS
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the nearby-SOS lookup against a seeded table. Rows are '
+        'inserted inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Historical SOS rows to seed')
+        parser.add_argument('--unresolved', type=float, default=0.01, help='Fraction of rows left unresolved')
+        parser.add_argument('--queries', type=int, default=500, help='Number of lookups to time')
+        parser.add_argument('--radius', type=float, default=2000, help='Search radius in metres')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Spread incidents over a ~200km square around Delhi
+        center_lat, center_lon, spread = 28.6139, 77.2090, 1.0
+
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['rows']} SOS rows...")
+            started = time.perf_counter()
+            batch = []
+            for i in range(options['rows']):
+                latitude = center_lat + rng.uniform(-spread, spread)
+                longitude = center_lon + rng.uniform(-spread, spread)
+                batch.append(SOS(
+                    name=f'bench-{i}',
+                    initial_latitude=latitude,
+                    initial_longitude=longitude,
+                    status_flag=0 if rng.random() < options['unresolved'] else 1,
+                    # bulk_create bypasses save(), so fill the geohash here
+                    geohash=geohash_encode(latitude, longitude),
+                ))
+                if len(batch) == 10000:
+                    SOS.objects.bulk_create(batch)
+                    batch = []
+            if batch:
+                SOS.objects.bulk_create(batch)
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+            # Warm up the page cache before timing
+            for _ in range(20):
+                SOS.objects.nearby(center_lat, center_lon, options['radius'])
+
+            timings = []
+            found = 0
+            for _ in range(options['queries']):
+                latitude = center_lat + rng.uniform(-spread, spread)
+                longitude = center_lon + rng.uniform(-spread, spread)
+                started = time.perf_counter()
+                found += len(SOS.objects.nearby(latitude, longitude, options['radius']))
+                timings.append((time.perf_counter() - started) * 1000)
+
+            transaction.set_rollback(True)
+
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['queries']} lookups, radius {options['radius']:.0f}m, "
+            f"{found / options['queries']:.1f} results/query: "
+            f"p50 {statistics.median(timings):.2f}ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms, "
+            f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f}ms, "
+            f"max {timings[-1]:.2f}ms"
+        ))
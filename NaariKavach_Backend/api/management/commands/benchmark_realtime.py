@@ -0,0 +1,111 @@
+import queue
+import statistics
+import time
+
+import socketio
+from django.core.management.base import BaseCommand, CommandError
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    return (
+        f'{label}: p50 {statistics.median(timings):.1f}ms, '
+        f'p95 {timings[max(int(len(timings) * 0.95) - 1, 0)]:.1f}ms, '
+        f'p99 {timings[max(int(len(timings) * 0.99) - 1, 0)]:.1f}ms, '
+        f'max {timings[-1]:.1f}ms'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure create_sos/update_location latency through running servers: '
+        'time to the sender\'s response and to the broadcast reaching a '
+        'subscriber. Point --gateway-url and --broadcast-url at the SOS '
+        'gateway (8002) and Socket.IO server (8001) for the three-process '
+        'topology, or both at the ASGI server for the single-process mode. '
+        'Creates real SOS rows on the target server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gateway-url', default='http://localhost:8002',
+                            help='Server handling create_sos/update_location')
+        parser.add_argument('--broadcast-url', default='http://localhost:8001',
+                            help='Server delivering new_sos/location_history')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for each event')
+
+    def handle(self, *args, **options):
+        inbox = {name: queue.Queue() for name in (
+            'create_sos_response', 'update_location_response', 'new_sos', 'location_history', 'room_joined'
+        )}
+
+        def client_for(url, events):
+            client = socketio.Client(reconnection=False)
+            for event in events:
+                client.on(event, lambda data, event=event: inbox[event].put((time.perf_counter(), data)))
+            try:
+                client.connect(url, wait_timeout=options['timeout'])
+            except socketio.exceptions.ConnectionError as e:
+                raise CommandError(f'Cannot connect to {url}: {e}')
+            return client
+
+        def wait_for(event, match):
+            deadline = time.perf_counter() + options['timeout']
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise CommandError(f'Timed out waiting for {event}')
+                try:
+                    received_at, data = inbox[event].get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if match(data):
+                    return received_at, data
+
+        gateway = client_for(options['gateway_url'], ('create_sos_response', 'update_location_response'))
+        listener = client_for(options['broadcast_url'], ('new_sos', 'location_history', 'room_joined'))
+        listener.emit('join_sos_channel', {})
+        wait_for('room_joined', lambda data: data.get('channel') == 'sos_channel')
+
+        timings = {'create_response': [], 'create_broadcast': [], 'update_response': [], 'update_broadcast': []}
+        total = options['warmup'] + options['iterations']
+        self.stdout.write(f"Running {total} create_sos + update_location rounds ({options['warmup']} warm-up)...")
+        try:
+            for i in range(total):
+                started = time.perf_counter()
+                gateway.emit('create_sos', {
+                    'name': f'bench-{i}',
+                    'initial_latitude': 28.6139,
+                    'initial_longitude': 77.2090
+                })
+                responded_at, response = wait_for('create_sos_response', lambda data: True)
+                if not response.get('success'):
+                    raise CommandError(f"create_sos failed: {response.get('error')}")
+                sos_id = response['data']['sos_id']
+                room_id = response['data']['room_id']
+                broadcast_at, _ = wait_for('new_sos', lambda data: data.get('sos_id') == sos_id)
+                if i >= options['warmup']:
+                    timings['create_response'].append((responded_at - started) * 1000)
+                    timings['create_broadcast'].append((broadcast_at - started) * 1000)
+
+                listener.emit('join_sos_room', {'room_id': room_id})
+                wait_for('room_joined', lambda data: data.get('room_id') == room_id)
+                started = time.perf_counter()
+                gateway.emit('update_location', {'sos_request': sos_id, 'latitude': 28.6140, 'longitude': 77.2091})
+                responded_at, response = wait_for('update_location_response', lambda data: True)
+                if not response.get('success'):
+                    raise CommandError(f"update_location failed: {response.get('error')}")
+                broadcast_at, _ = wait_for('location_history', lambda data: data.get('sos_id') == sos_id)
+                if i >= options['warmup']:
+                    timings['update_response'].append((responded_at - started) * 1000)
+                    timings['update_broadcast'].append((broadcast_at - started) * 1000)
+        finally:
+            gateway.disconnect()
+            listener.disconnect()
+
+        self.stdout.write(self.style.SUCCESS(f"{options['iterations']} rounds via {options['gateway_url']}"))
+        self.stdout.write(summarize('create_sos -> create_sos_response', timings['create_response']))
+        self.stdout.write(summarize('create_sos -> new_sos broadcast', timings['create_broadcast']))
+        self.stdout.write(summarize('update_location -> update_location_response', timings['update_response']))
+        self.stdout.write(summarize('update_location -> location_history broadcast', timings['update_broadcast']))
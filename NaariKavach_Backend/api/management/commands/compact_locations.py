@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import SOS, LocationUpdate, LocationTrackSegment
+from api.trajectory import pack_track
+
+
+class Command(BaseCommand):
+    help = (
+        'Pack the location history of resolved SOS into compact track '
+        'segments (one per time window) and drop the per-point rows. The '
+        'full track stays available from /api/sos/<id>/trajectory/, and '
+        '/api/sos/<id>/ still lists every point in location_updates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolved-for-hours', type=float, default=24,
+                            help='Only compact SOS resolved (last updated) at least this long ago')
+        parser.add_argument('--window-minutes', type=int, default=60,
+                            help='Time span covered by one segment')
+        parser.add_argument('--limit', type=int, default=1000, help='Maximum SOS to compact in this run')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['resolved_for_hours'])
+        window = timedelta(minutes=options['window_minutes'])
+        sos_ids = list(
+            SOS.objects.filter(status_flag=1, updated_at__lt=cutoff, location_updates__isnull=False)
+            .values_list('id', flat=True).distinct()[:options['limit']]
+        )
+
+        compacted_points = 0
+        for sos_id in sos_ids:
+            # One short transaction per SOS keeps locks brief
+            with transaction.atomic():
+                rows = list(
+                    LocationUpdate.objects.filter(sos_request_id=sos_id)
+                    .order_by('timestamp', 'id')
+                    .values_list('id', 'latitude', 'longitude', 'timestamp')
+                )
+                segments = []
+                current = []
+                for row in rows:
+                    if current and row[3] - current[0][3] >= window:
+                        segments.append(current)
+                        current = []
+                    current.append(row)
+                if current:
+                    segments.append(current)
+
+                LocationTrackSegment.objects.bulk_create([
+                    LocationTrackSegment(
+                        sos_request_id=sos_id,
+                        start_time=segment[0][3],
+                        end_time=segment[-1][3],
+                        point_count=len(segment),
+                        data=pack_track([row[1:] for row in segment])
+                    )
+                    for segment in segments
+                ])
+                LocationUpdate.objects.filter(
+                    sos_request_id=sos_id, id__lte=max(row[0] for row in rows)
+                ).delete()
+            compacted_points += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {compacted_points} location updates from {len(sos_ids)} SOS'
+        ))
@@ -0,0 +1,46 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.derivatives import delete_derivatives
+from api.image_store import register_image
+from api.models import SOSImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Move SOS images stored before the content-addressed store into it, '
+        'so identical files collapse into one. Old files and their variants '
+        'are deleted once the image points at the shared copy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sos-id', type=int, help='Only images of this SOS')
+
+    def handle(self, *args, **options):
+        images = SOSImage.objects.filter(blob__isnull=True).exclude(image='').order_by('id')
+        if options['sos_id']:
+            images = images.filter(sos_request_id=options['sos_id'])
+
+        moved = missing = freed = 0
+        for image in images.iterator():
+            storage = image.image.storage
+            old_name = image.image.name
+            if not storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f'{old_name}: file not found')
+                continue
+            size = storage.size(old_name)
+            with transaction.atomic():
+                with storage.open(old_name, 'rb') as handle:
+                    new_name = storage.save(old_name, File(handle))
+                SOSImage.objects.filter(pk=image.pk).update(image=new_name)
+                image.image.name = new_name
+                register_image(image)
+            if image.blob.ref_count > 0:
+                # Counted before this image: the content was already stored
+                freed += size
+            delete_derivatives(old_name)
+            storage.delete(old_name)
+            moved += 1
+        self.stdout.write(f'Moved {moved} images ({freed} bytes of duplicates freed), {missing} files missing')
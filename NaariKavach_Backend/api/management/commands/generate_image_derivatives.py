@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from api.derivatives import generate_derivatives
+from api.models import SOSImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Create missing thumbnail and preview variants for stored SOS images, '
+        'e.g. for images uploaded before variants existed or after changing '
+        'SOS_IMAGE_VARIANTS. New uploads get theirs in the background.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sos-id', type=int, help='Only images of this SOS')
+
+    def handle(self, *args, **options):
+        images = SOSImage.objects.exclude(image='').order_by('id')
+        if options['sos_id']:
+            images = images.filter(sos_request_id=options['sos_id'])
+
+        written = failed = 0
+        for name in images.values_list('image', flat=True).iterator():
+            try:
+                written += len(generate_derivatives(name))
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{name}: {e}')
+        self.stdout.write(f'Wrote {written} variants, {failed} images failed')
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import SOSImageUpload
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete resumable image uploads that have not been touched for a '
+        'while, together with their partial files. Finalized images are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=float, default=settings.SOS_IMAGE_UPLOAD_EXPIRY_HOURS,
+                            help='Only delete uploads last updated at least this long ago')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        abandoned = finalized = 0
+        # One at a time so SOSImageUpload.delete() removes each partial file
+        for upload in SOSImageUpload.objects.filter(updated_at__lt=cutoff).iterator():
+            if upload.image_id is None:
+                abandoned += 1
+            else:
+                finalized += 1
+            upload.delete()
+        self.stdout.write(f'Deleted {abandoned} abandoned and {finalized} finalized uploads')
@@ -0,0 +1,49 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.jobs import Worker
+
+
+def _work(threads, poll_interval, burst):
+    worker = Worker(threads=threads, poll_interval=poll_interval, burst=burst)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run()
+    return worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (api/jobs.py). Start as many of these as '
+        'needed, on one or several machines sharing the database; each job '
+        'is claimed by exactly one worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads per process')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes, for CPU-bound tasks')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        work_args = (options['threads'], options['poll_interval'], options['burst'])
+        if options['processes'] <= 1:
+            worker = _work(*work_args)
+            self.stdout.write(f'{worker.succeeded} jobs succeeded, {worker.failed} failed')
+            return
+
+        # Children must not inherit this process's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_work, args=work_args) for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+        # The children handle Ctrl-C themselves and finish their current jobs
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+        for process in processes:
+            process.join()
+        self.stdout.write(f'{len(processes)} worker processes exited')
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_sosimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SOSTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sos_id', models.BigIntegerField()),
+                ('room_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='sos',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+from api.geo import geohash_encode
+
+
+def backfill_geohash(apps, schema_editor):
+    SOS = apps.get_model('api', 'SOS')
+    batch = []
+    for sos in SOS.objects.only('id', 'initial_latitude', 'initial_longitude').iterator(chunk_size=2000):
+        sos.geohash = geohash_encode(sos.initial_latitude, sos.initial_longitude)
+        batch.append(sos)
+        if len(batch) >= 2000:
+            SOS.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        SOS.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_sostombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sos',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='sos',
+            index=models.Index(fields=['status_flag', 'geohash'], name='api_sos_status_geohash_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
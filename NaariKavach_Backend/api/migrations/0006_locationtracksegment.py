@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_locationupdate_client_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationTrackSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('sos_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_segments', to='api.sos')),
+            ],
+            options={
+                'ordering': ['start_time'],
+            },
+        ),
+    ]
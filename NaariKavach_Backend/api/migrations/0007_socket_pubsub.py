@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_locationtracksegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SocketPresence',
+            fields=[
+                ('sid', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('host_id', models.CharField(db_index=True, max_length=32)),
+                ('user_type', models.CharField(max_length=20)),
+                ('unit_number', models.CharField(blank=True, db_index=True, default='', max_length=50)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SocketMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=64)),
+                ('payload', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['channel', 'id'], name='api_socketmsg_channel_id_idx')],
+            },
+        ),
+    ]
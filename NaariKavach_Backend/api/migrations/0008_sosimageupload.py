@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:23
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_socket_pubsub'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SOSImageUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('received_ranges', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('image', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='api.sosimage')),
+                ('sos_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_uploads', to='api.sos')),
+            ],
+        ),
+    ]
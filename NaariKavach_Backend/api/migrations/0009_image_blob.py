@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:30
+
+import api.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_sosimageupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('perceptual_hash', models.CharField(blank=True, max_length=16, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sosimage',
+            name='near_duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='api.sosimage'),
+        ),
+        migrations.AlterField(
+            model_name='sosimage',
+            name='image',
+            field=models.ImageField(storage=api.storage.sos_image_storage, upload_to='sos_images/'),
+        ),
+        migrations.AddField(
+            model_name='sosimage',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='images', to='api.imageblob'),
+        ),
+    ]
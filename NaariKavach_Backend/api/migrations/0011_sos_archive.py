@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:01
+
+import api.storage
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSOS',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('sos_type', models.IntegerField(choices=[(0, 'Emergency'), (1, 'Alert')])),
+                ('status_flag', models.IntegerField(choices=[(0, 'Unresolved'), (1, 'Resolved')])),
+                ('initial_latitude', models.FloatField()),
+                ('initial_longitude', models.FloatField()),
+                ('unit_number_dispatched', models.CharField(blank=True, max_length=50, null=True)),
+                ('acknowledged_flag', models.IntegerField(choices=[(0, 'Not Acknowledged'), (1, 'Acknowledged')])),
+                ('room_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('geohash', models.CharField(blank=True, default='', max_length=12)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_sos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived SOS',
+                'verbose_name_plural': 'Archived SOS Requests',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOfficerAssignment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('officer_name', models.CharField(max_length=255)),
+                ('unit_number', models.CharField(max_length=50)),
+                ('assigned_at', models.DateTimeField()),
+                ('sos_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='officer_assignments', to='api.archivedsos')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLocationUpdate',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('timestamp', models.DateTimeField()),
+                ('sos_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_updates', to='api.archivedsos')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedSOSImage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('image', models.ImageField(storage=api.storage.sos_image_storage, upload_to='sos_images/')),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('uploaded_at', models.DateTimeField()),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_images', to='api.imageblob')),
+                ('near_duplicate_of', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='api.archivedsosimage')),
+                ('sos_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='api.archivedsos')),
+            ],
+            options={
+                'verbose_name': 'Archived SOS Image',
+                'verbose_name_plural': 'Archived SOS Images',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTrackSegment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('sos_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_segments', to='api.archivedsos')),
+            ],
+            options={
+                'ordering': ['start_time'],
+            },
+        ),
+    ]
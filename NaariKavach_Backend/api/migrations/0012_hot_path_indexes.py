@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_sos_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='locationupdate',
+            index=models.Index(fields=['sos_request', 'timestamp', 'id'], name='api_locupdate_sos_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='officerassignment',
+            index=models.Index(fields=['unit_number', 'assigned_at'], name='api_assignment_unit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sos',
+            index=models.Index(fields=['created_at', 'id'], name='api_sos_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sos',
+            index=models.Index(fields=['status_flag', 'created_at', 'id'], name='api_sos_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sos',
+            index=models.Index(condition=models.Q(('room_id__isnull', False)), fields=['room_id'], name='api_sos_room_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_locationupdate_received_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='locationupdate',
+            index=models.Index(fields=['received_at', 'id'], name='api_locupdate_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='officerassignment',
+            index=models.Index(fields=['assigned_at', 'id'], name='api_assignment_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sostombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='api_tombstone_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_sync_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_number', models.CharField(max_length=50, unique=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('available', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_unitlocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SocketEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=200)),
+                ('seq', models.PositiveBigIntegerField()),
+                ('event', models.CharField(max_length=64)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('channel', 'seq'), name='api_socketevent_channel_seq')],
+            },
+        ),
+    ]
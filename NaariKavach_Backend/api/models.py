@@ -1,6 +1,36 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.conf import settings
 import os
+import uuid
+
+from .geo import GEOHASH_RANGE_END, covering_cells, geohash_encode, haversine_m
+from .storage import sos_image_storage
+
+class SOSQuerySet(models.QuerySet):
+    def nearby(self, latitude, longitude, radius_m):
+        """
+        Unresolved SOS within ``radius_m`` metres of a point, as
+        (sos, distance_m) pairs ordered nearest first.
+
+        Candidates come from geohash prefix range scans on the
+        (status_flag, geohash) index; exact distances are then computed
+        for that small candidate set only.
+        """
+        # status_flag is repeated in every branch so each one is an index range
+        cells = Q()
+        for cell in covering_cells(latitude, longitude, radius_m):
+            cells |= Q(status_flag=0, geohash__gte=cell, geohash__lt=cell + GEOHASH_RANGE_END)
+        
+        results = []
+        for sos in self.filter(cells):
+            distance = haversine_m(latitude, longitude, sos.initial_latitude, sos.initial_longitude)
+            if distance <= radius_m:
+                results.append((sos, distance))
+        results.sort(key=lambda item: item[1])
+        return results
 
 class SOS(models.Model):
     # SOS types
@@ -31,14 +61,47 @@ class SOS(models.Model):
     acknowledged_flag = models.IntegerField(choices=ACK_FLAGS, default=0)
     room_id = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Geohash of the initial location, maintained on save for proximity lookups
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+    
+    objects = SOSQuerySet.as_manager()
     
     def __str__(self):
         return f"SOS {self.id} - {self.name} ({self.get_sos_type_display()})"
     
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_encode(self.initial_latitude, self.initial_longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'initial_latitude', 'initial_longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = "SOS"
         verbose_name_plural = "SOS Requests"
+        indexes = [
+            models.Index(fields=['status_flag', 'geohash'], name='api_sos_status_geohash_idx'),
+            # Newest first, overall (get-all-sos pages) and by status
+            models.Index(fields=['created_at', 'id'], name='api_sos_created_idx'),
+            models.Index(fields=['status_flag', 'created_at', 'id'], name='api_sos_status_created_idx'),
+            # Socket.IO rooms are looked up by room_id; SOS without one are left out
+            models.Index(fields=['room_id'], name='api_sos_room_id_idx', condition=Q(room_id__isnull=False)),
+        ]
+
+class SOSTombstone(models.Model):
+    # Records deleted SOS so incremental sync clients can drop them
+    sos_id = models.BigIntegerField()
+    room_id = models.CharField(max_length=100, blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Tombstone for SOS {self.sos_id}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='api_tombstone_deleted_idx'),
+        ]
 
 class OfficerAssignment(models.Model):
     sos_request = models.ForeignKey(SOS, on_delete=models.CASCADE, related_name='officer_assignments')
@@ -48,32 +111,278 @@ class OfficerAssignment(models.Model):
     
     def __str__(self):
         return f"Officer: {self.officer_name} - Unit: {self.unit_number} - SOS: {self.sos_request.id}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['unit_number', 'assigned_at'], name='api_assignment_unit_idx'),
+            models.Index(fields=['assigned_at', 'id'], name='api_assignment_assigned_idx'),
+        ]
 
 class LocationUpdate(models.Model):
     sos_request = models.ForeignKey(SOS, on_delete=models.CASCADE, related_name='location_updates')
     latitude = models.FloatField()
     longitude = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add so batched uploads can keep the client's fix time
+    timestamp = models.DateTimeField(default=timezone.now)
+    # When the server stored the point, whatever the client's clock said
+    received_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Location Update for SOS {self.sos_request.id} at {self.timestamp}"
+    
+    class Meta:
+        indexes = [
+            # A track in time order, and the latest points of each SOS
+            models.Index(fields=['sos_request', 'timestamp', 'id'], name='api_locupdate_sos_time_idx'),
+            # Delta sync reads new points in insert order
+            models.Index(fields=['received_at', 'id'], name='api_locupdate_received_idx'),
+        ]
+
+class LocationTrackSegment(models.Model):
+    # Packed location history for one time window (see api.trajectory.pack_track)
+    sos_request = models.ForeignKey(SOS, on_delete=models.CASCADE, related_name='track_segments')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    
+    def __str__(self):
+        return f"Track segment for SOS {self.sos_request_id} ({self.point_count} points)"
+    
+    class Meta:
+        ordering = ['start_time']
+
+class SocketMessage(models.Model):
+    # Socket.IO pub/sub messages shared between socket servers (api.consumers.pubsub.DatabaseManager)
+    channel = models.CharField(max_length=64)
+    payload = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"Socket message {self.id} on {self.channel}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['channel', 'id'], name='api_socketmsg_channel_id_idx'),
+        ]
+
+class SocketPresence(models.Model):
+    # One row per connected officer/citizen socket, refreshed by its server's heartbeat
+    sid = models.CharField(max_length=64, primary_key=True)
+    host_id = models.CharField(max_length=32, db_index=True)
+    user_type = models.CharField(max_length=20)
+    unit_number = models.CharField(max_length=50, blank=True, default='', db_index=True)
+    heartbeat_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.user_type} {self.sid} on {self.host_id}"
+
+class UnitLocation(models.Model):
+    # Latest reported position of an officer unit, written by the Socket.IO
+    # servers so every process can rank units for dispatch
+    unit_number = models.CharField(max_length=50, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Unit {self.unit_number} at ({self.latitude}, {self.longitude})"
+
+class SocketEvent(models.Model):
+    # Sequenced Socket.IO room event shared by all servers behind a message
+    # queue, so a client can replay a gap on whichever server it reconnects to
+    channel = models.CharField(max_length=200)
+    seq = models.PositiveBigIntegerField()
+    event = models.CharField(max_length=64)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['channel', 'seq'], name='api_socketevent_channel_seq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} #{self.seq} on {self.channel}"
+
+class ImageBlob(models.Model):
+    # One file in the content-addressed image store, shared by identical uploads
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # SOSImage rows pointing at this file; it is deleted when this reaches zero
+    ref_count = models.PositiveIntegerField(default=0)
+    # 64-bit difference hash in hex, set when near-duplicate detection is on
+    perceptual_hash = models.CharField(max_length=16, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
 
 class SOSImage(models.Model):
     sos_request = models.ForeignKey(SOS, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='sos_images/')
+    image = models.ImageField(upload_to='sos_images/', storage=sos_image_storage)
+    blob = models.ForeignKey(ImageBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='images')
+    # An earlier image of the same SOS that looks almost the same
+    near_duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='near_duplicates')
     description = models.CharField(max_length=255, blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Image for SOS {self.sos_request.id} - {self.image.name}"
+
+    class Meta:
+        verbose_name = "SOS Image"
+        verbose_name_plural = "SOS Images"
+
+class SOSImageUpload(models.Model):
+    # Resumable chunked upload of one SOS image, assembled in a partial file until finalized
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sos_request = models.ForeignKey(SOS, on_delete=models.CASCADE, related_name='image_uploads')
+    filename = models.CharField(max_length=255)
+    description = models.CharField(max_length=255, blank=True, null=True)
+    size = models.PositiveBigIntegerField()
+    # Merged [start, end) byte ranges already on disk
+    received_ranges = models.JSONField(default=list)
+    image = models.OneToOneField(SOSImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Upload {self.id} of {self.filename} for SOS {self.sos_request_id}"
+    
+    @property
+    def partial_path(self):
+        return os.path.join(settings.SOS_IMAGE_UPLOAD_DIR, f'{self.id}.part')
+    
+    @property
+    def received_bytes(self):
+        return sum(end - start for start, end in self.received_ranges)
+    
+    @property
+    def is_complete(self):
+        return self.received_ranges == [[0, self.size]]
     
     def delete(self, *args, **kwargs):
-        # Delete the image file when the model instance is deleted
-        if self.image:
-            if os.path.isfile(self.image.path):
-                os.remove(self.image.path)
+        # Discard the partial file along with the upload
+        if os.path.isfile(self.partial_path):
+            os.remove(self.partial_path)
         super().delete(*args, **kwargs)
 
+class Job(models.Model):
+    # Background job queued by api.jobs.enqueue() and run by `manage.py run_jobs`
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # Higher runs first
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    # Queued: not before this. Running: lease end, after which another worker may claim it
+    available_at = models.DateTimeField(default=timezone.now)
+    # Visibility timeout in seconds
+    timeout = models.PositiveIntegerField()
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Job {self.id} {self.name} ({self.status})"
+    
     class Meta:
-        verbose_name = "SOS Image"
-        verbose_name_plural = "SOS Images"
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='api_job_status_available_idx'),
+        ]
+
+# Cold copies of resolved SOS and their children, moved out of the hot tables by
+# `manage.py archive_sos` (api/archive.py). Ids, field names and related names
+# match the hot models so the same serializers and track loading work on both.
+
+class ArchivedSOS(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_sos')
+    name = models.CharField(max_length=255)
+    sos_type = models.IntegerField(choices=SOS.SOS_TYPES)
+    status_flag = models.IntegerField(choices=SOS.STATUS_FLAGS)
+    initial_latitude = models.FloatField()
+    initial_longitude = models.FloatField()
+    unit_number_dispatched = models.CharField(max_length=50, blank=True, null=True)
+    acknowledged_flag = models.IntegerField(choices=SOS.ACK_FLAGS)
+    room_id = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    geohash = models.CharField(max_length=12, blank=True, default='')
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Archived SOS {self.id} - {self.name}"
+    
+    class Meta:
+        verbose_name = "Archived SOS"
+        verbose_name_plural = "Archived SOS Requests"
+
+class ArchivedOfficerAssignment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sos_request = models.ForeignKey(ArchivedSOS, on_delete=models.CASCADE, related_name='officer_assignments')
+    officer_name = models.CharField(max_length=255)
+    unit_number = models.CharField(max_length=50)
+    assigned_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Archived officer: {self.officer_name} - Unit: {self.unit_number} - SOS: {self.sos_request_id}"
+
+class ArchivedLocationUpdate(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sos_request = models.ForeignKey(ArchivedSOS, on_delete=models.CASCADE, related_name='location_updates')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    timestamp = models.DateTimeField()
+    received_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Archived location update for SOS {self.sos_request_id} at {self.timestamp}"
+
+class ArchivedTrackSegment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sos_request = models.ForeignKey(ArchivedSOS, on_delete=models.CASCADE, related_name='track_segments')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    
+    def __str__(self):
+        return f"Archived track segment for SOS {self.sos_request_id} ({self.point_count} points)"
+    
+    class Meta:
+        ordering = ['start_time']
+
+class ArchivedSOSImage(models.Model):
+    # Keeps its reference to the shared file, released when this row is deleted
+    id = models.BigIntegerField(primary_key=True)
+    sos_request = models.ForeignKey(ArchivedSOS, on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='sos_images/', storage=sos_image_storage)
+    blob = models.ForeignKey(ImageBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_images')
+    near_duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='near_duplicates')
+    description = models.CharField(max_length=255, blank=True, null=True)
+    uploaded_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Archived image for SOS {self.sos_request_id} - {self.image.name}"
+    
+    class Meta:
+        verbose_name = "Archived SOS Image"
+        verbose_name_plural = "Archived SOS Images"
@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_token(value):
+    """Encode a JSON-serializable value as an opaque URL-safe token"""
+    raw = json.dumps(value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Decode a token produced by encode_token, raising ValueError if malformed"""
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+
+
+def encode_cursor(created_at, pk):
+    """Encode a (created_at, id) position as an opaque URL-safe cursor"""
+    return encode_token([created_at.isoformat(), pk])
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into (created_at, id)"""
+    try:
+        created_at, pk = decode_token(cursor)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None:
+        raise InvalidCursor('Invalid cursor')
+    return created_at, pk
+
+
+def parse_limit(value, default, maximum):
+    """Parse a positive integer query parameter, clamped to maximum"""
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('must be an integer')
+    if value < 1:
+        raise ValueError('must be a positive integer')
+    return min(value, maximum)
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Return one page of ``queryset`` ordered newest first by (created_at, id)
+    together with the cursor of the following page (or None on the last page).
+
+    Rows are located with a keyset predicate rather than OFFSET, so every
+    page costs the same regardless of how deep into the table it is.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    # Fetch one extra row to learn whether another page exists without a COUNT
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
@@ -0,0 +1,108 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import SOS, LocationUpdate, OfficerAssignment, SOSImage
+
+# Child relation -> (model, server-assigned insert time) that per-incident
+# responses nest. LocationUpdate.timestamp is the client's fix time, which
+# may lie in the past for backfilled points, so received_at is used instead.
+CHILDREN = {
+    'location_updates': (LocationUpdate, 'received_at'),
+    'officer_assignments': (OfficerAssignment, 'assigned_at'),
+    'images': (SOSImage, 'uploaded_at'),
+}
+
+# Cached resource -> the child relations its body includes; all include the SOS row
+RESOURCES = {
+    'detail': ('location_updates', 'officer_assignments', 'images'),
+    'images': ('images',),
+}
+
+
+def _key(resource, sos_id, *parts):
+    return ':'.join(['sos-response', resource, str(sos_id), *map(str, parts)])
+
+
+def _children(relation):
+    model, _ = CHILDREN[relation]
+    return model.objects.filter(sos_request=OuterRef('pk'))
+
+
+def _child_count(relation):
+    return Subquery(_children(relation).order_by().values('sos_request').annotate(value=Count('id')).values('value'))
+
+
+def _latest_child(relation, field):
+    # Newest row by id, found from the sos_request index without reading the others
+    return Subquery(_children(relation).order_by('-id').values(field)[:1])
+
+
+def incident_validators(resource, sos_id):
+    """
+    (etag, last_modified) of a resource of one SOS, or None if there is no
+    such SOS. Computed per request, with one indexed query, from
+    SOS.updated_at and the count, newest id and its insert time for each
+    nested relation, so every process agrees on them without invalidation.
+    In-place edits of children touch SOS.updated_at (see api/signals.py).
+    """
+    annotations = {}
+    for relation in RESOURCES[resource]:
+        _, time_field = CHILDREN[relation]
+        annotations[f'{relation}_count'] = _child_count(relation)
+        annotations[f'{relation}_last_id'] = _latest_child(relation, 'id')
+        annotations[f'{relation}_last_time'] = _latest_child(relation, time_field)
+    try:
+        row = SOS.objects.filter(pk=sos_id).annotate(**annotations).values('updated_at', *annotations).get()
+    except (SOS.DoesNotExist, ValueError, TypeError):
+        return None
+    times = [row['updated_at']] + [row[f'{relation}_last_time'] for relation in RESOURCES[resource]]
+    last_modified = max(value for value in times if value is not None)
+    fingerprint = repr((resource, sorted(row.items())))
+    etag = f'"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+    return etag, int(last_modified.timestamp())
+
+
+def cached_incident_response(request, resource, sos_id, build):
+    """
+    Serve a per-SOS GET with ETag/Last-Modified: 304 when the client's copy
+    is current, else the body cached under the current ETag, else ``build()``.
+    A write gives the SOS a new ETag, so cached bodies never need deleting;
+    they expire after SOS_RESPONSE_CACHE_TTL.
+    ``build`` returns (data, cacheable); bodies that will change without a
+    database write (e.g. thumbnails still being generated) are sent without
+    validators and not cached. Returns None if there is no such SOS.
+    """
+    validators = incident_validators(resource, sos_id)
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None and conditional.status_code == status.HTTP_304_NOT_MODIFIED:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        # Image URLs are absolute, so bodies differ per host the API is reached on
+        key = _key(resource, sos_id, 'body', etag, request.build_absolute_uri('/'))
+        data = cache.get(key)
+        if data is None:
+            data, cacheable = build()
+            if not cacheable:
+                return Response(data, status=status.HTTP_200_OK)
+            cache.set(key, data, settings.SOS_RESPONSE_CACHE_TTL)
+        response = Response(data, status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Authenticated data: clients may keep it but must revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def derivatives_ready(images):
+    """Whether every serialized image already has all its variant URLs"""
+    return all(image['thumbnail_url'] and image['preview_url'] for image in images if image['image_url'])
@@ -1,6 +1,19 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import SOS, OfficerAssignment, LocationUpdate, SOSImage
+from .models import (
+    SOS, OfficerAssignment, LocationUpdate, SOSImage, SOSImageUpload, SOSTombstone,
+    ArchivedSOS, ArchivedOfficerAssignment, ArchivedLocationUpdate, ArchivedSOSImage
+)
+from .derivatives import derivative_url
+from .trajectory import unpack_track
+from .sos_cache import sos_cache
+from .uploads import next_offset
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,22 +32,59 @@ class OfficerAssignmentSerializer(serializers.ModelSerializer):
 
 class SOSImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    # Downscaled variants; None until the background worker has made them
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     
     class Meta:
         model = SOSImage
-        fields = ('id', 'sos_request', 'image', 'image_url', 'description', 'uploaded_at')
-        read_only_fields = ('uploaded_at',)
+        fields = ('id', 'sos_request', 'image', 'image_url', 'thumbnail_url', 'preview_url', 'near_duplicate_of', 'description', 'uploaded_at')
+        read_only_fields = ('near_duplicate_of', 'uploaded_at')
+    
+    def absolute_url(self, url):
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
     
     def get_image_url(self, obj):
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return self.absolute_url(obj.image.url)
+        return None
+    
+    def get_thumbnail_url(self, obj):
+        if obj.image:
+            return self.absolute_url(derivative_url(obj.image.name, 'thumbnail'))
         return None
+    
+    def get_preview_url(self, obj):
+        if obj.image:
+            return self.absolute_url(derivative_url(obj.image.name, 'preview'))
+        return None
+
+def compacted_location_updates(sos):
+    """
+    Points that compact_locations packed into track segments, shaped like
+    LocationUpdateSerializer output; they no longer have an id or a
+    received_at of their own.
+    """
+    timestamp_field = serializers.DateTimeField()
+    return [
+        {
+            'id': None,
+            'latitude': latitude,
+            'longitude': longitude,
+            'timestamp': timestamp_field.to_representation(timestamp),
+            'received_at': None,
+            'sos_request': sos.id,
+        }
+        for segment in sos.track_segments.all()
+        for latitude, longitude, timestamp in unpack_track(segment.data)
+    ]
 
 class SOSSerializer(serializers.ModelSerializer):
-    location_updates = LocationUpdateSerializer(many=True, read_only=True)
+    # Compacted history first (it is the oldest), then the points still stored row by row
+    location_updates = serializers.SerializerMethodField()
     officer_assignments = OfficerAssignmentSerializer(many=True, read_only=True)
     images = SOSImageSerializer(many=True, read_only=True)
     
@@ -42,16 +92,134 @@ class SOSSerializer(serializers.ModelSerializer):
         model = SOS
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
+    
+    def get_location_updates(self, obj):
+        rows = LocationUpdateSerializer(obj.location_updates.all(), many=True, context=self.context).data
+        return compacted_location_updates(obj) + list(rows)
+
+class SOSListSerializer(SOSSerializer):
+    # Only the most recent location updates, prefetched by the list view
+    location_updates = LocationUpdateSerializer(source='recent_location_updates', many=True, read_only=True)
+
+class ArchivedLocationUpdateSerializer(LocationUpdateSerializer):
+    class Meta(LocationUpdateSerializer.Meta):
+        model = ArchivedLocationUpdate
+
+class ArchivedOfficerAssignmentSerializer(OfficerAssignmentSerializer):
+    class Meta(OfficerAssignmentSerializer.Meta):
+        model = ArchivedOfficerAssignment
+
+class ArchivedSOSImageSerializer(SOSImageSerializer):
+    class Meta(SOSImageSerializer.Meta):
+        model = ArchivedSOSImage
+
+class ArchivedSOSSerializer(serializers.ModelSerializer):
+    # Same shape as SOSSerializer, plus archived_at
+    location_updates = serializers.SerializerMethodField()
+    officer_assignments = ArchivedOfficerAssignmentSerializer(many=True, read_only=True)
+    images = ArchivedSOSImageSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = ArchivedSOS
+        fields = '__all__'
+    
+    def get_location_updates(self, obj):
+        rows = ArchivedLocationUpdateSerializer(obj.location_updates.all(), many=True, context=self.context).data
+        return compacted_location_updates(obj) + list(rows)
+
+class SOSSummarySerializer(serializers.ModelSerializer):
+    # Flat representation without nested children
+    class Meta:
+        model = SOS
+        fields = '__all__'
+
+class SOSTombstoneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SOSTombstone
+        fields = ('sos_id', 'room_id', 'deleted_at')
 
 class SOSCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = SOS
         fields = ('name', 'sos_type', 'initial_latitude', 'initial_longitude')
 
+class CachedSOSField(serializers.PrimaryKeyRelatedField):
+    """SOS primary key validated against sos_cache; the value is an SOSState, not an SOS"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(queryset=SOS.objects.all(), **kwargs)
+    
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        state = sos_cache.get(data)
+        if state is None:
+            self.fail('does_not_exist', pk_value=data)
+        return state
+    
+    @contextmanager
+    def writing(self, state):
+        """
+        Report a write that fails because the SOS was deleted after it was
+        cached (e.g. by archive_sos in another process) as does_not_exist
+        """
+        try:
+            yield
+        except IntegrityError:
+            sos_cache.invalidate(state.id)
+            if SOS.objects.filter(pk=state.id).exists():
+                raise
+            raise serializers.ValidationError({self.field_name: [
+                self.error_messages['does_not_exist'].format(pk_value=state.id)
+            ]})
+
 class LocationUpdateCreateSerializer(serializers.ModelSerializer):
+    sos_request = CachedSOSField()
+    
     class Meta:
         model = LocationUpdate
         fields = ('sos_request', 'latitude', 'longitude')
+    
+    def create(self, validated_data):
+        # Only the id is needed, so the SOS row is never loaded
+        sos = validated_data.pop('sos_request')
+        with self.fields['sos_request'].writing(sos):
+            return LocationUpdate.objects.create(sos_request_id=sos.id, **validated_data)
+
+class LocationPointSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    timestamp = serializers.DateTimeField(required=False)
+    
+    def validate_timestamp(self, value):
+        # A fast device clock would otherwise make its points the latest for good
+        now = timezone.now()
+        if value > now + timedelta(seconds=settings.LOCATION_MAX_CLOCK_SKEW):
+            raise serializers.ValidationError('Timestamp is in the future.')
+        return min(value, now)
+
+class LocationBatchCreateSerializer(serializers.Serializer):
+    sos_request = CachedSOSField()
+    points = serializers.ListField(
+        child=LocationPointSerializer(),
+        min_length=1,
+        max_length=settings.LOCATION_BATCH_MAX_POINTS
+    )
+    
+    def create(self, validated_data):
+        sos = validated_data['sos_request']
+        now = timezone.now()
+        points = sorted(validated_data['points'], key=lambda point: point.get('timestamp') or now)
+        with self.fields['sos_request'].writing(sos):
+            return LocationUpdate.objects.bulk_create([
+                LocationUpdate(
+                    sos_request_id=sos.id,
+                    latitude=point['latitude'],
+                    longitude=point['longitude'],
+                    timestamp=point.get('timestamp') or now
+                )
+                for point in points
+            ])
 
 class OfficerAssignmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -62,3 +230,37 @@ class SOSImageCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = SOSImage
         fields = ('sos_request', 'image', 'description')
+    
+    def create(self, validated_data):
+        # Storing the file and counting the reference to it in one
+        # transaction keeps a shared file from being deleted in between
+        with transaction.atomic():
+            return super().create(validated_data)
+
+class SOSImageUploadCreateSerializer(serializers.ModelSerializer):
+    sos_id = serializers.PrimaryKeyRelatedField(source='sos_request', queryset=SOS.objects.all())
+    size = serializers.IntegerField(min_value=1, max_value=settings.SOS_IMAGE_UPLOAD_MAX_SIZE)
+    
+    class Meta:
+        model = SOSImageUpload
+        fields = ('sos_id', 'filename', 'size', 'description')
+
+class SOSImageUploadSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    sos_id = serializers.IntegerField(source='sos_request_id', read_only=True)
+    offset = serializers.SerializerMethodField()
+    received_bytes = serializers.IntegerField(read_only=True)
+    complete = serializers.BooleanField(source='is_complete', read_only=True)
+    chunk_size = serializers.SerializerMethodField()
+    image_id = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = SOSImageUpload
+        fields = ('upload_id', 'sos_id', 'filename', 'size', 'received_ranges', 'received_bytes',
+                  'offset', 'complete', 'chunk_size', 'image_id', 'created_at')
+    
+    def get_offset(self, obj):
+        return next_offset(obj.received_ranges)
+    
+    def get_chunk_size(self, obj):
+        return settings.SOS_IMAGE_UPLOAD_CHUNK_SIZE
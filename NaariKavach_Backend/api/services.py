@@ -0,0 +1,93 @@
+import uuid
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from .emitter import get_emitter
+from .serializers import SOSCreateSerializer, LocationUpdateCreateSerializer
+
+
+def emit_to_socketio(event, data):
+    """Queue event for the Socket.IO server; delivery happens off the request path"""
+    if settings.SOCKETIO_EMIT_ENABLED:
+        get_emitter().emit(event, data)
+
+
+def create_sos(data, user=None):
+    """
+    Validate and store a new SOS, then announce it on the SOS channel.
+    Shared by the REST view and the Socket.IO create_sos event.
+    Returns (sos, errors); exactly one of them is None.
+    """
+    serializer = SOSCreateSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    # Generate a unique room ID for this SOS
+    room_id = str(uuid.uuid4())
+
+    # Associate with user if authenticated
+    if user is not None and user.is_authenticated:
+        sos = serializer.save(user=user, room_id=room_id)
+    else:
+        sos = serializer.save(room_id=room_id)
+
+    # Emit to SOS channel when new SOS is created
+    emit_to_socketio('sos_created', {
+        'sos_id': sos.id,
+        'room_id': room_id,
+        'name': sos.name,
+        'sos_type': sos.sos_type,
+        'latitude': sos.initial_latitude,
+        'longitude': sos.initial_longitude,
+        'created_at': sos.created_at.isoformat()
+    })
+    return sos, None
+
+
+def sos_created_response(sos):
+    """Response body for a created SOS, with the room to join for live updates"""
+    return {
+        "status": "success",
+        "message": "SOS created successfully",
+        "sos_id": sos.id,
+        "room_id": sos.room_id
+    }
+
+
+def record_location(data):
+    """
+    Validate and store one location update, then forward it to the SOS
+    room and the dispatched unit. Returns (location_update, errors).
+    """
+    serializer = LocationUpdateCreateSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    try:
+        location_update = serializer.save()
+    except ValidationError as e:
+        # The cached SOS was deleted meanwhile
+        return None, e.detail
+    # Cached id/room/unit of the SOS, so a steady stream of pings is one INSERT each
+    sos = serializer.validated_data['sos_request']
+
+    # Emit location update to specific SOS room
+    emit_to_socketio('location_update_to_room', {
+        'room_id': sos.room_id,
+        'sos_id': sos.id,
+        'latitude': location_update.latitude,
+        'longitude': location_update.longitude,
+        'timestamp': location_update.timestamp.isoformat()
+    })
+
+    # If SOS has assigned unit, also emit to unit channel
+    if sos.unit_number_dispatched:
+        emit_to_socketio('location_update_to_unit', {
+            'unit_number': sos.unit_number_dispatched,
+            'sos_id': sos.id,
+            'latitude': location_update.latitude,
+            'longitude': location_update.longitude,
+            'timestamp': location_update.timestamp.isoformat()
+        })
+    return location_update, None
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .derivatives import schedule_derivatives
+from .image_store import register_image, release_image
+from .sos_cache import sos_cache
+from .models import SOS, ArchivedSOSImage, LocationUpdate, OfficerAssignment, SOSImage, SOSTombstone
+
+
+@receiver(post_delete, sender=SOS)
+def record_sos_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone behind so delta-sync clients learn about the deletion"""
+    SOSTombstone.objects.create(sos_id=instance.id, room_id=instance.room_id)
+
+
+@receiver(post_save, sender=SOS)
+@receiver(post_delete, sender=SOS)
+def invalidate_cached_sos(sender, instance, **kwargs):
+    """Drop the cached state so the next lookup reads the new row"""
+    sos_id = instance.id
+    sos_cache.invalidate(sos_id)
+    # Again at commit, in case another thread cached the old row meanwhile
+    transaction.on_commit(lambda: sos_cache.invalidate(sos_id))
+
+
+@receiver(post_save, sender=LocationUpdate)
+@receiver(post_save, sender=OfficerAssignment)
+@receiver(post_save, sender=SOSImage)
+def touch_sos_on_child_edit(sender, instance, created, raw=False, **kwargs):
+    """
+    Response validators count the children of an SOS and follow the newest
+    one, which an in-place edit leaves alone; a new updated_at gives the
+    SOS new ETags instead
+    """
+    if not created and not raw:
+        SOS.objects.filter(pk=instance.sos_request_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=SOSImage)
+def reference_sos_image_file(sender, instance, created, **kwargs):
+    """Count the new image against its shared file and flag near-duplicates"""
+    if created and instance.image:
+        register_image(instance)
+
+
+@receiver(post_delete, sender=SOSImage)
+def release_sos_image_file(sender, instance, **kwargs):
+    """Delete the file once no image refers to it, also on cascading deletes"""
+    release_image(instance)
+
+
+@receiver(post_delete, sender=ArchivedSOSImage)
+def release_archived_sos_image_file(sender, instance, **kwargs):
+    """Archived images keep their file reference until they are deleted too"""
+    release_image(instance)
+
+
+@receiver(post_save, sender=SOSImage)
+def generate_sos_image_derivatives(sender, instance, created, **kwargs):
+    """Build thumbnails in the background once the new image is committed"""
+    if created and instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: schedule_derivatives(name))
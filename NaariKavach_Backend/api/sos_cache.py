@@ -0,0 +1,126 @@
+import collections
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+
+@dataclass(frozen=True)
+class SOSState:
+    """The fields of an SOS that location ingestion and dispatch need"""
+    id: int
+    room_id: str
+    status_flag: int
+    unit_number_dispatched: str
+    initial_latitude: float
+    initial_longitude: float
+
+    FIELDS = ('id', 'room_id', 'status_flag', 'unit_number_dispatched', 'initial_latitude', 'initial_longitude')
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class SOSCache:
+    """
+    In-process read-through cache of SOSState, looked up by id or room_id.
+    At most ``max_entries`` SOS are kept, least recently used dropped first,
+    and an entry is reloaded once it is ``ttl`` seconds old. Signals on SOS
+    invalidate entries in this process; ``ttl`` bounds how stale a change
+    made by another process (or by queryset.update()) can be here.
+    """
+
+    def __init__(self, max_entries=10000, ttl=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()  # {sos_id: (SOSState, expires_at)}, LRU first
+        self._rooms = {}  # {room_id: sos_id}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one is not stored
+        self._version = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _cached(self, sos_id):
+        entry = self._entries.get(sos_id)
+        if entry is None:
+            return None
+        if entry[1] <= self.clock():
+            self._remove(sos_id)
+            return None
+        self._entries.move_to_end(sos_id)
+        return entry[0]
+
+    def _remove(self, sos_id):
+        entry = self._entries.pop(sos_id, None)
+        if entry is not None and self._rooms.get(entry[0].room_id) == sos_id:
+            del self._rooms[entry[0].room_id]
+
+    def _load(self, **lookup):
+        from .models import SOS
+
+        with self._lock:
+            version = self._version
+            self._misses += 1
+        row = SOS.objects.filter(**lookup).values(*SOSState.FIELDS).first()
+        if row is None:
+            return None
+        state = SOSState(**row)
+        with self._lock:
+            if version == self._version:
+                self._store(state)
+        return state
+
+    def _store(self, state):
+        self._remove(state.id)
+        self._entries[state.id] = (state, self.clock() + self.ttl)
+        if state.room_id:
+            self._rooms[state.room_id] = state.id
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def get(self, sos_id):
+        """SOSState for an id, or None if there is no such SOS"""
+        try:
+            sos_id = int(sos_id)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            state = self._cached(sos_id)
+            if state is not None:
+                self._hits += 1
+                return state
+        return self._load(id=sos_id)
+
+    def get_by_room(self, room_id):
+        """SOSState for a Socket.IO room id, or None"""
+        if not room_id:
+            return None
+        with self._lock:
+            sos_id = self._rooms.get(room_id)
+            state = self._cached(sos_id) if sos_id is not None else None
+            if state is not None:
+                self._hits += 1
+                return state
+        return self._load(room_id=room_id)
+
+    def invalidate(self, sos_id):
+        with self._lock:
+            self._version += 1
+            self._remove(sos_id)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._rooms.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+
+sos_cache = SOSCache(settings.SOS_CACHE_MAX_ENTRIES, settings.SOS_CACHE_TTL)
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from PIL import Image
+
+DIGEST_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+def content_digest(name):
+    """SHA-256 of a file stored by ContentAddressedStorage, else None"""
+    stem = os.path.splitext(posixpath.basename(name or ''))[0]
+    return stem if DIGEST_NAME.match(stem) else None
+
+
+class HashingUploadMixin:
+    """
+    Hash uploaded files as the request body streams in, so the storage
+    does not have to read them again. The digest is left on the file as
+    ``content_digest``.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Before super(): the memory handler raises StopFutureHandlers there
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # The memory handler passes the data on untouched when the upload
+        # is too big for it; only the handler that keeps the file hashes it
+        if getattr(self, 'activated', True):
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_digest = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, at ``<upload_to>/<ab>/<sha256><ext>``.
+    Saving content that is already on disk, and still owned by an ImageBlob,
+    writes nothing and returns the existing name; ImageBlob rows count the
+    SOSImage rows sharing a file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Never rename: equal names mean equal content
+        return name
+
+    def _save(self, name, content):
+        digest = getattr(content, 'content_digest', None)
+        if digest is None:
+            hasher = hashlib.sha256()
+            for chunk in content.chunks():
+                hasher.update(chunk)
+            digest = hasher.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        if self._is_shared(digest) and self.exists(name):
+            if hasattr(content, 'temporary_file_path'):
+                # Consume the temporary file as a move would have
+                try:
+                    os.remove(content.temporary_file_path())
+                except FileNotFoundError:
+                    pass
+            return name
+        # Write beside the target and rename into place, so a concurrent
+        # save of the same content never sees a half-written file
+        staging = posixpath.join(directory, digest[:2], f'.{uuid.uuid4().hex}.tmp')
+        staging = super()._save(staging, content)
+        os.replace(self.path(staging), self.path(name))
+        return name
+
+
+    @staticmethod
+    def _is_shared(digest):
+        """
+        Whether an ImageBlob row still owns the file for ``digest``. The row
+        is locked until the caller's transaction ends, and release_image()
+        deletes files under the same lock, so a caller that saves and
+        counts its reference in one transaction cannot have the file
+        deleted in between. Without a row the file may be on its way out,
+        so it is written again.
+        """
+        from .models import ImageBlob
+
+        with transaction.atomic():
+            owner = ImageBlob.objects.select_for_update().filter(digest=digest).values_list('pk', flat=True)
+            return owner.first() is not None
+
+
+def sos_image_storage():
+    return storages['sos_images']
+
+
+def perceptual_hash(handle):
+    """
+    64-bit difference hash of an image: one bit per horizontally adjacent
+    pair of pixels in a 9x8 greyscale thumbnail. Re-encoded or slightly
+    changed frames differ in only a few bits.
+    """
+    with Image.open(handle) as image:
+        image.draft('L', (64, 64))
+        pixels = image.convert('L').resize((9, 8), Image.LANCZOS).tobytes()
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    return f'{value:016x}'
+
+
+def hamming_distance(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import SOS, LocationUpdate, OfficerAssignment, SOSTombstone
+from .pagination import decode_token, encode_token
+
+# Change stream -> (model, server-side time the row was written)
+STREAMS = {
+    'sos': (SOS, 'updated_at'),
+    'location_updates': (LocationUpdate, 'received_at'),
+    'officer_assignments': (OfficerAssignment, 'assigned_at'),
+    'tombstones': (SOSTombstone, 'deleted_at'),
+}
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+class Watermark:
+    """
+    Position of a sync client in each change stream, as the (time, id) of
+    the last row it received. Streams are read in (time, id) order: SOS by
+    updated_at since they are modified in place, the append-only streams by
+    their insert time.
+    """
+    __slots__ = ('positions',)
+
+    def __init__(self, positions=None):
+        self.positions = dict(positions or {})
+
+    def position(self, stream):
+        return self.positions.get(stream, (None, 0))
+
+    def encode(self):
+        values = []
+        for stream in STREAMS:
+            time, row_id = self.position(stream)
+            values += [time.isoformat() if time else None, row_id]
+        return encode_token(values)
+
+    @classmethod
+    def decode(cls, token):
+        if not token:
+            return cls()
+        try:
+            values = decode_token(token)
+            if not isinstance(values, list) or len(values) != 2 * len(STREAMS):
+                raise ValueError('bad length')
+            positions = {}
+            for index, stream in enumerate(STREAMS):
+                time, row_id = values[2 * index:2 * index + 2]
+                if time is not None:
+                    time = parse_datetime(time)
+                    if time is None:
+                        raise ValueError('bad timestamp')
+                positions[stream] = (time, int(row_id))
+            return cls(positions)
+        except (ValueError, TypeError):
+            raise InvalidWatermark('Invalid watermark')
+
+
+def _take(queryset, limit):
+    """Evaluate at most ``limit`` rows and report whether more were available"""
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def collect_changes(watermark, limit, now=None):
+    """
+    Collect everything that changed after ``watermark``, at most ``limit``
+    rows per stream. Returns the changed rows, the watermark to resume from
+    and whether any stream was truncated.
+
+    Rows are stamped before their transaction commits, so a row can become
+    visible after a later-stamped one. Only rows stamped more than
+    SOS_SYNC_SETTLE_SECONDS ago are returned: every transaction that could
+    still add a row behind the new watermark has committed by then.
+    """
+    horizon = (now or timezone.now()) - timedelta(seconds=settings.SOS_SYNC_SETTLE_SECONDS)
+    changes = {}
+    positions = {}
+    has_more = False
+    for stream, (model, time_field) in STREAMS.items():
+        queryset = model.objects.filter(**{f'{time_field}__lte': horizon}).order_by(time_field, 'id')
+        time, row_id = watermark.position(stream)
+        if time is not None:
+            queryset = queryset.filter(
+                Q(**{f'{time_field}__gt': time}) |
+                Q(**{time_field: time, 'id__gt': row_id})
+            )
+        rows, more = _take(queryset, limit)
+        changes[stream] = rows
+        positions[stream] = (getattr(rows[-1], time_field), rows[-1].id) if rows else (time, row_id)
+        has_more = has_more or more
+    return changes, Watermark(positions), has_more
@@ -1,10 +1,53 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
-from .models import SOS, LocationUpdate, OfficerAssignment
+from .models import (
+    SOS, ArchivedLocationUpdate, ArchivedSOS, ArchivedSOSImage, ImageBlob, Job, LocationUpdate, OfficerAssignment, SOSImage, SOSImageUpload,
+    SOSTombstone, SocketEvent, SocketPresence, UnitLocation
+)
+from .consumers.event_log import DatabaseEventLog, EventLog
+from .consumers.location_service import BroadcastThrottle, LocationHistoryStore
+from .consumers.officer_service import UnitLocationIndex, UnitLocationStore
+from .consumers.pubsub import (AsyncDatabaseManager, AsyncInProcessManager, DatabaseManager, DatabasePresence,
+                               InProcessBroker, InProcessManager, PollingPubSubManager, build_client_manager)
+from .consumers.sos_consumer import SOSNamespace
+from .consumers.wire import decode_location_frame, encode_location_body, location_frame
+from .consumers.upstream import CircuitBreaker, OrmUpstream, UpstreamClient, UpstreamError, UpstreamUnavailable
+from . import emitter as emitter_module
+from . import services
+from .emitter import LocalEventBus, SocketIOEmitter
+from asgiref.sync import async_to_sync
+from .archive import _copy_rows, archive_batch, archive_resolved
+from .derivatives import derivative_name, generate_derivatives, schedule_derivatives
+from .jobs import Worker, claim_jobs, enqueue, run_job, task
+from .serializers import SOSImageSerializer
+from .sos_cache import SOSCache, sos_cache
+from .storage import hamming_distance, perceptual_hash
+from .uploads import ClientDisconnected, merge_range, write_stream
+from .trajectory import decode_polyline, encode_polyline, pack_track, unpack_track
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection
+from PIL import Image
+from django.utils import timezone
+from datetime import timedelta
 from rest_framework import status
+import asyncio
+import hashlib
+import io
 import json
+import os
+import random
+import requests
+import socketio
+import shutil
+import tempfile
+import threading
+import time
 import uuid
+from unittest import mock
 
 class SOSAPITestCase(TestCase):
     def setUp(self):
@@ -193,3 +236,1972 @@ class SOSAPITestCase(TestCase):
         # Try to resolve an SOS without authentication
         response = self.client.post(f'/api/resolve-sos/{sos.id}/', format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class GetAllSOSPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        
+        # Create a handful of SOS requests with location history
+        self.sos_list = []
+        for i in range(5):
+            sos = SOS.objects.create(
+                name=f'Person {i}',
+                sos_type=0,
+                initial_latitude=28.7041,
+                initial_longitude=77.1025,
+                room_id=str(uuid.uuid4())
+            )
+            for j in range(4):
+                LocationUpdate.objects.create(
+                    sos_request=sos,
+                    latitude=28.7041 + j * 0.001,
+                    longitude=77.1025
+                )
+            self.sos_list.append(sos)
+    
+    def test_pages_follow_cursor_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'page_size': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/get-all-sos/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.data['data'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        
+        self.assertEqual(seen, [sos.id for sos in reversed(self.sos_list)])
+    
+    def test_location_history_is_capped(self):
+        response = self.client.get('/api/get-all-sos/', {'location_limit': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data['data']:
+            self.assertEqual(len(item['location_updates']), 3)
+    
+    def test_query_count_is_independent_of_page_size(self):
+        # One query for the page plus one per prefetched relation
+        with self.assertNumQueries(4):
+            self.client.get('/api/get-all-sos/', {'page_size': 1})
+        with self.assertNumQueries(4):
+            self.client.get('/api/get-all-sos/', {'page_size': 5})
+    
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/get-all-sos/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SOS_SYNC_SETTLE_SECONDS=0)
+class SyncSOSTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.sos = SOS.objects.create(
+            name='Test Person',
+            sos_type=0,
+            initial_latitude=28.7041,
+            initial_longitude=77.1025,
+            room_id=str(uuid.uuid4())
+        )
+    
+    def test_initial_sync_returns_everything(self):
+        LocationUpdate.objects.create(sos_request=self.sos, latitude=28.7051, longitude=77.1030)
+        
+        response = self.client.get('/api/sync-sos/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['sos']], [self.sos.id])
+        self.assertEqual(len(response.data['location_updates']), 1)
+        self.assertEqual(response['ETag'], f'"{response.data["watermark"]}"')
+    
+    def test_only_changes_since_watermark_are_returned(self):
+        watermark = self.client.get('/api/sync-sos/').data['watermark']
+        
+        LocationUpdate.objects.create(sos_request=self.sos, latitude=28.7051, longitude=77.1030)
+        self.sos.acknowledged_flag = 1
+        self.sos.save()
+        
+        response = self.client.get('/api/sync-sos/', {'since': watermark})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['sos']), 1)
+        self.assertEqual(response.data['sos'][0]['acknowledged_flag'], 1)
+        self.assertEqual(len(response.data['location_updates']), 1)
+        self.assertEqual(response.data['officer_assignments'], [])
+    
+    def test_unchanged_poll_is_not_modified(self):
+        etag = self.client.get('/api/sync-sos/')['ETag']
+        
+        response = self.client.get('/api/sync-sos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+    
+    def test_any_etag_is_not_modified(self):
+        response = self.client.get('/api/sync-sos/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_foreign_etag_is_ignored(self):
+        response = self.client.get('/api/sync-sos/', HTTP_IF_NONE_MATCH='"d41d8cd98f00b204e9800998ecf8427e"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['sos']], [self.sos.id])
+    
+    def test_deleted_sos_produces_tombstone(self):
+        watermark = self.client.get('/api/sync-sos/').data['watermark']
+        sos_id = self.sos.id
+        self.sos.delete()
+        
+        response = self.client.get('/api/sync-sos/', {'since': watermark})
+        self.assertEqual([item['sos_id'] for item in response.data['tombstones']], [sos_id])
+    
+    def test_batches_are_resumable(self):
+        for i in range(3):
+            LocationUpdate.objects.create(sos_request=self.sos, latitude=28.7 + i, longitude=77.1)
+        
+        first = self.client.get('/api/sync-sos/', {'limit': 2}).data
+        self.assertTrue(first['has_more'])
+        second = self.client.get('/api/sync-sos/', {'limit': 2, 'since': first['watermark']}).data
+        self.assertFalse(second['has_more'])
+        ids = [item['id'] for item in first['location_updates'] + second['location_updates']]
+        self.assertEqual(len(set(ids)), 3)
+    
+    @override_settings(SOS_SYNC_SETTLE_SECONDS=60)
+    def test_rows_are_withheld_until_settled(self):
+        def stamp(point, seconds_ago):
+            LocationUpdate.objects.filter(pk=point.pk).update(
+                received_at=timezone.now() - timedelta(seconds=seconds_ago)
+            )
+        
+        SOS.objects.filter(pk=self.sos.pk).update(updated_at=timezone.now() - timedelta(minutes=10))
+        first = LocationUpdate.objects.create(sos_request=self.sos, latitude=28.7051, longitude=77.1030)
+        stamp(first, 300)
+        watermark = self.client.get('/api/sync-sos/').data['watermark']
+        
+        # A point stamped just now may sit behind one whose transaction has not committed yet
+        late = LocationUpdate.objects.create(sos_request=self.sos, latitude=28.7061, longitude=77.1040)
+        response = self.client.get('/api/sync-sos/', {'since': watermark})
+        self.assertEqual(response.data['location_updates'], [])
+        self.assertEqual(response.data['watermark'], watermark)
+        
+        stamp(late, 120)
+        response = self.client.get('/api/sync-sos/', {'since': watermark})
+        self.assertEqual([item['id'] for item in response.data['location_updates']], [late.id])
+
+
+class NearbySOSTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        
+        def create(name, latitude, longitude, status_flag=0):
+            return SOS.objects.create(
+                name=name,
+                initial_latitude=latitude,
+                initial_longitude=longitude,
+                status_flag=status_flag,
+                room_id=str(uuid.uuid4())
+            )
+        
+        # Roughly 0m, 550m and 1.1km north of India Gate, plus one far away
+        self.here = create('Here', 28.6129, 77.2295)
+        self.close = create('Close', 28.6179, 77.2295)
+        self.further = create('Further', 28.6229, 77.2295)
+        self.far = create('Far', 19.0760, 72.8777)
+        self.resolved = create('Resolved', 28.6130, 77.2295, status_flag=1)
+    
+    def test_geohash_is_maintained_on_save(self):
+        self.assertEqual(len(self.here.geohash), 9)
+        self.assertTrue(self.close.geohash.startswith('ttnf'))
+    
+    def test_nearby_returns_unresolved_ordered_by_distance(self):
+        response = self.client.get('/api/sos/nearby/', {'lat': 28.6129, 'lon': 77.2295, 'radius': 2000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['data']],
+            [self.here.id, self.close.id, self.further.id]
+        )
+        distances = [item['distance_m'] for item in response.data['data']]
+        self.assertEqual(distances, sorted(distances))
+    
+    def test_nearby_respects_radius(self):
+        response = self.client.get('/api/sos/nearby/', {'lat': 28.6129, 'lon': 77.2295, 'radius': 800})
+        self.assertEqual([item['id'] for item in response.data['data']], [self.here.id, self.close.id])
+    
+    def test_nearby_requires_coordinates(self):
+        response = self.client.get('/api/sos/nearby/', {'lat': 28.6129})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DispatchSuggestionTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='dispatcher', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.sos = SOS.objects.create(
+            name='Test Person',
+            initial_latitude=28.6129,
+            initial_longitude=77.2295,
+            room_id=str(uuid.uuid4())
+        )
+        
+        # As a Socket.IO server records officer_location_update events
+        server = UnitLocationStore()
+        server.record('Unit-near', 28.6139, 77.2295)
+        server.record('Unit-mid', 28.6229, 77.2295)
+        server.record('Unit-far', 28.7129, 77.2295)
+        server.record('Unit-off', 28.6130, 77.2295, available=False)
+        
+        # The API process reads them from the table
+        self.units = UnitLocationStore(refresh_interval=0)
+        patcher = mock.patch('api.consumers.officer_service.unit_locations', self.units)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_index_ranks_by_distance(self):
+        ranked = [position.unit_number for position, _ in self.units.index().nearest(28.6129, 77.2295, k=2)]
+        self.assertEqual(ranked, ['Unit-near', 'Unit-mid'])
+    
+    def test_positions_are_written_at_most_once_per_interval(self):
+        now = [0.0]
+        units = UnitLocationStore(write_interval=10, clock=lambda: now[0])
+        self.assertTrue(units.record('Unit-x', 28.60, 77.20))
+        now[0] = 5
+        self.assertFalse(units.record('Unit-x', 28.61, 77.20))
+        # Availability changes are written straight away
+        self.assertTrue(units.record('Unit-x', 28.62, 77.20, available=False))
+        now[0] = 16
+        self.assertTrue(units.record('Unit-x', 28.63, 77.20))
+        location = UnitLocation.objects.get(unit_number='Unit-x')
+        self.assertEqual((location.latitude, location.available), (28.63, False))
+    
+    def test_index_is_refreshed_incrementally(self):
+        now = [0.0]
+        units = UnitLocationStore(refresh_interval=1.0, clock=lambda: now[0])
+        index = units.index()
+        self.assertEqual(len(index), 4)
+        
+        UnitLocationStore().record('Unit-new', 28.6130, 77.2296)
+        with CaptureQueriesContext(connection) as context:
+            self.assertIs(units.index(), index)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertNotIn('Unit-new', [position.unit_number for position, _ in index.nearest(28.6129, 77.2295)])
+        
+        now[0] = 1.5
+        self.assertIs(units.index(), index)
+        self.assertEqual(index.nearest(28.6129, 77.2295, k=1)[0][0].unit_number, 'Unit-new')
+    
+    def test_write_history_only_keeps_recent_units(self):
+        now = [0.0]
+        units = UnitLocationStore(write_interval=10, clock=lambda: now[0])
+        for i in range(5):
+            units.record(f'Unit-{i}', 28.6, 77.2)
+        now[0] = 11
+        units.record('Unit-late', 28.6, 77.2)
+        self.assertEqual(list(units._written), ['Unit-late'])
+    
+    def test_stale_positions_are_not_suggested(self):
+        UnitLocation.objects.filter(unit_number='Unit-near').update(updated_at=timezone.now() - timedelta(minutes=10))
+        response = self.client.get('/api/assign-officer/', {'sos_id': self.sos.id, 'k': 1})
+        self.assertEqual([unit['unit_number'] for unit in response.data['suggested_units']], ['Unit-mid'])
+    
+    def test_index_matches_brute_force(self):
+        index = UnitLocationIndex(cell_size_deg=0.01)
+        rng = random.Random(7)
+        for i in range(500):
+            index.update(f'U{i}', 28.6 + rng.uniform(-0.5, 0.5), 77.2 + rng.uniform(-0.5, 0.5))
+        
+        ranked = [p.unit_number for p, _ in index.nearest(28.61, 77.21, k=10)]
+        expected = sorted(index._units.values(), key=lambda p: (
+            (p.latitude - 28.61) ** 2 + ((p.longitude - 77.21) * 0.8776) ** 2
+        ))[:10]
+        self.assertEqual(ranked, [p.unit_number for p in expected])
+    
+    def test_suggestions_skip_dispatched_units(self):
+        SOS.objects.create(
+            name='Other Person',
+            initial_latitude=28.6,
+            initial_longitude=77.2,
+            unit_number_dispatched='Unit-near',
+            room_id=str(uuid.uuid4())
+        )
+        
+        response = self.client.get('/api/assign-officer/', {'sos_id': self.sos.id, 'k': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [unit['unit_number'] for unit in response.data['suggested_units']],
+            ['Unit-mid', 'Unit-far']
+        )
+
+
+class LocationBatchUpdateTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.sos = SOS.objects.create(
+            name='Test Person',
+            initial_latitude=28.7041,
+            initial_longitude=77.1025,
+            room_id=str(uuid.uuid4())
+        )
+    
+    def test_batch_keeps_client_timestamps(self):
+        data = {
+            'sos_request': self.sos.id,
+            'points': [
+                {'latitude': 28.7052, 'longitude': 77.1031, 'timestamp': '2025-06-24T12:01:00Z'},
+                {'latitude': 28.7051, 'longitude': 77.1030, 'timestamp': '2025-06-24T12:00:00Z'},
+            ]
+        }
+        response = self.client.post('/api/update-location/batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 2)
+        
+        updates = list(LocationUpdate.objects.filter(sos_request=self.sos).order_by('id'))
+        self.assertEqual([u.latitude for u in updates], [28.7051, 28.7052])
+        self.assertEqual(updates[0].timestamp.isoformat(), '2025-06-24T12:00:00+00:00')
+    
+    def test_batch_is_one_insert(self):
+        data = {
+            'sos_request': self.sos.id,
+            'points': [{'latitude': 28.7 + i * 0.001, 'longitude': 77.1} for i in range(50)]
+        }
+        self.client.post('/api/update-location/batch/', data, format='json')
+        # With the SOS cached, the whole batch is a single INSERT
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/update-location/batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LocationUpdate.objects.filter(sos_request=self.sos).count(), 100)
+    
+    def test_batch_is_validated_as_a_whole(self):
+        data = {
+            'sos_request': self.sos.id,
+            'points': [
+                {'latitude': 28.7051, 'longitude': 77.1030},
+                {'latitude': 128.0, 'longitude': 77.1030},
+            ]
+        }
+        response = self.client.post('/api/update-location/batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(LocationUpdate.objects.filter(sos_request=self.sos).exists())
+
+
+    def test_future_timestamps_are_clamped_or_rejected(self):
+        now = timezone.now()
+        data = {
+            'sos_request': self.sos.id,
+            'points': [{'latitude': 28.7051, 'longitude': 77.1030, 'timestamp': (now + timedelta(seconds=30)).isoformat()}]
+        }
+        response = self.client.post('/api/update-location/batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLessEqual(LocationUpdate.objects.get(sos_request=self.sos).timestamp, timezone.now())
+        
+        data['points'].append({'latitude': 28.7052, 'longitude': 77.1031, 'timestamp': (now + timedelta(days=1)).isoformat()})
+        response = self.client.post('/api/update-location/batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('points', response.data)
+        self.assertEqual(LocationUpdate.objects.filter(sos_request=self.sos).count(), 1)
+
+
+class TrajectoryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='officer', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.sos = SOS.objects.create(
+            name='Test Person',
+            initial_latitude=28.7041,
+            initial_longitude=77.1025,
+            room_id=str(uuid.uuid4())
+        )
+        start = timezone.now() - timedelta(hours=3)
+        # A straight walk north with one detour point
+        self.points = [(28.7041 + i * 0.0001, 77.1025, start + timedelta(seconds=i * 5)) for i in range(20)]
+        self.points[10] = (self.points[10][0], 77.1035, self.points[10][2])
+        LocationUpdate.objects.bulk_create([
+            LocationUpdate(sos_request=self.sos, latitude=lat, longitude=lon, timestamp=ts)
+            for lat, lon, ts in self.points
+        ])
+    
+    def test_pack_track_round_trip(self):
+        packed = pack_track(self.points)
+        self.assertLess(len(packed), len(self.points) * 8)
+        for original, restored in zip(self.points, unpack_track(packed)):
+            self.assertAlmostEqual(original[0], restored[0], places=6)
+            self.assertAlmostEqual(original[1], restored[1], places=6)
+            self.assertLess(abs((original[2] - restored[2]).total_seconds()), 0.001)
+    
+    def test_polyline_matches_reference_encoding(self):
+        # Example from the encoded polyline format specification
+        encoded = encode_polyline([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+        self.assertEqual(encoded, '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(decode_polyline(encoded), [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+    
+    def test_trajectory_simplification_keeps_detour(self):
+        response = self.client.get(f'/api/sos/{self.sos.id}/trajectory/', {'tolerance': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        coordinates = decode_polyline(response.data['polyline'], response.data['precision'])
+        self.assertEqual(len(coordinates), 5)
+        self.assertIn((self.points[10][0], 77.1035), [(round(a, 6), b) for a, b in coordinates])
+        self.assertEqual(len(response.data['time_deltas_ms']), 4)
+    
+    def test_compacted_track_is_still_retrievable(self):
+        self.sos.status_flag = 1
+        self.sos.save()
+        SOS.objects.filter(id=self.sos.id).update(updated_at=timezone.now() - timedelta(days=2))
+        
+        call_command('compact_locations', '--window-minutes', '1', stdout=io.StringIO())
+        self.assertFalse(LocationUpdate.objects.filter(sos_request=self.sos).exists())
+        self.assertEqual(self.sos.track_segments.count(), 2)
+        
+        response = self.client.get(f'/api/sos/{self.sos.id}/trajectory/', {'encoding': 'points'})
+        self.assertEqual(response.data['point_count'], 20)
+        self.assertEqual(response.data['points'][10]['longitude'], 77.1035)
+        
+        # The detail view still lists every point
+        response = self.client.get(f'/api/sos/{self.sos.id}/')
+        updates = response.data['location_updates']
+        self.assertEqual(len(updates), 20)
+        self.assertEqual(updates[10]['longitude'], 77.1035)
+        self.assertEqual((updates[0]['id'], updates[0]['sos_request']), (None, self.sos.id))
+
+
+class LocationHistoryStoreTestCase(TestCase):
+    def test_ring_keeps_only_latest_points(self):
+        store = LocationHistoryStore(capacity=3)
+        for i in range(5):
+            store.append('room', 7, 28.0 + i, 77.0, f'2025-06-24T12:00:0{i}+00:00')
+        
+        history = store.history('room')
+        self.assertEqual([point['latitude'] for point in history], [30.0, 31.0, 32.0])
+        self.assertEqual(history[0]['timestamp'], '2025-06-24T12:00:02+00:00')
+        self.assertEqual(history[0]['sos_id'], 7)
+        self.assertEqual(store.stats()['points'], 3)
+    
+    def test_idle_and_resolved_rooms_are_evicted(self):
+        store = LocationHistoryStore(capacity=10, idle_ttl=60)
+        store.append('idle', 1, 28.0, 77.0)
+        store.append('resolved', 2, 28.0, 77.0)
+        store.append('active', 3, 28.0, 77.0)
+        
+        store.evict('resolved')
+        store._rooms['idle'].last_active -= 120
+        self.assertEqual(store.evict_idle(), 1)
+        
+        self.assertNotIn('idle', store)
+        self.assertNotIn('resolved', store)
+        self.assertIn('active', store)
+        self.assertEqual(store.stats()['evicted_rooms'], 2)
+    
+    def test_unusable_points_are_ignored(self):
+        store = LocationHistoryStore()
+        self.assertFalse(store.append('room', 1, None, 77.0))
+        self.assertEqual(store.history('room'), [])
+
+
+class FakeSocketIOClient:
+    def __init__(self, fail_connects=0, connect_delay=0):
+        self.connected = False
+        self.fail_connects = fail_connects
+        self.connect_delay = connect_delay
+        self.connect_attempts = 0
+        self.emitted = []
+        self.delivered = threading.Event()
+    
+    def connect(self, url, wait_timeout=None):
+        self.connect_attempts += 1
+        time.sleep(self.connect_delay)
+        if self.connect_attempts <= self.fail_connects:
+            raise ConnectionError('socket server unavailable')
+        self.connected = True
+    
+    def emit(self, event, data):
+        self.emitted.append((event, data))
+        self.delivered.set()
+    
+    def disconnect(self):
+        self.connected = False
+
+
+class BroadcastThrottleTestCase(TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.throttle = BroadcastThrottle(deadband_m=5, min_interval=1.0, clock=lambda: self.now[0])
+    
+    def test_small_moves_are_not_broadcast(self):
+        self.assertEqual(self.throttle.offer('room', 28.6, 77.2, 'first'), 'first')
+        self.now[0] = 5
+        # About 1m north
+        self.assertIsNone(self.throttle.offer('room', 28.60001, 77.2, 'jitter'))
+        self.assertEqual(self.throttle.offer('room', 28.601, 77.2, 'moved'), 'moved')
+        self.assertEqual(self.throttle.stats()['suppressed'], 1)
+    
+    def test_latest_position_wins_between_ticks(self):
+        self.throttle.offer('room', 28.6, 77.2, 'first')
+        self.now[0] = 0.2
+        self.assertIsNone(self.throttle.offer('room', 28.601, 77.2, 'second'))
+        self.assertIsNone(self.throttle.offer('room', 28.602, 77.2, 'third'))
+        self.assertEqual(self.throttle.due(), [])
+        
+        self.now[0] = 1.0
+        self.assertEqual(self.throttle.due(), [('room', 'third')])
+        self.assertEqual(self.throttle.due(), [])
+        self.assertEqual(self.throttle.stats()['coalesced'], 1)
+        self.assertEqual(self.throttle.stats()['sent'], 2)
+    
+    def test_streams_are_independent_and_flushed_on_forget(self):
+        self.throttle.offer(('room', 'a'), 28.6, 77.2, 'a1')
+        self.assertEqual(self.throttle.offer(('unit', '7'), 28.6, 77.2, 'u1'), 'u1')
+        self.now[0] = 0.5
+        self.throttle.offer(('room', 'a'), 28.7, 77.2, 'a2')
+        
+        self.assertEqual(self.throttle.forget(('room', 'a')), 'a2')
+        self.assertIsNone(self.throttle.forget(('room', 'a')))
+        self.assertEqual(self.throttle.offer(('room', 'a'), 28.7, 77.2, 'a3'), 'a3')
+    
+    def test_idle_streams_are_evicted(self):
+        self.throttle.idle_ttl = 60
+        self.throttle.offer(('room', 'quiet'), 28.6, 77.2, 'q1')
+        self.throttle.offer(('room', 'busy'), 28.6, 77.2, 'b1')
+        self.now[0] = 50
+        self.throttle.offer(('room', 'busy'), 28.7, 77.2, 'b2')
+        self.now[0] = 70
+        self.throttle.offer(('room', 'busy'), 28.8, 77.2, 'b3')
+        self.throttle.due()
+        self.assertEqual(self.throttle.stats()['streams'], 1)
+        self.assertEqual(self.throttle.stats()['evicted'], 1)
+        # A stream that comes back starts afresh
+        self.assertEqual(self.throttle.offer(('room', 'quiet'), 28.6, 77.2, 'q2'), 'q2')
+    
+    def test_unparseable_points_pass_through(self):
+        self.assertEqual(self.throttle.offer('room', None, 77.2, 'raw'), 'raw')
+        self.assertEqual(self.throttle.offer('room', None, 77.2, 'raw'), 'raw')
+
+
+class LocationFrameTestCase(TestCase):
+    def test_frame_round_trip(self):
+        update = {'sos_id': 42, 'latitude': 28.613912, 'longitude': 77.209021,
+                  'timestamp': '2025-06-24T12:00:01.250000+00:00'}
+        frame = location_frame(2, 17, encode_location_body(update, 'UNIT001'))
+        
+        self.assertEqual(decode_location_frame(frame), {
+            'event': 'unit_location_update',
+            'seq': 17,
+            'sos_id': 42,
+            'latitude': 28.613912,
+            'longitude': 77.209021,
+            'timestamp_ms': 1750766401250,
+            'unit_number': 'UNIT001',
+        })
+        self.assertLess(len(frame), len(json.dumps(dict(update, seq=17, unit_number='UNIT001'))) / 3)
+    
+    def test_long_unit_is_cut_on_a_character_boundary(self):
+        # The 255-byte limit falls halfway through the 128th two-byte character
+        unit = 'é' * 130
+        body = encode_location_body({'latitude': 28.6, 'longitude': 77.2, 'timestamp': 0}, unit)
+        self.assertEqual(decode_location_frame(location_frame(2, 1, body))['unit_number'], 'é' * 127)
+    
+    def test_unusable_coordinates_have_no_frame(self):
+        self.assertIsNone(encode_location_body({'latitude': None, 'longitude': 77.2}))
+
+
+class SocketIOEmitterTestCase(TestCase):
+    def test_tests_do_not_start_the_emitter(self):
+        with mock.patch('api.services.get_emitter') as get_emitter:
+            response = APIClient().post('/api/create-sos/', {
+                'name': 'Test Person', 'initial_latitude': 28.7041, 'initial_longitude': 77.1025
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        get_emitter.assert_not_called()
+    
+    def test_emit_does_not_wait_for_socket_server(self):
+        client = FakeSocketIOClient(connect_delay=0.5)
+        emitter = SocketIOEmitter('http://socket', client_factory=lambda: client)
+        
+        started = time.perf_counter()
+        emitter.emit('sos_created', {'sos_id': 1})
+        self.assertLess(time.perf_counter() - started, 0.1)
+        
+        self.assertTrue(client.delivered.wait(2))
+        self.assertEqual(client.emitted, [('sos_created', {'sos_id': 1})])
+        emitter.stop()
+    
+    def test_reconnects_and_batches_queued_events(self):
+        client = FakeSocketIOClient(fail_connects=2)
+        emitter = SocketIOEmitter('http://socket', initial_backoff=0.01, client_factory=lambda: client)
+        
+        for i in range(3):
+            emitter.emit('location_update_to_room', {'sos_id': i})
+        
+        self.assertTrue(client.delivered.wait(2))
+        self.assertEqual(client.connect_attempts, 3)
+        self.assertEqual(client.emitted[0][0], 'event_batch')
+        self.assertEqual([item['data']['sos_id'] for item in client.emitted[0][1]['events']], [0, 1, 2])
+        emitter.stop()
+    
+    def test_full_queue_drops_oldest_events(self):
+        client = FakeSocketIOClient(fail_connects=1000)
+        emitter = SocketIOEmitter('http://socket', max_queue=2, initial_backoff=5, client_factory=lambda: client)
+        
+        for i in range(5):
+            emitter.emit('location_update_to_room', {'sos_id': i})
+        
+        emitter.stop(timeout=0.5)
+        self.assertEqual(emitter.pending(), 2)
+        self.assertGreaterEqual(emitter.dropped, 3)
+        self.assertEqual([data['sos_id'] for _, data in emitter._queue], [3, 4])
+
+
+class EventLogTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+    
+    def test_replay_returns_only_the_gap(self):
+        log = EventLog(self.directory)
+        self.addCleanup(log.close)
+        for i in range(5):
+            self.assertEqual(log.append('sos_room', 'location_history', {'n': i}), i + 1)
+        
+        events, complete = log.replay('sos_room', 3)
+        self.assertTrue(complete)
+        self.assertEqual(events, [(4, 'location_history', {'n': 3}), (5, 'location_history', {'n': 4})])
+        self.assertEqual(log.replay('sos_room', 5), ([], True))
+    
+    def test_sequence_survives_restart_and_torn_write(self):
+        log = EventLog(self.directory)
+        log.append('sos_channel', 'new_sos', {'sos_id': 1})
+        log.append('sos_channel', 'new_sos', {'sos_id': 2})
+        path = log._path('sos_channel')
+        log.release_idle(0, now=time.monotonic() + 1)
+        with open(path, 'ab') as handle:
+            handle.write(b'\x03\x00\x00')  # partial header from a crash
+        
+        log.close()
+        restarted = EventLog(self.directory)
+        self.addCleanup(restarted.close)
+        self.assertEqual(restarted.latest_seq('sos_channel'), 2)
+        self.assertEqual(restarted.append('sos_channel', 'new_sos', {'sos_id': 3}), 3)
+        events, _ = restarted.replay('sos_channel', 1)
+        self.assertEqual([data['sos_id'] for _, _, data in events], [2, 3])
+    
+    def test_rotated_away_gap_is_reported_incomplete(self):
+        log = EventLog(self.directory, segment_bytes=200)
+        self.addCleanup(log.close)
+        for i in range(30):
+            log.append('unit_7', 'unit_location_update', {'n': i})
+        
+        events, complete = log.replay('unit_7', 0)
+        self.assertFalse(complete)
+        self.assertEqual(events[-1][0], 30)
+        self.assertEqual([seq for seq, _, _ in events], list(range(events[0][0], 31)))
+    
+    def test_drop_removes_channel(self):
+        log = EventLog(self.directory)
+        self.addCleanup(log.close)
+        log.append('sos_room', 'sos_resolved', {'sos_id': 1})
+        log.drop('sos_room')
+        
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(log.replay('sos_room', 1), ([], False))
+    
+    def test_replay_is_incomplete_beyond_what_this_log_holds(self):
+        log = EventLog(self.directory)
+        self.addCleanup(log.close)
+        log.append('sos_room', 'new_sos', {'sos_id': 1})
+        # A sequence number this log never assigned, e.g. from another server
+        self.assertEqual(log.replay('sos_room', 7), ([], False))
+        self.assertEqual(log.replay('sos_room', 1), ([], True))
+    
+    def test_directory_belongs_to_one_process(self):
+        log = EventLog(self.directory)
+        with self.assertRaises(RuntimeError):
+            EventLog(self.directory)
+        log.close()
+        EventLog(self.directory).close()
+
+
+class DatabaseEventLogTestCase(TestCase):
+    def test_servers_share_one_sequence(self):
+        first, second = DatabaseEventLog(), DatabaseEventLog()
+        self.assertEqual(first.append('sos_room', 'new_sos', {'sos_id': 1}), 1)
+        self.assertEqual(second.append('sos_room', 'new_sos', {'sos_id': 2}), 2)
+        self.assertEqual(first.append('unit_7', 'unit_location_update', {'n': 1}), 1)
+        
+        # A client that saw seq 1 on the first server replays on the second
+        self.assertEqual(second.replay('sos_room', 1), ([(2, 'new_sos', {'sos_id': 2})], True))
+        self.assertEqual(second.replay('sos_room', 5), ([], False))
+        self.assertEqual(second.replay('sos_room', 0, limit=1)[1], False)
+    
+    def test_pruning_keeps_the_sequence_counting(self):
+        log = DatabaseEventLog(retention=60)
+        for i in range(3):
+            log.append('sos_room', 'location_history', {'n': i})
+        SocketEvent.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        
+        self.assertEqual(log.release_idle(), 2)
+        self.assertEqual(log.replay('sos_room', 0), ([(3, 'location_history', {'n': 2})], False))
+        self.assertEqual(log.append('sos_room', 'location_history', {'n': 3}), 4)
+
+
+class RecordingNamespace(SOSNamespace):
+    """SOSNamespace that records what it would send instead of needing a server"""
+    def __init__(self, *args, **kwargs):
+        # Handlers on the test's thread, inside its transaction
+        kwargs.setdefault('workers', 0)
+        super().__init__(*args, **kwargs)
+        self.sent = []
+        self.joined = []
+    
+    async def emit(self, event, data=None, to=None, room=None, **kwargs):
+        self.sent.append((event, data, to or room))
+    
+    async def enter_room(self, sid, room, namespace=None):
+        self.joined.append((sid, room))
+    
+    async def leave_room(self, sid, room, namespace=None):
+        self.joined.remove((sid, room))
+    
+    def rooms(self, sid, namespace=None):
+        return [room for joined_sid, room in self.joined if joined_sid == sid]
+
+
+@override_settings(SOCKETIO_EMIT_ENABLED=True)
+class SingleProcessSocketIOTestCase(TestCase):
+    def setUp(self):
+        self.namespace = RecordingNamespace('/')
+        self.bus = LocalEventBus(self.namespace.dispatch)
+        previous = emitter_module._emitter
+        emitter_module.set_emitter(self.bus)
+        self.addCleanup(emitter_module.set_emitter, previous)
+    
+    async def run_on_bus(self, coroutine):
+        self.bus.bind()
+        result = await coroutine
+        for _ in range(100):
+            if not self.bus.pending():
+                break
+            await asyncio.sleep(0.01)
+        return result
+    
+    def test_bus_delivers_events_from_worker_threads(self):
+        received = []
+        
+        async def handler(event, data):
+            received.append((event, data))
+        
+        bus = LocalEventBus(handler)
+        
+        async def main():
+            bus.bind()
+            await asyncio.get_running_loop().run_in_executor(None, bus.emit, 'sos_created', {'sos_id': 1})
+            while bus.pending():
+                await asyncio.sleep(0.01)
+        
+        asyncio.run(main())
+        self.assertEqual(received, [('sos_created', {'sos_id': 1})])
+        self.assertEqual(bus.stats()['sent'], 1)
+    
+    def test_create_sos_event_broadcasts_without_http(self):
+        async_to_sync(self.run_on_bus)(self.namespace.handle('create_sos', 'client', {
+            'name': 'Socket SOS',
+            'initial_latitude': 28.61,
+            'initial_longitude': 77.21
+        }))
+        
+        sos = SOS.objects.get(name='Socket SOS')
+        response = [data for event, data, to in self.namespace.sent if event == 'create_sos_response']
+        self.assertEqual(response, [{'success': True, 'data': {
+            'status': 'success',
+            'message': 'SOS created successfully',
+            'sos_id': sos.id,
+            'room_id': sos.room_id
+        }}])
+        broadcast = [(data['sos_id'], room) for event, data, room in self.namespace.sent if event == 'new_sos']
+        self.assertEqual(broadcast, [(sos.id, ['sos_channel', 'sos_channel~bin'])])
+    
+    def test_update_location_event_reaches_room_history(self):
+        sos = SOS.objects.create(name='Room SOS', initial_latitude=28.61, initial_longitude=77.21, room_id='room-1')
+        async_to_sync(self.run_on_bus)(self.namespace.handle('update_location', 'client', json.dumps({
+            'sos_request': sos.id,
+            'latitude': 28.62,
+            'longitude': 77.22
+        })))
+        
+        self.assertEqual(LocationUpdate.objects.filter(sos_request=sos).count(), 1)
+        self.assertIn(('update_location_response', {'success': True, 'data': {'status': 'Location updated successfully'}}, 'client'),
+                      self.namespace.sent)
+        self.assertEqual([update['latitude'] for update in self.namespace.location_history.history('room-1')], [28.62])
+    
+    def test_room_broadcasts_are_throttled_but_history_is_complete(self):
+        now = [0.0]
+        namespace = RecordingNamespace('/', throttle=BroadcastThrottle(deadband_m=5, min_interval=1.0, clock=lambda: now[0]))
+        for i, latitude in enumerate([28.6, 28.60001, 28.601, 28.602]):
+            now[0] = i * 0.1
+            async_to_sync(namespace.dispatch)('location_update_to_room', {
+                'room_id': 'room-1', 'sos_id': 1, 'latitude': latitude, 'longitude': 77.2
+            })
+        self.assertEqual([data['latitude'] for event, data, _ in namespace.sent], [28.6])
+        self.assertEqual(len(namespace.location_history.history('room-1')), 4)
+        
+        async_to_sync(namespace.dispatch)('sos_resolved', {'room_id': 'room-1', 'sos_id': 1})
+        self.assertEqual([(event, data.get('latitude')) for event, data, _ in namespace.sent],
+                         [('location_history', 28.6), ('location_history', 28.602), ('sos_resolved', None)])
+    
+    def test_binary_clients_get_one_shared_frame_body(self):
+        namespace = RecordingNamespace('/')
+        async_to_sync(namespace.handle)('join_location_tracking_channel', 'json-client')
+        async_to_sync(namespace.handle)('join_officer_room', 'binary-client', 'UNIT001')
+        async_to_sync(namespace.handle)('set_location_encoding', 'binary-client', {'encoding': 'binary'})
+        async_to_sync(namespace.handle)('join_location_tracking_channel', 'binary-client')
+        self.assertEqual(sorted(namespace.rooms('binary-client')), ['location_tracking_channel~bin', 'unit_UNIT001~bin'])
+        namespace.sent.clear()
+        
+        async_to_sync(namespace.dispatch)('location_update_to_unit', {
+            'unit_number': 'UNIT001', 'sos_id': 1, 'latitude': 28.6, 'longitude': 77.2
+        })
+        json_rooms = [room for event, _, room in namespace.sent if event != 'location_frame']
+        frames = [(data, room) for event, data, room in namespace.sent if event == 'location_frame']
+        self.assertEqual(json_rooms, ['unit_UNIT001', 'location_tracking_channel'])
+        self.assertEqual([room for _, room in frames], ['unit_UNIT001~bin', 'location_tracking_channel~bin'])
+        self.assertEqual(frames[0][0][6:], frames[1][0][6:])
+        self.assertEqual([decode_location_frame(data)['event'] for data, _ in frames],
+                         ['unit_location_update', 'location_tracking_update'])
+        
+        async_to_sync(namespace.handle)('set_location_encoding', 'binary-client', 'json')
+        self.assertEqual(sorted(namespace.rooms('binary-client')), ['location_tracking_channel', 'unit_UNIT001'])
+    
+    def test_event_batch_runs_each_api_event(self):
+        async_to_sync(self.namespace.handle)('join_officer_room', 'officer', {'unit_number': 'UNIT001'})
+        async_to_sync(self.namespace.dispatch)('event_batch', {'events': [
+            {'event': 'sos_created', 'data': {'sos_id': 1}},
+            {'event': 'location_update_to_unit', 'data': {'unit_number': 'UNIT001', 'latitude': 28.6, 'longitude': 77.2}},
+            {'event': 'event_batch', 'data': {}},
+        ]})
+        
+        self.assertEqual([(event, room) for event, _, room in self.namespace.sent if event != 'room_joined'], [
+            ('new_sos', ['sos_channel', 'sos_channel~bin']),
+            ('unit_location_update', 'unit_UNIT001'),
+            ('location_tracking_update', 'location_tracking_channel'),
+        ])
+        self.assertEqual(self.namespace.events.presence.units_online(), {'UNIT001': 1})
+    
+    def test_handlers_of_different_clients_run_side_by_side(self):
+        namespace = RecordingNamespace('/', workers=2)
+        both_running = threading.Barrier(2, timeout=5)
+        
+        def handler(out, sid, data=None):
+            both_running.wait()
+            out.emit('done', None, to=sid)
+        
+        async def main():
+            await asyncio.gather(namespace.run(handler, 'client-a'), namespace.run(handler, 'client-b'))
+        
+        asyncio.run(main())
+        self.assertEqual(sorted(to for _, _, to in namespace.sent), ['client-a', 'client-b'])
+    
+    def test_invalid_socket_request_is_rejected(self):
+        async_to_sync(self.namespace.handle)('create_sos', 'client', {'name': 'No location'})
+        
+        self.assertEqual(self.namespace.sent, [('create_sos_response', {
+            'success': False,
+            'error': 'Missing required field: initial_latitude'
+        }, 'client')])
+        self.assertFalse(SOS.objects.exists())
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+    
+    def json(self):
+        if self.body is None:
+            raise ValueError('No JSON')
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, responses=None, block=None):
+        self.responses = list(responses or [])
+        self.block = block
+        self.calls = []
+    
+    def post(self, url, json=None, timeout=None):
+        self.calls.append((url, json, timeout))
+        if self.block is not None:
+            self.block.wait(2)
+        response = self.responses.pop(0) if self.responses else FakeResponse(201, {'status': 'ok'})
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class UpstreamClientTestCase(TestCase):
+    def test_calls_share_one_session_within_deadline(self):
+        session = FakeSession()
+        client = UpstreamClient('http://api/', deadline=3, connect_timeout=1, session=session)
+        
+        self.assertEqual(client.post('/api/create-sos/', {'name': 'a'}), (201, {'status': 'ok'}))
+        client.post('/api/update-location/', {'sos_request': 1})
+        
+        self.assertEqual([url for url, _, _ in session.calls], ['http://api/api/create-sos/', 'http://api/api/update-location/'])
+        connect_timeout, read_timeout = session.calls[0][2]
+        self.assertEqual(connect_timeout, 1)
+        self.assertLessEqual(read_timeout, 3)
+    
+    def test_circuit_opens_on_failures_and_half_opens_after_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        session = FakeSession([
+            requests.exceptions.ConnectionError('refused'),
+            FakeResponse(503),
+            FakeResponse(201, {'status': 'ok'}),
+        ])
+        client = UpstreamClient('http://api', breaker=breaker, session=session)
+        
+        with self.assertRaises(UpstreamError):
+            client.post('/api/create-sos/', {})
+        self.assertEqual(client.post('/api/create-sos/', {})[0], 503)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(UpstreamUnavailable):
+            client.post('/api/create-sos/', {})
+        self.assertEqual(len(session.calls), 2)
+        
+        now[0] = 11
+        self.assertEqual(client.post('/api/create-sos/', {})[0], 201)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_client_errors_do_not_trip_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        client = UpstreamClient('http://api', breaker=breaker, session=FakeSession([FakeResponse(400, {'name': ['required']})]))
+        
+        self.assertEqual(client.post('/api/create-sos/', {}), (400, {'name': ['required']}))
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_concurrency_is_bounded_by_deadline(self):
+        release = threading.Event()
+        client = UpstreamClient('http://api', max_concurrency=1, session=FakeSession(block=release))
+        worker = threading.Thread(target=client.post, args=('/api/create-sos/', {}))
+        worker.start()
+        time.sleep(0.05)
+        
+        with self.assertRaises(UpstreamUnavailable):
+            client.post('/api/create-sos/', {}, deadline=0.05)
+        release.set()
+        worker.join(2)
+        self.assertEqual(client.stats()['rejected'], 1)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_orm_mode_skips_http(self):
+        # Inline, so the calls run inside the test transaction
+        upstream = OrmUpstream(workers=0)
+        
+        status_code, body = upstream.post('/api/create-sos/', {
+            'name': 'ORM SOS',
+            'initial_latitude': 28.61,
+            'initial_longitude': 77.21
+        })
+        sos = SOS.objects.get(name='ORM SOS')
+        self.assertEqual((status_code, body['sos_id'], body['room_id']), (201, sos.id, sos.room_id))
+        
+        status_code, _ = upstream.post('/api/update-location/', {'sos_request': sos.id, 'latitude': 1, 'longitude': 2})
+        self.assertEqual(status_code, 201)
+        self.assertEqual(upstream.post('/api/update-location/', {'sos_request': sos.id})[0], 400)
+
+
+class OrmUpstreamPoolTestCase(TransactionTestCase):
+    def test_calls_share_a_fixed_set_of_worker_connections(self):
+        upstream = OrmUpstream(workers=2, deadline=10)
+        self.addCleanup(upstream._executor.shutdown)
+        threads = set()
+        create_sos = services.create_sos
+        
+        def record_thread(payload):
+            threads.add(threading.get_ident())
+            return create_sos(payload)
+        
+        with mock.patch('api.services.create_sos', record_thread):
+            for i in range(6):
+                status_code, _ = upstream.post('/api/create-sos/', {
+                    'name': f'Pooled {i}',
+                    'initial_latitude': 28.61,
+                    'initial_longitude': 77.21
+                })
+                self.assertEqual(status_code, 201)
+        self.assertLessEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(SOS.objects.filter(name__startswith='Pooled').count(), 6)
+    
+    def test_retry_after_a_timeout_returns_the_first_result(self):
+        upstream = OrmUpstream(workers=2, deadline=0.05)
+        self.addCleanup(upstream._executor.shutdown)
+        release = threading.Event()
+        create_sos = services.create_sos
+        
+        def slow_create(payload):
+            release.wait(5)
+            return create_sos(payload)
+        
+        payload = {'name': 'Slow', 'initial_latitude': 28.61, 'initial_longitude': 77.21}
+        with mock.patch('api.services.create_sos', slow_create):
+            with self.assertRaises(UpstreamError):
+                upstream.post('/api/create-sos/', payload)
+            release.set()
+            status_code, body = upstream.post('/api/create-sos/', dict(payload), deadline=5)
+        
+        self.assertEqual(status_code, 201)
+        self.assertEqual(list(SOS.objects.filter(name='Slow').values_list('id', flat=True)), [body['sos_id']])
+
+
+class PubSubFanOutTestCase(TestCase):
+    def make_server(self, manager):
+        server = socketio.Server(async_mode='threading', client_manager=manager)
+        server.sent = []
+        server._send_eio_packet = lambda eio_sid, packet: server.sent.append(
+            (eio_sid, socketio.packet.Packet(encoded_packet=packet.data).data))
+        manager.initialize()
+        self.addCleanup(manager.stop)
+        return server
+    
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+    
+    def test_room_broadcast_and_membership_span_servers(self):
+        broker = InProcessBroker()
+        server_a = self.make_server(InProcessManager(broker=broker, poll_interval=0.005))
+        server_b = self.make_server(InProcessManager(broker=broker, poll_interval=0.005))
+        sid = server_b.manager.connect('eio-b', '/')
+        server_b.manager.enter_room(sid, '/', 'sos_channel')
+        
+        server_a.emit('new_sos', {'sos_id': 1}, room='sos_channel')
+        self.assertTrue(self.wait_for(lambda: server_b.sent))
+        self.assertEqual(server_b.sent, [('eio-b', ['new_sos', {'sos_id': 1}])])
+        self.assertEqual(server_a.sent, [])
+        
+        # A server can put a client of another server into a room
+        server_a.enter_room(sid, 'unit_7')
+        self.assertTrue(self.wait_for(lambda: server_b.manager.is_connected(sid, '/') and
+                                      'unit_7' in server_b.manager.get_rooms(sid, '/')))
+        server_a.emit('unit_location_update', {'sos_id': 1}, room='unit_7')
+        self.assertTrue(self.wait_for(lambda: len(server_b.sent) == 2))
+    
+    def test_asyncio_servers_share_rooms_through_the_queue(self):
+        broker = InProcessBroker()
+        sent = []
+        
+        async def capture(eio_sid, packet):
+            sent.append((eio_sid, socketio.packet.Packet(encoded_packet=packet.data).data))
+        
+        async def main():
+            server_a, server_b = [
+                socketio.AsyncServer(async_mode='asgi', client_manager=AsyncInProcessManager(broker=broker, poll_interval=0.005))
+                for _ in range(2)
+            ]
+            server_b._send_eio_packet = capture
+            for server in (server_a, server_b):
+                server.manager.initialize()
+            sid = await server_b.manager.connect('eio-b', '/')
+            await server_b.manager.enter_room(sid, '/', 'sos_channel')
+            
+            await server_a.emit('new_sos', {'sos_id': 1}, room='sos_channel')
+            for _ in range(200):
+                if sent:
+                    break
+                await asyncio.sleep(0.01)
+            for server in (server_a, server_b):
+                server.manager.stop()
+                server.manager.thread.cancel()
+        
+        asyncio.run(main())
+        self.assertEqual(sent, [('eio-b', ['new_sos', {'sos_id': 1}])])
+    
+    def test_client_manager_matches_the_server(self):
+        manager, presence = build_client_manager('db://', async_mode=True)
+        self.assertIsInstance(manager, AsyncDatabaseManager)
+        self.assertIs(presence, manager.presence)
+        self.assertIsInstance(build_client_manager('memory://')[0], InProcessManager)
+        with self.assertRaises(ValueError):
+            build_client_manager('kafka://localhost:9092', async_mode=True)
+        with self.assertRaises(TypeError):
+            PollingPubSubManager()
+    
+    def test_presence_is_shared_between_servers(self):
+        broker = InProcessBroker()
+        manager_a = InProcessManager(broker=broker)
+        manager_b = InProcessManager(broker=broker)
+        
+        manager_a.presence.join('sid-1', 'officer', '7')
+        manager_b.presence.join('sid-2', 'officer', '7')
+        manager_b.presence.join('sid-3', 'citizen')
+        
+        self.assertEqual(sorted(manager_a.presence.unit_members('7')), ['sid-1', 'sid-2'])
+        self.assertEqual(manager_a.presence.units_online(), {'7': 2})
+        self.assertEqual(manager_a.presence.stats(), {'sessions': 3, 'hosts': 2})
+        self.assertEqual(manager_a.presence.leave('sid-2'), ('officer', '7'))
+        self.assertEqual(manager_b.presence.units_online(), {'7': 1})
+    
+    def test_database_backend_delivers_only_new_messages(self):
+        publisher = DatabaseManager(channel='test')
+        publisher._publish({'method': 'emit', 'event': 'old'})
+        listener = DatabaseManager(channel='test')
+        self.assertEqual(listener._receive(), [])
+        
+        publisher._publish({'method': 'emit', 'event': 'new_sos'})
+        DatabaseManager(channel='other')._publish({'method': 'emit', 'event': 'elsewhere'})
+        
+        self.assertEqual([json.loads(message)['event'] for message in listener._receive()], ['new_sos'])
+        self.assertEqual(listener._receive(), [])
+    
+    def test_database_presence_ignores_dead_servers(self):
+        live = DatabasePresence('host-live', ttl=30)
+        dead = DatabasePresence('host-dead', ttl=30)
+        live.join('sid-1', 'officer', '7')
+        dead.join('sid-2', 'officer', '7')
+        SocketPresence.objects.filter(host_id='host-dead').update(heartbeat_at=timezone.now() - timedelta(seconds=45))
+        
+        self.assertEqual(live.unit_members('7'), ['sid-1'])
+        self.assertEqual(live.units_online(), {'7': 1})
+        self.assertTrue(SocketPresence.objects.filter(sid='sid-2').exists())
+        
+        SocketPresence.objects.filter(host_id='host-dead').update(heartbeat_at=timezone.now() - timedelta(seconds=90))
+        live.heartbeat()
+        self.assertFalse(SocketPresence.objects.filter(sid='sid-2').exists())
+        self.assertEqual(live.leave('sid-1'), ('officer', '7'))
+
+
+class ResumableImageUploadTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, SOS_IMAGE_UPLOAD_DIR=self.upload_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+        self.sos = SOS.objects.create(name='Upload SOS', initial_latitude=28.61, initial_longitude=77.21)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), (200, 30, 30)).save(buffer, format='PNG')
+        self.image_bytes = buffer.getvalue()
+    
+    def initiate(self, size=None):
+        response = self.client.post('/api/sos-image-uploads/', {
+            'sos_id': self.sos.id,
+            'filename': 'evidence.png',
+            'size': size or len(self.image_bytes),
+            'description': 'Camera 3'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['upload_id']
+    
+    def put_chunk(self, upload_id, start, end, total=None):
+        return self.client.put(
+            f'/api/sos-image-uploads/{upload_id}/', self.image_bytes[start:end],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{total or len(self.image_bytes)}'
+        )
+    
+    def test_chunks_in_any_order_assemble_the_image(self):
+        upload_id = self.initiate()
+        middle = len(self.image_bytes) // 2
+        
+        response = self.put_chunk(upload_id, middle, len(self.image_bytes))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['offset'], 0)
+        
+        status_response = self.client.get(f'/api/sos-image-uploads/{upload_id}/')
+        self.assertEqual(status_response.data['received_ranges'], [[middle, len(self.image_bytes)]])
+        
+        response = self.put_chunk(upload_id, 0, middle)
+        self.assertTrue(response.data['complete'])
+        
+        response = self.client.post(f'/api/sos-image-uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = SOSImage.objects.get(id=response.data['uploaded_image']['id'])
+        self.assertEqual((image.sos_request_id, image.description), (self.sos.id, 'Camera 3'))
+        with image.image.open('rb') as handle:
+            self.assertEqual(handle.read(), self.image_bytes)
+        self.assertFalse(os.path.exists(SOSImageUpload.objects.get(id=upload_id).partial_path))
+        
+        # Retrying the finalize returns the same image
+        retry = self.client.post(f'/api/sos-image-uploads/{upload_id}/finalize/')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data['uploaded_image']['id'], image.id)
+        self.assertEqual(SOSImage.objects.count(), 1)
+    
+    def test_incomplete_or_invalid_uploads_are_not_finalized(self):
+        upload_id = self.initiate()
+        self.put_chunk(upload_id, 0, 10)
+        response = self.client.post(f'/api/sos-image-uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 10)
+        
+        self.image_bytes = b'not an image at all'
+        upload_id = self.initiate()
+        self.put_chunk(upload_id, 0, len(self.image_bytes))
+        response = self.client.post(f'/api/sos-image-uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SOSImageUpload.objects.filter(id=upload_id).exists())
+        self.assertFalse(SOSImage.objects.exists())
+    
+    def test_chunk_racing_the_finalize_is_discarded(self):
+        upload_id = self.initiate()
+        middle = len(self.image_bytes) // 2
+        self.put_chunk(upload_id, 0, middle)
+        self.put_chunk(upload_id, middle, len(self.image_bytes))
+        
+        # A retried chunk is still streaming when another request finalizes
+        def finalize_then_write(path, start, stream, length):
+            self.assertEqual(self.client.post(f'/api/sos-image-uploads/{upload_id}/finalize/').status_code, 201)
+            return write_stream(path, start, stream, length)
+        
+        with mock.patch('api.views.write_stream', finalize_then_write):
+            response = self.put_chunk(upload_id, 0, middle)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        upload = SOSImageUpload.objects.get(id=upload_id)
+        self.assertFalse(os.path.exists(upload.partial_path))
+        self.assertEqual(SOSImage.objects.count(), 1)
+        with upload.image.image.open('rb') as handle:
+            self.assertEqual(handle.read(), self.image_bytes)
+    
+    def test_bad_ranges_are_rejected(self):
+        upload_id = self.initiate()
+        self.assertEqual(self.put_chunk(upload_id, 0, 10, total=5).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(f'/api/sos-image-uploads/{upload_id}/', b'abc',
+                                   content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_partial_files_are_kept_out_of_media_root(self):
+        from backend import settings as project_settings
+        upload_dir = os.path.abspath(project_settings.SOS_IMAGE_UPLOAD_DIR)
+        media_root = os.path.abspath(project_settings.MEDIA_ROOT)
+        self.assertNotEqual(os.path.commonpath([upload_dir, media_root]), media_root)
+    
+    def test_dropped_chunk_keeps_what_arrived(self):
+        path = os.path.join(self.upload_dir, 'dropped.part')
+        with self.assertRaises(ClientDisconnected) as raised:
+            write_stream(path, 4, io.BytesIO(b'abc'), 6, block_size=2)
+        self.assertEqual(raised.exception.written, 3)
+        with open(path, 'rb') as handle:
+            self.assertEqual(handle.read(), b'\x00\x00\x00\x00abc')
+        
+        # Later chunks write into the file without truncating it
+        write_stream(path, 0, io.BytesIO(b'wxyz'), 4)
+        with open(path, 'rb') as handle:
+            self.assertEqual(handle.read(), b'wxyzabc')
+        
+        ranges = merge_range([], 4, 7)
+        ranges = merge_range(ranges, 0, 4)
+        self.assertEqual(merge_range(ranges, 10, 12), [[0, 7], [10, 12]])
+
+
+class ImageDerivativeTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.sos = SOS.objects.create(name='Image SOS', initial_latitude=28.61, initial_longitude=77.21)
+        # A noisy 3000x2000 photo-sized image compresses about as badly as a real one
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (3000, 2000), os.urandom(3000 * 2000 * 3)).save(buffer, format='JPEG', quality=95)
+        self.photo = buffer.getvalue()
+    
+    def create_image(self):
+        from django.core.files.base import ContentFile
+        image = SOSImage(sos_request=self.sos)
+        image.image.save('frame.jpg', ContentFile(self.photo), save=False)
+        futures = []
+        with mock.patch('api.signals.schedule_derivatives', side_effect=futures.append):
+            with self.captureOnCommitCallbacks(execute=True):
+                image.save()
+        return image, futures
+    
+    def test_upload_schedules_variants_after_commit(self):
+        image, scheduled = self.create_image()
+        self.assertEqual(scheduled, [image.image.name])
+        
+        data = SOSImageSerializer(image).data
+        self.assertIsNone(data['thumbnail_url'])
+        
+        generate_derivatives(image.image.name)
+        data = SOSImageSerializer(image).data
+        self.assertTrue(data['thumbnail_url'].endswith('-256x256q70.jpg'))
+        self.assertTrue(data['preview_url'].endswith('-1280x1280q80.jpg'))
+        
+        thumbnail_path = os.path.join(self.media_root, derivative_name(image.image.name, 'thumbnail'))
+        with Image.open(thumbnail_path) as thumbnail:
+            self.assertEqual(thumbnail.size, (256, 171))
+        self.assertGreater(len(self.photo) / os.path.getsize(thumbnail_path), 50)
+        
+        # Already generated variants are not redone
+        self.assertEqual(generate_derivatives(image.image.name), [])
+    
+    def test_deleting_image_removes_variants(self):
+        image, _ = self.create_image()
+        generate_derivatives(image.image.name)
+        thumbnail_path = os.path.join(self.media_root, derivative_name(image.image.name, 'thumbnail'))
+        self.assertTrue(os.path.exists(thumbnail_path))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(os.path.exists(thumbnail_path))
+
+class ContentAddressedImageStoreTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, SOS_IMAGE_UPLOAD_DIR=self.upload_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+        self.sos = SOS.objects.create(name='CCTV SOS', initial_latitude=28.61, initial_longitude=77.21)
+        # A smooth gradient, so re-encoding it barely moves the perceptual hash
+        frame = Image.linear_gradient('L').rotate(90).resize((320, 240)).convert('RGB')
+        self.frame = self.encode(frame, quality=90)
+        self.reencoded_frame = self.encode(frame, quality=40)
+        self.other_frame = self.encode(frame.transpose(Image.Transpose.FLIP_LEFT_RIGHT), quality=90)
+    
+    def encode(self, image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+    
+    def upload(self, *frames):
+        files = []
+        for index, data in enumerate(frames):
+            upload = io.BytesIO(data)
+            upload.name = f'frame_{index}.jpg'
+            files.append(upload)
+        with mock.patch('api.signals.schedule_derivatives'):
+            response = self.client.post('/api/upload-sos-images/', {'sos_id': self.sos.id, 'images': files}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return [SOSImage.objects.get(id=image['id']) for image in response.data['uploaded_images']]
+    
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(os.path.join(self.media_root, 'sos_images'))
+            for name in names
+        )
+    
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.upload(self.frame, self.frame)
+        third, = self.upload(self.frame)
+        
+        digest = hashlib.sha256(self.frame).hexdigest()
+        self.assertEqual(first.image.name, f'sos_images/{digest[:2]}/{digest}.jpg')
+        self.assertEqual({second.image.name, third.image.name}, {first.image.name})
+        self.assertEqual(self.stored_files(), [first.image.name])
+        
+        blob = ImageBlob.objects.get()
+        self.assertEqual((blob.ref_count, blob.size), (3, len(self.frame)))
+        self.assertEqual({first.blob_id, second.blob_id, third.blob_id}, {blob.id})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            second.delete()
+        self.assertEqual(self.stored_files(), [first.image.name])
+        
+        # Deleting the SOS cascades to the last reference and frees the file
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sos.delete()
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+    
+    def test_upload_racing_the_last_release_keeps_the_file(self):
+        first, = self.upload(self.frame)
+        name = first.image.name
+        # The release commits, but its file delete has not run yet when the
+        # same content is uploaded again
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        second, = self.upload(self.frame)
+        for callback in callbacks:
+            callback()
+        
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertEqual(self.stored_files(), [name])
+    
+    def test_file_without_a_blob_is_written_again(self):
+        digest = hashlib.sha256(self.frame).hexdigest()
+        path = os.path.join(self.media_root, 'sos_images', digest[:2], f'{digest}.jpg')
+        os.makedirs(os.path.dirname(path))
+        # Left over from a delete in progress, or truncated
+        with open(path, 'wb') as handle:
+            handle.write(self.frame[:100])
+        
+        image, = self.upload(self.frame)
+        with open(path, 'rb') as handle:
+            self.assertEqual(handle.read(), self.frame)
+        self.assertEqual(image.blob.ref_count, 1)
+    
+    def test_finalized_duplicate_consumes_partial_file(self):
+        self.upload(self.frame)
+        response = self.client.post('/api/sos-image-uploads/', {
+            'sos_id': self.sos.id, 'filename': 'frame.jpg', 'size': len(self.frame)
+        }, format='json')
+        upload_id = response.data['upload_id']
+        self.client.put(
+            f'/api/sos-image-uploads/{upload_id}/', self.frame, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-{len(self.frame) - 1}/{len(self.frame)}'
+        )
+        with mock.patch('api.signals.schedule_derivatives'):
+            response = self.client.post(f'/api/sos-image-uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        self.assertEqual(len(self.stored_files()), 1)
+    
+    def test_near_duplicates_are_flagged_when_enabled(self):
+        hashes = [perceptual_hash(io.BytesIO(data)) for data in (self.frame, self.reencoded_frame, self.other_frame)]
+        self.assertLessEqual(hamming_distance(hashes[0], hashes[1]), 4)
+        self.assertGreater(hamming_distance(hashes[0], hashes[2]), 20)
+        
+        original, = self.upload(self.frame)
+        self.assertIsNone(original.near_duplicate_of_id)
+        
+        with override_settings(SOS_IMAGE_NEAR_DUPLICATE_DISTANCE=6):
+            reencoded, other = self.upload(self.reencoded_frame, self.other_frame)
+            repeated, = self.upload(self.reencoded_frame)
+        self.assertEqual(reencoded.near_duplicate_of_id, original.id)
+        self.assertIsNone(other.near_duplicate_of_id)
+        # Chains point at the first image of the group
+        self.assertEqual(repeated.near_duplicate_of_id, original.id)
+        
+        response = self.client.get(f'/api/get-sos-images/{self.sos.id}/')
+        flagged = {image['id']: image['near_duplicate_of'] for image in response.data['images']}
+        self.assertEqual(flagged[reencoded.id], original.id)
+
+job_calls = []
+
+
+@task(name='tests.record', priority=0)
+def record_job(label):
+    job_calls.append(label)
+
+
+@task(name='tests.flaky', max_attempts=2)
+def flaky_job(label):
+    job_calls.append(label)
+    raise RuntimeError('worker lost the camera feed')
+
+
+@override_settings(JOB_RETRY_BACKOFF=0, JOB_QUEUE_EAGER=False)
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        job_calls.clear()
+        self.worker = Worker(burst=True, worker_id='test-worker')
+    
+    def drain(self):
+        while self.worker.work_once():
+            pass
+    
+    def test_jobs_run_by_priority_then_age(self):
+        record_job.enqueue('first')
+        enqueue('tests.record', args=['urgent'], priority=5)
+        record_job.enqueue('second')
+        enqueue('tests.record', args=['later'], delay=60)
+        
+        self.drain()
+        self.assertEqual(job_calls, ['urgent', 'first', 'second'])
+        self.assertEqual(self.worker.succeeded, 3)
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).args, ['later'])
+    
+    def test_failures_retry_then_fail(self):
+        flaky_job.enqueue('frame')
+        with self.assertLogs('api.jobs', 'WARNING') as logs:
+            self.drain()
+        self.assertEqual(len(logs.records), 2)
+        
+        job = Job.objects.get()
+        self.assertEqual(job_calls, ['frame', 'frame'])
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('worker lost the camera feed', job.last_error)
+    
+    def test_expired_lease_is_claimed_again(self):
+        job = record_job.enqueue('slow')
+        crashed, = claim_jobs('crashed-worker')
+        # Invisible to other workers while leased
+        self.assertEqual(claim_jobs('other-worker'), [])
+        
+        Job.objects.filter(pk=job.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+        retried, = claim_jobs('other-worker')
+        self.assertEqual(retried.attempts, 2)
+        self.assertTrue(run_job(retried))
+        
+        # The first worker coming back late cannot overwrite the outcome
+        crashed_result = Job.objects.filter(pk=job.pk).values_list('status', 'locked_by').get()
+        run_job(crashed)
+        self.assertEqual(Job.objects.filter(pk=job.pk).values_list('status', 'locked_by').get(), crashed_result)
+        self.assertEqual(crashed_result, (Job.DONE, 'other-worker'))
+    
+    def test_image_derivatives_run_as_job(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, 'sos_images'))
+            Image.new('RGB', (640, 480), (10, 120, 200)).save(os.path.join(media_root, 'sos_images', 'frame.jpg'))
+            schedule_derivatives('sos_images/frame.jpg')
+            self.assertFalse(os.path.exists(os.path.join(media_root, derivative_name('sos_images/frame.jpg', 'thumbnail'))))
+            
+            self.drain()
+            self.assertTrue(os.path.exists(os.path.join(media_root, derivative_name('sos_images/frame.jpg', 'thumbnail'))))
+        self.assertEqual(Job.objects.get().name, 'generate_image_derivatives')
+
+
+class SOSArchiveTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='officer', password='testpassword123'))
+        self.old = self.create_sos('Old', status_flag=1, age_days=40)
+        self.recent = self.create_sos('Recent', status_flag=1, age_days=2)
+        self.active = self.create_sos('Active', status_flag=0, age_days=40)
+    
+    def create_sos(self, name, status_flag, age_days):
+        sos = SOS.objects.create(name=name, initial_latitude=28.61, initial_longitude=77.21, status_flag=status_flag)
+        start = timezone.now() - timedelta(days=age_days)
+        LocationUpdate.objects.bulk_create([
+            LocationUpdate(sos_request=sos, latitude=28.61 + i * 0.001, longitude=77.21, timestamp=start + timedelta(minutes=i))
+            for i in range(3)
+        ])
+        OfficerAssignment.objects.create(sos_request=sos, officer_name='Officer', unit_number='U1')
+        SOS.objects.filter(id=sos.id).update(updated_at=start)
+        return sos
+    
+    def add_image(self, sos):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(buffer, format='JPEG')
+        upload = io.BytesIO(buffer.getvalue())
+        upload.name = 'frame.jpg'
+        with mock.patch('api.signals.schedule_derivatives'):
+            response = self.client.post('/api/upload-sos-images/', {'sos_id': sos.id, 'images': [upload]}, format='multipart')
+        return SOSImage.objects.get(id=response.data['uploaded_images'][0]['id'])
+    
+    def test_old_resolved_sos_move_to_the_archive(self):
+        expected = self.client.get(f'/api/sos/{self.old.id}/').data
+        
+        call_command('archive_sos', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(set(SOS.objects.values_list('name', flat=True)), {'Recent', 'Active'})
+        self.assertFalse(LocationUpdate.objects.filter(sos_request_id=self.old.id).exists())
+        self.assertTrue(SOSTombstone.objects.filter(sos_id=self.old.id).exists())
+        
+        # Retrieve serves the archived copy in the same shape
+        response = self.client.get(f'/api/sos/{self.old.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data.pop('archived_at'))
+        self.assertEqual(response.data, expected)
+        response = self.client.get(f'/api/sos/{self.old.id}/trajectory/', {'encoding': 'points'})
+        self.assertEqual(response.data['point_count'], 3)
+        self.assertEqual(self.client.get('/api/sos/999999/').status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_archived_images_keep_their_files(self):
+        hot = self.add_image(self.active)
+        archived = self.add_image(self.old)
+        name = archived.image.name
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_sos', stdout=io.StringIO())
+        self.assertEqual(ArchivedSOSImage.objects.get().image.name, name)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+        
+        # The shared file goes once both the hot and the archived image are gone
+        with self.captureOnCommitCallbacks(execute=True):
+            hot.delete()
+            ArchivedSOS.objects.get().delete()
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+    
+    def test_dry_run_and_limit(self):
+        self.create_sos('Older', status_flag=1, age_days=50)
+        out = io.StringIO()
+        call_command('archive_sos', '--dry-run', stdout=out)
+        self.assertIn('2 SOS would be archived', out.getvalue())
+        self.assertFalse(ArchivedSOS.objects.exists())
+        
+        call_command('archive_sos', '--limit', '1', '--older-than-days', '30', stdout=io.StringIO())
+        self.assertEqual(ArchivedSOS.objects.count(), 1)
+    
+    def test_batches_are_bounded_by_point_count(self):
+        self.create_sos('Older', status_flag=1, age_days=50)
+        self.create_sos('Oldest', status_flag=1, age_days=60)
+        
+        # Three points per SOS: a budget of four points moves them one at a time
+        with mock.patch('api.archive.archive_batch', wraps=archive_batch) as batch:
+            archived = archive_resolved(timezone.now() - timedelta(days=30), batch_size=10, max_points=4)
+        self.assertEqual(archived, 3)
+        self.assertEqual(batch.call_count, 4)
+        self.assertEqual(ArchivedLocationUpdate.objects.count(), 9)
+    
+    def test_rows_are_copied_in_chunks(self):
+        _copy_rows(SOS.objects.filter(id=self.old.id), ArchivedSOS, archived_at=timezone.now())
+        bulk_create = ArchivedLocationUpdate.objects.bulk_create
+        with mock.patch.object(ArchivedLocationUpdate.objects, 'bulk_create', wraps=bulk_create) as inserts:
+            copied = _copy_rows(LocationUpdate.objects.filter(sos_request=self.old), ArchivedLocationUpdate, chunk_size=2)
+        self.assertEqual(copied, 3)
+        self.assertEqual([len(call.args[0]) for call in inserts.call_args_list], [2, 1])
+
+
+def full_scans(sql):
+    """
+    Tables a query reads in full, according to the database's EXPLAIN.
+    Index scans (e.g. in index order until a LIMIT) and scans of subquery
+    results are not counted.
+    """
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            scans = [row[-1].split() for row in cursor.fetchall() if row[-1].startswith('SCAN ')]
+            scans = [words[1] for words in scans if 'USING' not in words]
+        else:
+            cursor.execute(f'EXPLAIN {sql}')
+            scans = [row[0].split('Seq Scan on ')[1].split()[0] for row in cursor.fetchall() if 'Seq Scan on ' in row[0]]
+    return [table for table in scans if table in tables]
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Exact query counts per endpoint, and no full table scans on a seeded
+    dataset large enough for the planner to prefer indexes. Failures here
+    mean an N+1 or a missing index crept in.
+    """
+    SOS_COUNT = 1000
+    POINTS_PER_SOS = 10
+    
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        start = timezone.now() - timedelta(days=30)
+        SOS.objects.bulk_create([
+            SOS(
+                name=f'Person {i}', status_flag=int(i % 10 != 0), room_id=str(uuid.UUID(int=i)),
+                initial_latitude=28.4 + rng.random(), initial_longitude=76.8 + rng.random(),
+                unit_number_dispatched=f'U{i % 50}', geohash=''
+            )
+            for i in range(cls.SOS_COUNT)
+        ])
+        # bulk_create skips save(), so fill in the geohashes and spread creation times
+        for i, sos in enumerate(SOS.objects.order_by('id')):
+            sos.created_at = start + timedelta(minutes=i)
+            sos.save(update_fields=['geohash', 'created_at'])
+        cls.sos = SOS.objects.filter(status_flag=0).order_by('id').first()
+        sos_ids = list(SOS.objects.values_list('id', flat=True))
+        LocationUpdate.objects.bulk_create([
+            LocationUpdate(sos_request_id=sos_id, latitude=28.5, longitude=77.0, timestamp=start + timedelta(seconds=j))
+            for sos_id in sos_ids for j in range(cls.POINTS_PER_SOS)
+        ])
+        OfficerAssignment.objects.bulk_create([
+            OfficerAssignment(sos_request_id=sos_id, officer_name='Officer', unit_number=f'U{sos_id % 50}')
+            for sos_id in sos_ids
+        ])
+        cls.user = User.objects.create_user(username='officer', password='testpassword123')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def assertNoFullScans(self, statements, allowed=()):
+        for sql in statements:
+            if sql.startswith('SELECT'):
+                self.assertEqual([table for table in full_scans(sql) if table not in allowed], [], sql)
+    
+    def assertQueries(self, count, url, params=None, allowed_scans=()):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(len(statements), count, '\n'.join(statements))
+        self.assertNoFullScans(statements, allowed_scans)
+        return response
+    
+    def assertIndexed(self, queryset):
+        with CaptureQueriesContext(connection) as context:
+            list(queryset)
+        self.assertNoFullScans([query['sql'] for query in context.captured_queries])
+    
+    def test_endpoint_query_counts(self):
+        sos_id = self.sos.id
+        self.assertQueries(4, '/api/get-all-sos/', {'page_size': 50})
+        # Validators, then the SOS and its children; repeats are the validators plus a cached body
+        self.assertQueries(6, f'/api/sos/{sos_id}/')
+        self.assertQueries(1, f'/api/sos/{sos_id}/')
+        self.assertQueries(3, f'/api/sos/{sos_id}/trajectory/')
+        self.assertQueries(1, '/api/sos/nearby/', {'lat': 28.9, 'lon': 77.3, 'radius': 5000})
+        self.assertQueries(2, f'/api/get-sos-images/{sos_id}/')
+        self.assertQueries(1, f'/api/get-sos-images/{sos_id}/')
+        # The SOS, the dispatched units and the fresh unit positions; then
+        # the unit index is reused until its refresh interval passes
+        with mock.patch('api.consumers.officer_service.unit_locations', UnitLocationStore(refresh_interval=60)):
+            self.assertQueries(3, '/api/assign-officer/', {'sos_id': sos_id})
+            self.assertQueries(2, '/api/assign-officer/', {'sos_id': sos_id})
+    
+    def test_sos_list_has_no_n_plus_one(self):
+        # Unpaginated: every SOS and child row is read, so only the count is checked
+        tables = ('api_sos', 'api_locationupdate', 'api_locationtracksegment', 'api_officerassignment', 'api_sosimage')
+        response = self.assertQueries(5, '/api/sos/', allowed_scans=tables)
+        self.assertEqual(len(response.data), self.SOS_COUNT)
+        self.assertEqual(len(response.data[0]['location_updates']), self.POINTS_PER_SOS)
+    
+    @override_settings(SOS_SYNC_SETTLE_SECONDS=0)
+    def test_sync_query_count(self):
+        first = self.assertQueries(4, '/api/sync-sos/', {'limit': 100})
+        self.assertQueries(4, '/api/sync-sos/', {'since': first.data['watermark'], 'limit': 100})
+    
+    def test_full_scans_are_detected(self):
+        with CaptureQueriesContext(connection) as context:
+            list(SOS.objects.filter(name='Person 3'))
+        self.assertEqual(full_scans(context.captured_queries[0]['sql']), ['api_sos'])
+    
+    def test_hot_lookups_use_indexes(self):
+        self.assertIndexed(SOS.objects.filter(room_id=self.sos.room_id))
+        self.assertIndexed(SOS.objects.filter(status_flag=0).order_by('-created_at', '-id')[:50])
+        self.assertIndexed(LocationUpdate.objects.filter(sos_request=self.sos).order_by('timestamp', 'id'))
+        self.assertIndexed(OfficerAssignment.objects.filter(unit_number='U7').order_by('-assigned_at'))
+
+
+class SOSCacheTestCase(TestCase):
+    def setUp(self):
+        sos_cache.clear()
+        self.addCleanup(sos_cache.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='officer', password='testpassword123'))
+        self.sos = SOS.objects.create(name='Test Person', initial_latitude=28.7041, initial_longitude=77.1025, room_id='room-1')
+    
+    def ping(self):
+        return self.client.post('/api/update-location/', {
+            'sos_request': self.sos.id, 'latitude': 28.7042, 'longitude': 77.1026
+        }, format='json')
+    
+    def test_steady_state_ping_is_one_insert(self):
+        self.assertEqual(self.ping().status_code, status.HTTP_201_CREATED)
+        with mock.patch('api.services.emit_to_socketio') as emit:
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.ping().status_code, status.HTTP_201_CREATED)
+        self.assertEqual([query['sql'].split()[0] for query in context.captured_queries], ['INSERT'])
+        self.assertEqual(emit.call_args_list[0].args[1]['room_id'], 'room-1')
+        self.assertEqual(LocationUpdate.objects.filter(sos_request=self.sos).count(), 2)
+    
+    def test_unknown_sos_is_rejected(self):
+        response = self.client.post('/api/update-location/', {
+            'sos_request': 999999, 'latitude': 28.7, 'longitude': 77.1
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sos_request', response.data)
+    
+    def test_saves_and_deletes_invalidate(self):
+        self.assertEqual(sos_cache.get_by_room('room-1').id, self.sos.id)
+        with mock.patch('api.services.emit_to_socketio') as emit:
+            self.client.post('/api/assign-officer/', {
+                'sos_request': self.sos.id, 'officer_name': 'Officer', 'unit_number': 'U7'
+            }, format='json')
+            self.ping()
+        self.assertEqual(emit.call_args_list[-1].args[1]['unit_number'], 'U7')
+        self.assertEqual(sos_cache.get(self.sos.id).unit_number_dispatched, 'U7')
+        
+        self.sos.delete()
+        self.assertIsNone(sos_cache.get(self.sos.id))
+        self.assertIsNone(sos_cache.get_by_room('room-1'))
+    
+    def test_entries_expire_and_least_recently_used_go_first(self):
+        now = [1000.0]
+        cache = SOSCache(max_entries=2, ttl=30, clock=lambda: now[0])
+        other = SOS.objects.create(name='Other', initial_latitude=28.5, initial_longitude=77.0, room_id='room-2')
+        third = SOS.objects.create(name='Third', initial_latitude=28.6, initial_longitude=77.0, room_id='room-3')
+        cache.get(self.sos.id)
+        cache.get(other.id)
+        with self.assertNumQueries(0):
+            cache.get(self.sos.id)
+        cache.get_by_room('room-3')
+        # other was least recently used
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get(self.sos.id).id, self.sos.id)
+            self.assertEqual(cache.get(third.id).room_id, 'room-3')
+        with self.assertNumQueries(1):
+            cache.get_by_room('room-2')
+        
+        # Changes that bypass signals show up once the entry expires
+        SOS.objects.filter(id=third.id).update(status_flag=1)
+        self.assertEqual(cache.get(third.id).status_flag, 0)
+        now[0] += 31
+        self.assertEqual(cache.get(third.id).status_flag, 1)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+
+class StaleSOSCacheTestCase(TransactionTestCase):
+    """Autocommit, so a write for a deleted SOS fails at once as in production"""
+    
+    def setUp(self):
+        sos_cache.clear()
+        self.addCleanup(sos_cache.clear)
+        self.client = APIClient()
+        sos = SOS.objects.create(name='Test Person', initial_latitude=28.7041, initial_longitude=77.1025, room_id='room-1')
+        self.sos_id = sos.id
+        # Cached here, then deleted by another process (e.g. archive_sos) whose signals never reach this cache
+        state = sos_cache.get(sos.id)
+        sos.delete()
+        sos_cache._store(state)
+    
+    def test_ping_for_deleted_sos_is_rejected(self):
+        response = self.client.post('/api/update-location/', {
+            'sos_request': self.sos_id, 'latitude': 28.7042, 'longitude': 77.1026
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sos_request', response.data)
+        self.assertEqual(sos_cache.stats()['entries'], 0)
+    
+    def test_batch_for_deleted_sos_is_rejected(self):
+        response = self.client.post('/api/update-location/batch/', {
+            'sos_request': self.sos_id, 'points': [{'latitude': 28.7042, 'longitude': 77.1026}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sos_request', response.data)
+        self.assertFalse(LocationUpdate.objects.exists())
+
+
+class ConditionalSOSResponseTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='officer', password='testpassword123'))
+        self.sos = SOS.objects.create(name='Test Person', initial_latitude=28.7041, initial_longitude=77.1025, room_id='room-1')
+        LocationUpdate.objects.create(sos_request=self.sos, latitude=28.7042, longitude=77.1026)
+        self.url = f'/api/sos/{self.sos.id}/'
+    
+    def add_image(self, generate=True):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(buffer, format='JPEG')
+        upload = io.BytesIO(buffer.getvalue())
+        upload.name = 'frame.jpg'
+        with mock.patch('api.signals.schedule_derivatives'):
+            response = self.client.post('/api/upload-sos-images/', {'sos_id': self.sos.id, 'images': [upload]}, format='multipart')
+        image = SOSImage.objects.get(id=response.data['uploaded_images'][0]['id'])
+        if generate:
+            generate_derivatives(image.image.name)
+        return image
+    
+    def test_repeat_reads_are_304_or_cached(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(first['ETag'])
+        self.assertIn('Last-Modified', first)
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        # Another officer without a copy gets the cached body, not a new serialization
+        with mock.patch('api.views.SOSSerializer.to_representation', side_effect=AssertionError):
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url)
+        self.assertEqual(response.data, first.data)
+    
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        images_etag = self.client.get(f'/api/get-sos-images/{self.sos.id}/')['ETag']
+        
+        with mock.patch('api.services.emit_to_socketio'):
+            self.client.post('/api/update-location/', {
+                'sos_request': self.sos.id, 'latitude': 28.7043, 'longitude': 77.1027
+            }, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['location_updates']), 2)
+        # Image listings do not depend on location updates
+        response = self.client.get(f'/api/get-sos-images/{self.sos.id}/', HTTP_IF_NONE_MATCH=images_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        etag = response['ETag']
+        with mock.patch('api.views.emit_to_socketio'):
+            self.client.post('/api/update-location/batch/', {
+                'sos_request': self.sos.id, 'points': [{'latitude': 28.7044, 'longitude': 77.1028}]
+            }, format='json')
+        self.assertEqual(len(self.client.get(self.url).data['location_updates']), 3)
+        
+        # Edits that leave counts and timestamps alone still count
+        self.sos.name = 'Renamed'
+        self.sos.save()
+        self.assertEqual(self.client.get(self.url).data['name'], 'Renamed')
+        self.add_image()
+        response = self.client.get(f'/api/get-sos-images/{self.sos.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['count'], 1)
+    
+    def test_writes_without_signals_change_the_etag(self):
+        # As from another process or a bulk insert: nothing invalidates, the validators still move
+        first = self.client.get(self.url)
+        LocationUpdate.objects.bulk_create([LocationUpdate(sos_request=self.sos, latitude=28.7043, longitude=77.1027)])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['location_updates']), 2)
+        
+        assignment = OfficerAssignment.objects.create(sos_request=self.sos, officer_name='Officer', unit_number='U1')
+        etag = self.client.get(self.url)['ETag']
+        assignment.officer_name = 'Another officer'
+        assignment.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['officer_assignments'][0]['officer_name'], 'Another officer')
+    
+    def test_backfilled_points_advance_last_modified(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        SOS.objects.filter(pk=self.sos.pk).update(updated_at=hour_ago)
+        LocationUpdate.objects.filter(sos_request=self.sos).update(timestamp=hour_ago, received_at=hour_ago)
+        last_modified = self.client.get(self.url)['Last-Modified']
+        
+        with mock.patch('api.views.emit_to_socketio'):
+            self.client.post('/api/update-location/batch/', {
+                'sos_request': self.sos.id,
+                'points': [{'latitude': 28.7044, 'longitude': 77.1028, 'timestamp': (hour_ago - timedelta(hours=1)).isoformat()}]
+            }, format='json')
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['location_updates']), 2)
+    
+    def test_pending_thumbnails_are_not_cached(self):
+        image = self.add_image(generate=False)
+        url = f'/api/get-sos-images/{self.sos.id}/'
+        response = self.client.get(url)
+        self.assertIsNone(response.data['images'][0]['thumbnail_url'])
+        self.assertNotIn('ETag', response)
+        
+        generate_derivatives(image.image.name)
+        response = self.client.get(url)
+        self.assertIsNotNone(response.data['images'][0]['thumbnail_url'])
+        self.assertIn('ETag', response)
+    
+    def test_missing_and_archived_sos(self):
+        self.assertEqual(self.client.get('/api/get-sos-images/999999/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/sos/999999/').status_code, status.HTTP_404_NOT_FOUND)
+        
+        # Read once while hot, then moved to the archive
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        SOS.objects.filter(pk=self.sos.pk).update(status_flag=1, updated_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(archive_resolved(timezone.now() - timedelta(days=30)), 1)
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['archived_at'])
+        self.assertEqual([update['latitude'] for update in response.data['location_updates']], [28.7042])
@@ -0,0 +1,188 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from .geo import EARTH_RADIUS_M
+
+# Packed tracks store coordinates as integer microdegrees and times as epoch
+# milliseconds, each as a zigzag varint delta from the previous point
+TRACK_FORMAT_VERSION = 1
+COORDINATE_SCALE = 1_000_000
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def to_epoch_ms(timestamp):
+    return int(round(timestamp.timestamp() * 1000))
+
+
+def from_epoch_ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+
+def pack_track(points):
+    """
+    Pack (latitude, longitude, timestamp) points into a compact blob.
+    Coordinates round-trip to the nearest microdegree (~0.11m) and times to
+    the millisecond.
+    """
+    out = bytearray([TRACK_FORMAT_VERSION])
+    _write_varint(out, len(points))
+    prev_lat = prev_lon = prev_ts = 0
+    for latitude, longitude, timestamp in points:
+        lat = int(round(latitude * COORDINATE_SCALE))
+        lon = int(round(longitude * COORDINATE_SCALE))
+        ts = to_epoch_ms(timestamp)
+        _write_varint(out, _zigzag(lat - prev_lat))
+        _write_varint(out, _zigzag(lon - prev_lon))
+        _write_varint(out, _zigzag(ts - prev_ts))
+        prev_lat, prev_lon, prev_ts = lat, lon, ts
+    return bytes(out)
+
+
+def unpack_track(data):
+    """Inverse of pack_track, returning (latitude, longitude, timestamp) tuples"""
+    data = bytes(data)
+    if not data or data[0] != TRACK_FORMAT_VERSION:
+        raise ValueError('Unsupported track format')
+    count, offset = _read_varint(data, 1)
+    points = []
+    lat = lon = ts = 0
+    for _ in range(count):
+        delta, offset = _read_varint(data, offset)
+        lat += _unzigzag(delta)
+        delta, offset = _read_varint(data, offset)
+        lon += _unzigzag(delta)
+        delta, offset = _read_varint(data, offset)
+        ts += _unzigzag(delta)
+        points.append((lat / COORDINATE_SCALE, lon / COORDINATE_SCALE, from_epoch_ms(ts)))
+    return points
+
+
+def _encode_signed(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(coordinates, precision=5):
+    """Encode (latitude, longitude) pairs in the Google encoded polyline format"""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for latitude, longitude in coordinates:
+        lat = int(round(latitude * factor))
+        lon = int(round(longitude * factor))
+        _encode_signed(lat - prev_lat, out)
+        _encode_signed(lon - prev_lon, out)
+        prev_lat, prev_lon = lat, lon
+    return ''.join(out)
+
+
+def decode_polyline(polyline, precision=5):
+    """Decode an encoded polyline back into (latitude, longitude) pairs"""
+    factor = 10 ** precision
+    coordinates = []
+    index = lat = lon = 0
+    while index < len(polyline):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coordinates.append((lat / factor, lon / factor))
+    return coordinates
+
+
+def simplify(points, tolerance_m):
+    """
+    Douglas-Peucker simplification of (latitude, longitude, ...) tuples,
+    dropping points closer than ``tolerance_m`` metres to the simplified
+    line. The first and last points are always kept.
+    """
+    if tolerance_m <= 0 or len(points) < 3:
+        return list(points)
+
+    # Project onto a local plane in metres; accurate enough at track scale
+    metres_per_degree = math.pi * EARTH_RADIUS_M / 180
+    cos_lat = math.cos(math.radians(points[0][0]))
+    xy = [(p[1] * metres_per_degree * cos_lat, p[0] * metres_per_degree) for p in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = xy[start]
+        bx, by = xy[end]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        max_distance = -1.0
+        max_index = start
+        for i in range(start + 1, end):
+            px, py = xy[i]
+            if length_sq == 0:
+                distance = math.hypot(px - ax, py - ay)
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+                distance = math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+            if distance > max_distance:
+                max_distance = distance
+                max_index = i
+        if max_distance > tolerance_m:
+            keep[max_index] = True
+            stack.append((start, max_index))
+            stack.append((max_index, end))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def load_track(sos):
+    """
+    Full location history of an SOS in time order, merging compacted
+    segments with location updates that are still stored row by row.
+    """
+    points = []
+    # Related managers, so archived SOS load from the archive tables
+    for data in sos.track_segments.values_list('data', flat=True):
+        points.extend(unpack_track(data))
+    points.extend(
+        sos.location_updates
+        .order_by('timestamp', 'id')
+        .values_list('latitude', 'longitude', 'timestamp')
+    )
+    points.sort(key=lambda point: point[2])
+    return points
@@ -0,0 +1,93 @@
+import os
+import re
+
+from django.core.files.uploadedfile import UploadedFile
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class InvalidRange(ValueError):
+    pass
+
+
+class ClientDisconnected(Exception):
+    """The chunk body ended early; ``written`` bytes reached the disk first"""
+
+    def __init__(self, written):
+        super().__init__(f'Connection dropped after {written} bytes')
+        self.written = written
+
+
+def parse_content_range(header, size):
+    """
+    ``Content-Range: bytes <first>-<last>/<total>`` to a [start, end) pair,
+    checked against the declared upload size.
+    """
+    match = CONTENT_RANGE.match((header or '').strip())
+    if not match:
+        raise InvalidRange('Content-Range must look like "bytes <first>-<last>/<total>"')
+    start, last = int(match.group(1)), int(match.group(2))
+    if match.group(3) != '*' and int(match.group(3)) != size:
+        raise InvalidRange(f'Total length does not match the upload size ({size})')
+    if last < start or last >= size:
+        raise InvalidRange(f'Range must lie within 0-{size - 1}')
+    return start, last + 1
+
+
+def merge_range(ranges, start, end):
+    """Add [start, end) to a sorted list of disjoint [start, end) ranges"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def next_offset(ranges):
+    """First byte not received yet, counting from the start of the file"""
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+def write_stream(path, start, stream, length, block_size=64 * 1024):
+    """
+    Copy ``length`` bytes from a request stream into ``path`` at offset
+    ``start``, one block at a time so the chunk is never held in memory.
+    Returns the number of bytes written, or raises ClientDisconnected
+    (carrying what did get written) when the body ends early.
+    """
+    written = 0
+    # Create the file if this is the first chunk, but never truncate it:
+    # concurrent chunks of one upload may open it at the same time
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as handle:
+        handle.seek(start)
+        try:
+            while written < length:
+                block = stream.read(min(block_size, length - written))
+                if not block:
+                    break
+                handle.write(block)
+                written += len(block)
+        except OSError:
+            # UnreadablePostError: the client went away mid-chunk
+            pass
+    if written < length:
+        raise ClientDisconnected(written)
+    return written
+
+
+class AssembledUpload(UploadedFile):
+    """
+    A finalized upload still in its partial file. It exposes
+    temporary_file_path(), so image validation reads it from disk and
+    FileSystemStorage moves it into place instead of copying it.
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(open(path, 'rb'), name=name, size=size)
+
+    def temporary_file_path(self):
+        return self.file.name
@@ -9,9 +9,14 @@ urlpatterns = [
     path('', include(router.urls)),
     path('create-sos/', views.CreateSOSView.as_view(), name='create-sos'),
     path('update-location/', views.LocationUpdateView.as_view(), name='update-location'),
+    path('update-location/batch/', views.LocationBatchUpdateView.as_view(), name='update-location-batch'),
     path('assign-officer/', views.AssignOfficerView.as_view(), name='assign-officer'),
     path('resolve-sos/<int:sos_id>/', views.ResolveSOSView.as_view(), name='resolve-sos'),
     path('get-all-sos/', views.GetAllSOSView.as_view(), name='get-all-sos'),
+    path('sync-sos/', views.SyncSOSView.as_view(), name='sync-sos'),
     path('upload-sos-images/', views.UploadSOSImagesView.as_view(), name='upload-sos-images'),
+    path('sos-image-uploads/', views.SOSImageUploadView.as_view(), name='sos-image-uploads'),
+    path('sos-image-uploads/<uuid:upload_id>/', views.SOSImageUploadChunkView.as_view(), name='sos-image-upload-chunk'),
+    path('sos-image-uploads/<uuid:upload_id>/finalize/', views.FinalizeSOSImageUploadView.as_view(), name='sos-image-upload-finalize'),
     path('get-sos-images/<int:sos_id>/', views.GetSOSImagesView.as_view(), name='get-sos-images'),
 ]
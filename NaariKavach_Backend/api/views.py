@@ -1,50 +1,53 @@
+import os
 import uuid
-import socketio
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
 
-from .models import SOS, OfficerAssignment, LocationUpdate, SOSImage
+from .models import SOS, ArchivedSOS, OfficerAssignment, LocationUpdate, SOSImage, SOSImageUpload
 from .serializers import (
-    SOSSerializer, SOSCreateSerializer, 
-    LocationUpdateSerializer, LocationUpdateCreateSerializer,
+    SOSSerializer, SOSListSerializer, SOSCreateSerializer, 
+    LocationUpdateSerializer, LocationBatchCreateSerializer,
     OfficerAssignmentSerializer, OfficerAssignmentCreateSerializer,
-    SOSImageSerializer, SOSImageCreateSerializer
+    SOSImageSerializer, SOSImageCreateSerializer,
+    SOSImageUploadSerializer, SOSImageUploadCreateSerializer,
+    SOSSummarySerializer, SOSTombstoneSerializer, ArchivedSOSSerializer
 )
-
-# Create Socket.IO client to emit events to our Socket.IO server
-sio_client = socketio.SimpleClient()
-
-def connect_to_socketio():
-    """Connect to Socket.IO server if not already connected"""
-    try:
-        if not sio_client.connected:
-            sio_client.connect('http://localhost:8001')
-    except Exception as e:
-        print(f"Failed to connect to Socket.IO server: {e}")
-
-def emit_to_socketio(event, data):
-    """Emit event to Socket.IO server"""
-    try:
-        connect_to_socketio()
-        if sio_client.connected:
-            sio_client.emit(event, data)
-    except Exception as e:
-        print(f"Failed to emit to Socket.IO: {e}")
+from .consumers.officer_service import suggest_units
+from .pagination import InvalidCursor, keyset_page, parse_limit
+from .response_cache import cached_incident_response, derivatives_ready
+from .trajectory import encode_polyline, load_track, simplify, to_epoch_ms
+from .sync import InvalidWatermark, Watermark, collect_changes
+from .uploads import AssembledUpload, ClientDisconnected, InvalidRange, merge_range, parse_content_range, write_stream
+from .services import create_sos, emit_to_socketio, record_location, sos_created_response
 
 class SOSViewSet(viewsets.ModelViewSet):
     queryset = SOS.objects.all()
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # SOSSerializer nests these; one query per relation, not per SOS
+            queryset = queryset.prefetch_related('location_updates', 'track_segments', 'officer_assignments', 'images')
+        return queryset
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return SOSCreateSerializer
         return SOSSerializer
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'trajectory']:
             permission_classes = [IsAuthenticated]
+        elif self.action == 'nearby':
+            permission_classes = [permissions.AllowAny]  # Same exposure as get-all-sos
         elif self.action in ['update', 'partial_update', 'destroy']:
             permission_classes = [IsAdminUser]
         else:
@@ -66,6 +69,124 @@ class SOSViewSet(viewsets.ModelViewSet):
             "message": "SOS created successfully",
             "room_id": room_id
         }, status=status.HTTP_201_CREATED)
+    
+    def get_object_or_archived(self):
+        """The hot SOS, or its archived copy once `archive_sos` has moved it"""
+        try:
+            return self.get_object()
+        except Http404:
+            archived = ArchivedSOS.objects.prefetch_related('location_updates', 'track_segments', 'officer_assignments', 'images')
+            return get_object_or_404(archived, pk=self.kwargs['pk'])
+    
+    def retrieve(self, request, *args, **kwargs):
+        """
+        One SOS with its children. Sends ETag/Last-Modified, answers 304 to
+        a current If-None-Match/If-Modified-Since and serves repeat reads
+        from the response cache.
+        """
+        def build():
+            data = self.get_serializer(self.get_object()).data
+            return data, derivatives_ready(data['images'])
+        
+        response = cached_incident_response(request, 'detail', kwargs['pk'], build)
+        if response is not None:
+            return response
+        sos = self.get_object_or_archived()
+        if isinstance(sos, ArchivedSOS):
+            return Response(ArchivedSOSSerializer(sos, context=self.get_serializer_context()).data)
+        return Response(self.get_serializer(sos).data)
+    
+    @action(detail=True, methods=['get'])
+    def trajectory(self, request, pk=None):
+        """
+        Compact location history of one SOS.
+
+        ``encoding=polyline`` (default) returns an encoded polyline plus
+        millisecond time deltas; ``encoding=points`` returns plain points.
+        ``tolerance`` (metres) applies Douglas-Peucker simplification.
+        """
+        sos = self.get_object_or_archived()
+        encoding = request.query_params.get('encoding', 'polyline')
+        try:
+            tolerance = float(request.query_params.get('tolerance', 0))
+            precision = int(request.query_params.get('precision', 6))
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "message": f"Invalid parameter: {str(e)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if encoding not in ('polyline', 'points') or not 1 <= precision <= 7 or tolerance < 0:
+            return Response({
+                "status": "error",
+                "message": "Invalid trajectory parameters"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        points = simplify(load_track(sos), tolerance)
+        data = {
+            "status": "success",
+            "sos_id": sos.id,
+            "point_count": len(points),
+            "encoding": encoding
+        }
+        if encoding == 'points':
+            data["points"] = [
+                {'latitude': lat, 'longitude': lon, 'timestamp': timestamp.isoformat()}
+                for lat, lon, timestamp in points
+            ]
+        else:
+            times = [to_epoch_ms(timestamp) for _, _, timestamp in points]
+            data["precision"] = precision
+            data["polyline"] = encode_polyline([(lat, lon) for lat, lon, _ in points], precision)
+            data["start_time_ms"] = times[0] if times else None
+            data["time_deltas_ms"] = [b - a for a, b in zip(times, times[1:])]
+        return Response(data, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Unresolved SOS within ``radius`` metres of (``lat``, ``lon``),
+        nearest first
+        """
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lon'])
+            radius = float(request.query_params.get('radius', settings.SOS_NEARBY_DEFAULT_RADIUS_M))
+            limit = parse_limit(request.query_params.get('limit'), settings.SOS_LIST_PAGE_SIZE, settings.SOS_LIST_MAX_PAGE_SIZE)
+        except KeyError as e:
+            return Response({
+                "status": "error",
+                "message": f"Missing required parameter: {e.args[0]}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "message": f"Invalid parameter: {str(e)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response({
+                "status": "error",
+                "message": "Coordinates out of range"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius <= settings.SOS_NEARBY_MAX_RADIUS_M:
+            return Response({
+                "status": "error",
+                "message": f"Radius must be between 0 and {settings.SOS_NEARBY_MAX_RADIUS_M} metres"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = SOS.objects.nearby(latitude, longitude, radius)[:limit]
+        data = []
+        for sos, distance in results:
+            item = SOSSummarySerializer(sos).data
+            item['distance_m'] = round(distance, 1)
+            data.append(item)
+        
+        return Response({
+            "status": "success",
+            "message": "Nearby SOS entries fetched successfully",
+            "count": len(data),
+            "data": data
+        }, status=status.HTTP_200_OK)
 
 class CreateSOSView(APIView):
     """
@@ -74,38 +195,12 @@ class CreateSOSView(APIView):
     permission_classes = [permissions.AllowAny]
     
     def post(self, request):
-        serializer = SOSCreateSerializer(data=request.data)
+        sos, errors = create_sos(request.data, user=request.user)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
         
-        if serializer.is_valid():
-            # Generate a unique room ID for this SOS
-            room_id = str(uuid.uuid4())
-            
-            # Associate with user if authenticated
-            if request.user.is_authenticated:
-                sos = serializer.save(user=request.user, room_id=room_id)
-            else:
-                sos = serializer.save(room_id=room_id)
-            
-            # Emit to SOS channel when new SOS is created
-            emit_to_socketio('sos_created', {
-                'sos_id': sos.id,
-                'room_id': room_id,
-                'name': sos.name,
-                'sos_type': sos.sos_type,
-                'latitude': sos.initial_latitude,
-                'longitude': sos.initial_longitude,
-                'created_at': sos.created_at.isoformat()
-            })
-                
-            # Return success with room_id for websocket connection
-            return Response({
-                "status": "success",
-                "message": "SOS created successfully",
-                "sos_id": sos.id,
-                "room_id": room_id
-            }, status=status.HTTP_201_CREATED)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Return success with room_id for websocket connection
+        return Response(sos_created_response(sos), status=status.HTTP_201_CREATED)
 
 class LocationUpdateView(APIView):
     """
@@ -114,41 +209,86 @@ class LocationUpdateView(APIView):
     permission_classes = [permissions.AllowAny]
     
     def post(self, request):
-        serializer = LocationUpdateCreateSerializer(data=request.data)
+        _, errors = record_location(request.data)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({"status": "Location updated successfully"}, status=status.HTTP_201_CREATED)
+
+class LocationBatchUpdateView(APIView):
+    """
+    API endpoint to upload a buffered batch of location points for one SOS.
+
+    Points keep their client timestamps, are written with a single bulk
+    insert and are announced to Socket.IO as one aggregated event.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request):
+        serializer = LocationBatchCreateSerializer(data=request.data)
         
         if serializer.is_valid():
-            location_update = serializer.save()
-            sos = location_update.sos_request
+            location_updates = serializer.save()
+            sos = serializer.validated_data['sos_request']
             
-            # Emit location update to specific SOS room
-            emit_to_socketio('location_update_to_room', {
+            emit_to_socketio('location_batch_to_room', {
                 'room_id': sos.room_id,
                 'sos_id': sos.id,
-                'latitude': location_update.latitude,
-                'longitude': location_update.longitude,
-                'timestamp': location_update.timestamp.isoformat()
+                'unit_number': sos.unit_number_dispatched,
+                'points': [
+                    {
+                        'latitude': location_update.latitude,
+                        'longitude': location_update.longitude,
+                        'timestamp': location_update.timestamp.isoformat()
+                    }
+                    for location_update in location_updates
+                ]
             })
             
-            # If SOS has assigned unit, also emit to unit channel
-            if sos.unit_number_dispatched:
-                emit_to_socketio('location_update_to_unit', {
-                    'unit_number': sos.unit_number_dispatched,
-                    'sos_id': sos.id,
-                    'latitude': location_update.latitude,
-                    'longitude': location_update.longitude,
-                    'timestamp': location_update.timestamp.isoformat()
-                })
-            
-            return Response({"status": "Location updated successfully"}, status=status.HTTP_201_CREATED)
+            return Response({
+                "status": "Locations updated successfully",
+                "count": len(location_updates)
+            }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class AssignOfficerView(APIView):
     """
-    API endpoint to assign an officer to an SOS
+    API endpoint to assign an officer to an SOS.
+
+    GET ``?sos_id=&k=`` suggests the k nearest free units from the unit
+    positions the Socket.IO servers store in UnitLocation.
     """
     permission_classes = [IsAuthenticated]
     
+    def get(self, request):
+        sos_id = request.query_params.get('sos_id')
+        if not sos_id:
+            return Response({
+                "status": "error",
+                "message": "SOS ID is required"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            k = parse_limit(request.query_params.get('k'), 5, 50)
+            sos = SOS.objects.get(id=sos_id)
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "message": f"Invalid parameter: {str(e)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except SOS.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": "SOS request not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            "status": "success",
+            "sos_id": sos.id,
+            "suggested_units": suggest_units(sos, k)
+        }, status=status.HTTP_200_OK)
+    
     def post(self, request):
         serializer = OfficerAssignmentCreateSerializer(data=request.data)
         
@@ -181,6 +321,12 @@ class ResolveSOSView(APIView):
             sos.status_flag = 1  # Mark as resolved
             sos.save()
             
+            # Lets the Socket.IO server notify the room and free its history
+            emit_to_socketio('sos_resolved', {
+                'sos_id': sos.id,
+                'room_id': sos.room_id
+            })
+            
             return Response({
                 "status": "SOS marked as resolved successfully",
                 "sos": SOSSerializer(sos).data
@@ -190,31 +336,139 @@ class ResolveSOSView(APIView):
 
 class GetAllSOSView(APIView):
     """
-    API endpoint to fetch all SOS entries from the database
+    API endpoint to fetch SOS entries from the database, newest first.
+
+    Results are cursor paginated: pass the ``next_cursor`` of a response as
+    ``?cursor=`` to fetch the following page. ``page_size`` and
+    ``location_limit`` (most recent location updates per SOS) are optional.
     """
     permission_classes = [permissions.AllowAny]
     
     def get(self, request):
         try:
-            # Get all SOS entries from the database
-            sos_queryset = SOS.objects.all().order_by('-created_at')  # Order by newest first
+            page_size = parse_limit(
+                request.query_params.get('page_size'),
+                settings.SOS_LIST_PAGE_SIZE,
+                settings.SOS_LIST_MAX_PAGE_SIZE
+            )
+            location_limit = parse_limit(
+                request.query_params.get('location_limit'),
+                settings.SOS_LOCATION_HISTORY_LIMIT,
+                settings.SOS_LOCATION_HISTORY_MAX_LIMIT
+            )
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "message": f"Invalid pagination parameter: {str(e)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # One query per relation for the whole page, whatever its size
+            sos_queryset = SOS.objects.prefetch_related(
+                Prefetch(
+                    'location_updates',
+                    queryset=LocationUpdate.objects.order_by('-timestamp', '-id')[:location_limit],
+                    to_attr='recent_location_updates'
+                ),
+                'officer_assignments',
+                'images'
+            )
+            sos_page, next_cursor = keyset_page(
+                sos_queryset, request.query_params.get('cursor'), page_size
+            )
             
             # Serialize the data
-            serializer = SOSSerializer(sos_queryset, many=True)
+            serializer = SOSListSerializer(sos_page, many=True)
             
             return Response({
                 "status": "success",
                 "message": "SOS entries fetched successfully",
-                "count": sos_queryset.count(),
+                "count": len(sos_page),
+                "next_cursor": next_cursor,
                 "data": serializer.data
             }, status=status.HTTP_200_OK)
             
+        except InvalidCursor as e:
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+            
         except Exception as e:
             return Response({
                 "status": "error",
                 "message": f"Failed to fetch SOS entries: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def parse_if_none_match(header):
+    """Return the entity tags listed in an If-None-Match header, unquoted"""
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tags.append(tag.strip('"'))
+    return tags
+
+class SyncSOSView(APIView):
+    """
+    API endpoint returning only what changed since a client watermark.
+
+    Pass the ``watermark`` of the previous response as ``?since=`` (or send
+    the previous ETag in If-None-Match). When nothing has changed the
+    response is 304 Not Modified with no body.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        etags = parse_if_none_match(request.META.get('HTTP_IF_NONE_MATCH'))
+        since = request.query_params.get('since')
+        watermark = None
+        if since is None and len(etags) == 1:
+            try:
+                watermark = Watermark.decode(etags[0])
+            except InvalidWatermark:
+                # '*' or an ETag of another endpoint: not a watermark, sync from the start
+                pass
+        
+        try:
+            limit = parse_limit(
+                request.query_params.get('limit'),
+                settings.SOS_SYNC_BATCH_SIZE,
+                settings.SOS_SYNC_MAX_BATCH_SIZE
+            )
+            if watermark is None:
+                watermark = Watermark.decode(since)
+        except (ValueError, InvalidWatermark) as e:
+            return Response({
+                "status": "error",
+                "message": f"Invalid sync parameter: {str(e)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        changes, next_watermark, has_more = collect_changes(watermark, limit)
+        token = next_watermark.encode()
+        etag = f'"{token}"'
+        
+        if token in etags or '*' in etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        
+        response = Response({
+            "status": "success",
+            "message": "SOS changes fetched successfully",
+            "watermark": token,
+            "has_more": has_more,
+            "sos": SOSSummarySerializer(changes['sos'], many=True).data,
+            "location_updates": LocationUpdateSerializer(changes['location_updates'], many=True).data,
+            "officer_assignments": OfficerAssignmentSerializer(changes['officer_assignments'], many=True).data,
+            "tombstones": SOSTombstoneSerializer(changes['tombstones'], many=True).data
+        }, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        return response
+
 class UploadSOSImagesView(APIView):
     """
     API endpoint to upload multiple images for an SOS request
@@ -289,35 +543,208 @@ class UploadSOSImagesView(APIView):
                 "errors": errors
             }, status=status.HTTP_400_BAD_REQUEST)
 
-class GetSOSImagesView(APIView):
+class SOSImageUploadView(APIView):
     """
-    API endpoint to retrieve all images for a specific SOS request
+    API endpoint to start a resumable, chunked upload of one SOS image.
+
+    Returns an upload_id; the client then PUTs byte ranges to
+    /api/sos-image-uploads/<upload_id>/ and finalizes the upload once
+    every range has arrived.
     """
     permission_classes = [permissions.AllowAny]
     
-    def get(self, request, sos_id):
+    def post(self, request):
+        serializer = SOSImageUploadCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        upload = serializer.save()
+        return Response(SOSImageUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+class SOSImageUploadChunkView(APIView):
+    """
+    API endpoint for the chunks of a resumable image upload.
+
+    GET returns the byte ranges already stored, so a reconnecting client
+    knows where to resume. PUT streams one chunk, addressed by a
+    ``Content-Range: bytes <first>-<last>/<total>`` header, straight into
+    the partial file on disk. If the connection drops mid-chunk, the bytes
+    that did arrive are kept.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, upload_id):
         try:
-            sos_request = SOS.objects.get(id=sos_id)
-        except SOS.DoesNotExist:
+            upload = SOSImageUpload.objects.get(id=upload_id)
+        except SOSImageUpload.DoesNotExist:
             return Response({
                 "status": "error",
-                "message": "SOS request not found"
+                "message": "Upload not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(SOSImageUploadSerializer(upload).data, status=status.HTTP_200_OK)
+    
+    def put(self, request, upload_id):
+        try:
+            upload = SOSImageUpload.objects.get(id=upload_id)
+        except SOSImageUpload.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": "Upload not found"
             }, status=status.HTTP_404_NOT_FOUND)
         
+        if upload.image_id is not None:
+            return Response({
+                "status": "error",
+                "message": "Upload is already finalized"
+            }, status=status.HTTP_409_CONFLICT)
+        
         try:
-            images = SOSImage.objects.filter(sos_request=sos_request).order_by('-uploaded_at')
-            serializer = SOSImageSerializer(images, many=True, context={'request': request})
-            
+            start, end = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), upload.size)
+        except InvalidRange as e:
             return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if end - start > settings.SOS_IMAGE_UPLOAD_MAX_CHUNK_SIZE:
+            return Response({
+                "status": "error",
+                "message": f"Chunks may be at most {settings.SOS_IMAGE_UPLOAD_MAX_CHUNK_SIZE} bytes"
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        if request.META.get('CONTENT_LENGTH') != str(end - start):
+            return Response({
+                "status": "error",
+                "message": "Content-Length must match the Content-Range"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Read the raw body in blocks; request.data is never touched, so
+        # the chunk is not buffered in memory
+        os.makedirs(settings.SOS_IMAGE_UPLOAD_DIR, exist_ok=True)
+        try:
+            write_stream(upload.partial_path, start, request, end - start)
+        except ClientDisconnected as e:
+            if e.written:
+                self.record_range(upload_id, start, start + e.written)
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        upload = self.record_range(upload_id, start, end)
+        if upload.image_id is not None:
+            return Response({
+                "status": "error",
+                "message": "Upload is already finalized"
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(SOSImageUploadSerializer(upload).data, status=status.HTTP_200_OK)
+    
+    @staticmethod
+    def record_range(upload_id, start, end):
+        # Locked so concurrent chunks of one upload do not lose each other's ranges
+        with transaction.atomic():
+            upload = SOSImageUpload.objects.select_for_update().get(id=upload_id)
+            if upload.image_id is not None:
+                # Finalized while this chunk was streaming: the write
+                # recreated the partial file, which nothing will use now
+                if os.path.isfile(upload.partial_path):
+                    os.remove(upload.partial_path)
+                return upload
+            upload.received_ranges = merge_range(upload.received_ranges, start, end)
+            upload.save(update_fields=['received_ranges', 'updated_at'])
+        return upload
+
+class FinalizeSOSImageUploadView(APIView):
+    """
+    API endpoint to turn a fully received upload into an SOSImage.
+
+    The partial file is validated as an image from disk and moved into
+    media storage without being copied. Finalizing again returns the same
+    image, so a client can safely retry after losing the response.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request, upload_id):
+        # Locked until the image is saved, so a concurrent finalize waits
+        # and then returns this image instead of creating a second one
+        with transaction.atomic():
+            try:
+                upload = SOSImageUpload.objects.select_for_update().get(id=upload_id)
+            except SOSImageUpload.DoesNotExist:
+                return Response({
+                    "status": "error",
+                    "message": "Upload not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            if upload.image_id is not None:
+                return Response({
+                    "status": "success",
+                    "message": "Image uploaded successfully",
+                    "uploaded_image": SOSImageSerializer(upload.image, context={'request': request}).data
+                }, status=status.HTTP_200_OK)
+            
+            if not upload.is_complete:
+                return Response(dict(SOSImageUploadSerializer(upload).data, **{
+                    "status": "error",
+                    "message": "Upload is missing byte ranges"
+                }), status=status.HTTP_409_CONFLICT)
+            
+            image_file = AssembledUpload(upload.partial_path, upload.filename, upload.size)
+            try:
+                serializer = SOSImageCreateSerializer(data={
+                    'sos_request': upload.sos_request_id,
+                    'image': image_file,
+                    'description': upload.description
+                })
+                if not serializer.is_valid():
+                    # Not an image: nothing to resume, drop the upload
+                    upload.delete()
+                    return Response({
+                        "status": "error",
+                        "message": "Failed to upload image",
+                        "errors": serializer.errors
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                image = serializer.save()
+            finally:
+                image_file.close()
+            
+            upload.image = image
+            upload.save(update_fields=['image', 'updated_at'])
+        return Response({
+            "status": "success",
+            "message": "Image uploaded successfully",
+            "uploaded_image": SOSImageSerializer(image, context={'request': request}).data
+        }, status=status.HTTP_201_CREATED)
+
+class GetSOSImagesView(APIView):
+    """
+    API endpoint to retrieve all images for a specific SOS request
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, sos_id):
+        def build():
+            images = SOSImage.objects.filter(sos_request_id=sos_id).order_by('-uploaded_at')
+            data = SOSImageSerializer(images, many=True, context={'request': request}).data
+            return {
                 "status": "success",
                 "message": "Images fetched successfully",
                 "sos_id": sos_id,
-                "count": images.count(),
-                "images": serializer.data
-            }, status=status.HTTP_200_OK)
-            
+                "count": len(data),
+                "images": data
+            }, derivatives_ready(data)
+        
+        try:
+            # ETag/Last-Modified and cached bodies, as for /api/sos/<id>/
+            response = cached_incident_response(request, 'images', sos_id, build)
         except Exception as e:
             return Response({
                 "status": "error",
                 "message": f"Failed to fetch images: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        if response is None:
+            return Response({
+                "status": "error",
+                "message": "SOS request not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        return response
@@ -8,8 +8,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Single-process mode (SOCKETIO_ASGI=1): serve the Socket.IO events from this
+# process as well, so REST views and socket events share one event bus
+if settings.SOCKETIO_ASGI_ENABLED:
+    from api.consumers.sos_consumer import build_asgi_app
+    application = build_asgi_app(application)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -84,6 +85,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests (and between ORM upstream
+        # calls in the Socket.IO gateway) instead of reconnecting each time
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -142,6 +147,22 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# SOS images go to a content-addressed store (api/storage.py): identical
+# uploads are kept once and shared, counted by ImageBlob rows
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'sos_images': {'BACKEND': 'api.storage.ContentAddressedStorage'},
+}
+
+# Hash uploaded files while the request body is read, so the store does not read them twice
+FILE_UPLOAD_HANDLERS = [
+    'api.storage.HashingMemoryFileUploadHandler',
+    'api.storage.HashingTemporaryFileUploadHandler',
+]
+
+TEST_RUNNER = 'backend.test_runner.TestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -174,3 +195,102 @@ CORS_ALLOW_HEADERS = [
 
 # For development - uncomment if needed for broader testing
 # CORS_ALLOW_ALL_ORIGINS = True
+
+# SOS listing (GET /api/get-all-sos/)
+# Pages are cursor based; nested location history is capped per SOS
+SOS_LIST_PAGE_SIZE = 50
+SOS_LIST_MAX_PAGE_SIZE = 200
+SOS_LOCATION_HISTORY_LIMIT = 50
+SOS_LOCATION_HISTORY_MAX_LIMIT = 500
+
+# Incremental SOS sync (GET /api/sync-sos/)
+# Maximum rows returned per change stream in one response
+SOS_SYNC_BATCH_SIZE = 500
+SOS_SYNC_MAX_BATCH_SIZE = 2000
+# Rows are only synced once they are this many seconds old, so a transaction
+# still committing when a client syncs cannot fall behind its watermark.
+# Must exceed the longest write transaction.
+SOS_SYNC_SETTLE_SECONDS = 2
+
+# Nearby SOS search (GET /api/sos/nearby/), radius in metres
+SOS_NEARBY_DEFAULT_RADIUS_M = 2000
+SOS_NEARBY_MAX_RADIUS_M = 50000
+
+# Batched location ingestion (POST /api/update-location/batch/)
+LOCATION_BATCH_MAX_POINTS = 500
+# Seconds a point's client timestamp may be ahead of the server clock; it is
+# then stored as now, and points further ahead reject the batch
+LOCATION_MAX_CLOCK_SKEW = 120
+
+# Response cache for SOS detail and image listings (api/response_cache.py)
+# ETags are computed from the database on every request; bodies are cached
+# per ETag for SOS_RESPONSE_CACHE_TTL seconds. Point CACHES at Redis or
+# Memcached to share the bodies between processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SOS_RESPONSE_CACHE_TTL = 60
+
+# Active SOS metadata cache (api/sos_cache.py)
+# Location pings and socket lookups read id/room/status/unit from memory.
+# Saves and deletes in this process invalidate entries; other processes see
+# changes after at most SOS_CACHE_TTL seconds
+SOS_CACHE_MAX_ENTRIES = 10000
+SOS_CACHE_TTL = 30
+
+# Outbound events to the Socket.IO server
+# Queued in-process and delivered by a background thread; when the queue is
+# full the oldest events are dropped
+# (off under `manage.py test`, see backend/test_runner.py)
+SOCKETIO_EMIT_ENABLED = True
+SOCKETIO_SERVER_URL = 'http://localhost:8001'
+SOCKETIO_EMIT_QUEUE_SIZE = 1000
+SOCKETIO_EMIT_BATCH_SIZE = 50
+
+# Single-process deployment (backend/asgi.py)
+# When enabled, the ASGI app also serves Socket.IO and API events are handed
+# to it in memory instead of through SOCKETIO_SERVER_URL
+SOCKETIO_ASGI_ENABLED = os.environ.get('SOCKETIO_ASGI', '0') == '1'
+
+# Resumable image uploads (POST /api/sos-image-uploads/)
+# Chunks are streamed into partial files here until the upload is finalized;
+# keep it outside MEDIA_ROOT so half-received images are never served by URL
+SOS_IMAGE_UPLOAD_DIR = os.environ.get('SOS_IMAGE_UPLOAD_DIR') or BASE_DIR / 'partial_uploads'
+SOS_IMAGE_UPLOAD_MAX_SIZE = 25 * 1024 * 1024
+SOS_IMAGE_UPLOAD_CHUNK_SIZE = 256 * 1024
+SOS_IMAGE_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+SOS_IMAGE_UPLOAD_EXPIRY_HOURS = 48
+
+# Image derivatives (api/derivatives.py)
+# Generated by a background job after upload: variant -> (max width, max height, JPEG quality)
+SOS_IMAGE_VARIANTS = {
+    'thumbnail': (256, 256, 70),
+    'preview': (1280, 1280, 80),
+}
+
+# Near-duplicate SOS images (api/image_store.py)
+# New images whose perceptual hash is within this many bits (of 64) of a
+# recent image of the same SOS get near_duplicate_of set; None disables
+SOS_IMAGE_NEAR_DUPLICATE_DISTANCE = None
+SOS_IMAGE_NEAR_DUPLICATE_WINDOW = 50
+
+# Background jobs (api/jobs.py), run by `python manage.py run_jobs`
+# A claimed job is invisible to other workers for its timeout; if the worker
+# dies, it is retried after that. Failures retry after JOB_RETRY_BACKOFF *
+# 2^(attempt - 1) seconds. With JOB_QUEUE_EAGER jobs run inline instead.
+JOB_DEFAULT_TIMEOUT = 300
+JOB_DEFAULT_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 10
+JOB_POLL_INTERVAL = 1.0
+JOB_RETENTION_HOURS = 24
+JOB_QUEUE_EAGER = os.environ.get('JOB_QUEUE_EAGER', '0') == '1'
+
+# SOS archive (api/archive.py), run by `python manage.py archive_sos`
+# Resolved SOS untouched for this many days move to the archive tables, this
+# many per transaction, closing a batch early once it holds this many
+# location updates
+SOS_ARCHIVE_AFTER_DAYS = 30
+SOS_ARCHIVE_BATCH_SIZE = 100
+SOS_ARCHIVE_MAX_POINTS = 50000
@@ -0,0 +1,21 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that keeps API events in the test process: without it every
+    test that creates an SOS or location starts the background emitter,
+    which keeps retrying the Socket.IO server at SOCKETIO_SERVER_URL. Tests
+    of the event flow enable it again with override_settings and an
+    in-process emitter.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._emit_override = override_settings(SOCKETIO_EMIT_ENABLED=False)
+        self._emit_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._emit_override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,11 +1,16 @@
-import socketio
 import eventlet
+# Patch sockets before anything imports them, so a slow API call only
+# blocks its own green thread instead of the whole server
+eventlet.monkey_patch()
+
+import socketio
 import os
 import json
-import requests
 import logging
 from datetime import datetime
 
+from api.consumers.upstream import CircuitBreaker, OrmUpstream, UpstreamClient, UpstreamError
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('sos_socketio')
@@ -17,7 +22,38 @@ sio = socketio.Server(cors_allowed_origins='*')
 app = socketio.WSGIApp(sio)
 
 # Base URL for API calls (adjust this to your actual API base URL)
-API_BASE_URL = 'http://localhost:8000'  # Adjust this to your Django server URL
+API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000')  # Adjust this to your Django server URL
+
+# How create_sos/update_location reach the API:
+#   http - pooled keep-alive requests to API_BASE_URL (default)
+#   orm  - run the API's service functions in this process, no HTTP
+UPSTREAM_MODE = os.environ.get('UPSTREAM_MODE', 'http')
+
+
+def build_upstream():
+    """Upstream client for the configured mode"""
+    if UPSTREAM_MODE == 'orm':
+        import django
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        django.setup()
+        return OrmUpstream(
+            workers=int(os.environ.get('ORM_UPSTREAM_WORKERS', 8)),
+            deadline=float(os.environ.get('UPSTREAM_DEADLINE', 5))
+        )
+    return UpstreamClient(
+        API_BASE_URL,
+        pool_size=int(os.environ.get('UPSTREAM_POOL_SIZE', 100)),
+        max_concurrency=int(os.environ.get('UPSTREAM_MAX_CONCURRENCY', 200)),
+        deadline=float(os.environ.get('UPSTREAM_DEADLINE', 5)),
+        connect_timeout=float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 1)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get('UPSTREAM_FAILURE_THRESHOLD', 5)),
+            reset_timeout=float(os.environ.get('UPSTREAM_RESET_TIMEOUT', 10))
+        )
+    )
+
+
+upstream = build_upstream()
 
 
 @sio.event
@@ -84,38 +120,29 @@ def create_sos(sid, data):
         
         logger.info(f'Creating SOS for client {sid}: {api_data}')
         
-        # Make HTTP POST request to Django API
-        response = requests.post(
-            f'{API_BASE_URL}/api/create-sos/',
-            json=api_data,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
+        # Pooled keep-alive call (or direct ORM call) to the Django API
+        status_code, response_data = upstream.post('/api/create-sos/', api_data)
         
         # Parse response
-        if response.status_code == 200 or response.status_code == 201:
-            response_data = response.json()
+        if status_code == 200 or status_code == 201:
             sio.emit('create_sos_response', {
                 'success': True,
                 'data': response_data
             }, to=sid)
             logger.info(f'SOS created successfully for client {sid}: {response_data}')
         else:
-            error_message = f'API request failed with status {response.status_code}'
-            try:
-                error_data = response.json()
-                error_message = error_data.get('error', error_message)
-            except:
-                pass
+            error_message = f'API request failed with status {status_code}'
+            if isinstance(response_data, dict):
+                error_message = response_data.get('error', error_message)
             
             sio.emit('create_sos_response', {
                 'success': False,
                 'error': error_message,
-                'status_code': response.status_code
+                'status_code': status_code
             }, to=sid)
             logger.error(f'Failed to create SOS for client {sid}: {error_message}')
             
-    except requests.exceptions.RequestException as e:
+    except UpstreamError as e:
         sio.emit('create_sos_response', {
             'success': False,
             'error': f'Network error: {str(e)}'
@@ -179,38 +206,29 @@ def update_location(sid, data):
         
         logger.info(f'Updating location for client {sid}: {api_data}')
         
-        # Make HTTP POST request to Django API
-        response = requests.post(
-            f'{API_BASE_URL}/api/update-location/',
-            json=api_data,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
+        # Pooled keep-alive call (or direct ORM call) to the Django API
+        status_code, response_data = upstream.post('/api/update-location/', api_data)
         
         # Parse response
-        if response.status_code == 200 or response.status_code == 201:
-            response_data = response.json()
+        if status_code == 200 or status_code == 201:
             sio.emit('update_location_response', {
                 'success': True,
                 'data': response_data
             }, to=sid)
             logger.info(f'Location updated successfully for client {sid}: {response_data}')
         else:
-            error_message = f'API request failed with status {response.status_code}'
-            try:
-                error_data = response.json()
-                error_message = error_data.get('error', error_message)
-            except:
-                pass
+            error_message = f'API request failed with status {status_code}'
+            if isinstance(response_data, dict):
+                error_message = response_data.get('error', error_message)
             
             sio.emit('update_location_response', {
                 'success': False,
                 'error': error_message,
-                'status_code': response.status_code
+                'status_code': status_code
             }, to=sid)
             logger.error(f'Failed to update location for client {sid}: {error_message}')
             
-    except requests.exceptions.RequestException as e:
+    except UpstreamError as e:
         sio.emit('update_location_response', {
             'success': False,
             'error': f'Network error: {str(e)}'
@@ -225,6 +243,14 @@ def update_location(sid, data):
         logger.error(f'Unexpected error updating location for client {sid}: {str(e)}')
 
 
+@sio.event
+def upstream_stats(sid, data=None):
+    """Report upstream call counters and circuit state"""
+    stats = upstream.stats()
+    sio.emit('upstream_stats', stats, to=sid)
+    return stats
+
+
 if __name__ == '__main__':
     # Start the server
     port = int(os.environ.get('SOS_SOCKETIO_PORT', 8002))  # Different port from main socketio server
@@ -0,0 +1,368 @@
+"""
+Runs violence detection over many camera streams on one box.
+
+Each camera has a reader thread that keeps its stream drained and samples
+frames at the camera's own rate into clip windows. Windows are classified by
+a fixed pool of inference workers. A live camera holds at most one window
+waiting for a worker: a newer window replaces it, and a window that waited
+longer than ``max_window_age`` is dropped, so slow inference sheds stale
+frames instead of building a backlog. Video files are read no faster than
+they are classified. Each worker batches the windows of several
+cameras into one forward pass. An IncidentTracker per camera turns
+detections into one SOS per ongoing incident, which then receives frame
+updates rather than duplicate SOS rows.
+
+    python camera_scheduler.py cameras.json --workers 4 --api-url http://localhost:8000
+
+where cameras.json lists ``{"id", "source", "latitude", "longitude", "fps"}``
+objects; ``source`` is an RTSP/HTTP URL or a video file.
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+OPEN = 'open'
+UPDATE = 'update'
+CLOSE = 'close'
+
+
+@dataclass
+class CameraSource:
+    camera_id: str
+    source: str
+    latitude: float
+    longitude: float
+    # Frames sampled per second of video
+    fps: float = 2.0
+
+    @property
+    def live(self):
+        return '://' in self.source
+
+
+class IncidentTracker:
+    """
+    Hysteresis for one camera. ``open_after`` consecutive violent windows
+    open an incident (one SOS). While it is open, violent windows send
+    updates at most every ``update_interval`` seconds. It closes once no
+    violence has been seen for ``cooldown`` seconds, after which new
+    violence opens a new SOS.
+    """
+
+    def __init__(self, open_after=2, cooldown=60.0, update_interval=10.0):
+        self.open_after = open_after
+        self.cooldown = cooldown
+        self.update_interval = update_interval
+        self.sos_id = None
+        self.streak = 0
+        self.last_violent_at = None
+        self.last_update_at = None
+
+    def observe(self, violent, now):
+        """Returns OPEN, UPDATE, CLOSE or None for the next window's result"""
+        if violent:
+            self.streak += 1
+            self.last_violent_at = now
+            if self.sos_id is None:
+                return OPEN if self.streak >= self.open_after else None
+            if now - self.last_update_at >= self.update_interval:
+                return UPDATE
+            return None
+        self.streak = 0
+        if self.sos_id is not None and now - self.last_violent_at >= self.cooldown:
+            self.sos_id = None
+            return CLOSE
+        return None
+
+    def opened(self, sos_id, now):
+        self.sos_id = sos_id
+        self.last_update_at = now
+
+    def updated(self, now):
+        self.last_update_at = now
+
+
+class Camera:
+    def __init__(self, source, tracker):
+        self.source = source
+        self.tracker = tracker
+        # (frames, captured_at) waiting for a worker; at most one
+        self.pending = None
+        self.busy = False
+        self.reading = False
+        self.windows = 0
+        self.dropped = 0
+
+
+class CameraScheduler:
+    """
+    ``detector`` needs detect_batch(clips) returning one object with a
+    ``violent`` attribute per clip (violence_service.ViolenceDetector). A
+    worker classifies windows of up to ``batch_windows`` cameras together.
+    ``client`` needs create_sos() and upload_frames()
+    (violence_service.SOSClient).
+    """
+
+    def __init__(self, detector, client, workers=4, clip_frames=15, max_window_age=5.0, batch_windows=4,
+                 upload_frames=3, reconnect_delay=5.0, tracker_factory=IncidentTracker,
+                 capture_factory=cv2.VideoCapture, clock=time.monotonic):
+        self.detector = detector
+        self.client = client
+        self.workers = workers
+        self.clip_frames = clip_frames
+        self.max_window_age = max_window_age
+        self.batch_windows = batch_windows
+        self.upload_frames = upload_frames
+        self.reconnect_delay = reconnect_delay
+        self.tracker_factory = tracker_factory
+        self.capture_factory = capture_factory
+        self.clock = clock
+        self.cameras = {}
+        self._ready = collections.deque()
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._workers = []
+        self._readers = []
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def add_camera(self, source):
+        camera = Camera(source, self.tracker_factory())
+        self.cameras[source.camera_id] = camera
+        if self._workers:
+            self._start_reader(camera)
+        return camera
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'inference-{index}', daemon=True)
+            thread.start()
+            self._workers.append(thread)
+        for camera in self.cameras.values():
+            self._start_reader(camera)
+
+    def stop(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._workers:
+            thread.join()
+        # A reader can be stuck in a blocking read of a dead stream
+        for thread in self._readers:
+            thread.join(timeout=self.reconnect_delay)
+
+    def wait_idle(self, timeout=None):
+        """Block until every file source is read and every window handled"""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            while any(camera.reading or camera.busy or camera.pending for camera in self.cameras.values()):
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining if remaining is not None else 1.0)
+        return True
+
+    def _start_reader(self, camera):
+        camera.reading = True
+        thread = threading.Thread(target=self._read, args=(camera,), name=f'camera-{camera.source.camera_id}', daemon=True)
+        thread.start()
+        self._readers.append(thread)
+
+    def _read(self, camera):
+        source = camera.source
+        interval = 1.0 / source.fps
+        try:
+            while not self._stop.is_set():
+                capture = self.capture_factory(source.source)
+                if capture.isOpened():
+                    self._sample(camera, capture, interval)
+                else:
+                    logger.warning(f'Could not open camera {source.camera_id}')
+                capture.release()
+                if not source.live:
+                    break
+                self._stop.wait(self.reconnect_delay)
+        finally:
+            with self._condition:
+                camera.reading = False
+                self._condition.notify_all()
+
+    def _sample(self, camera, capture, interval):
+        window = []
+        next_due = None
+        # grab() every frame so live streams never fall behind; only the
+        # sampled ones are converted
+        while not self._stop.is_set() and capture.grab():
+            if camera.source.live:
+                timestamp = self.clock()
+            else:
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if next_due is not None and timestamp < next_due - 1e-6:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            # Keep the average rate even when frame times do not divide the
+            # interval, without bursting after a stall
+            if next_due is None or timestamp - next_due >= interval:
+                next_due = timestamp
+            next_due += interval
+            window.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            self.count('frames_sampled')
+            if len(window) == self.clip_frames:
+                self.submit(camera, window)
+                window = []
+
+    def submit(self, camera, frames):
+        """
+        Hand a window to the workers. A live camera's window replaces any it
+        still has waiting; a video file is not going anywhere, so its
+        reader waits instead.
+        """
+        with self._condition:
+            if not camera.source.live:
+                while camera.pending is not None and not self._stop.is_set():
+                    self._condition.wait()
+            camera.windows += 1
+            if camera.pending is not None:
+                camera.dropped += 1
+                self.count('windows_dropped')
+            elif not camera.busy:
+                self._ready.append(camera)
+            camera.pending = (frames, self.clock())
+            self._condition.notify_all()
+
+    def _next_windows(self):
+        """Up to ``batch_windows`` fresh windows of different cameras, or None when stopping"""
+        with self._condition:
+            while not self._ready and not self._stop.is_set():
+                self._condition.wait()
+            if self._stop.is_set():
+                return None
+            windows = []
+            now = self.clock()
+            # Readers of video files may be waiting for their slot to free up
+            self._condition.notify_all()
+            while self._ready and len(windows) < self.batch_windows:
+                camera = self._ready.popleft()
+                frames, captured_at = camera.pending
+                camera.pending = None
+                if camera.source.live and now - captured_at > self.max_window_age:
+                    camera.dropped += 1
+                    self.count('windows_dropped')
+                    continue
+                camera.busy = True
+                windows.append((camera, frames))
+            return windows
+
+    def _work(self):
+        while True:
+            windows = self._next_windows()
+            if windows is None:
+                return
+            try:
+                # One forward pass per model for all cameras in the batch
+                detections = self.detector.detect_batch([frames for _, frames in windows]) if windows else []
+                for (camera, frames), detection in zip(windows, detections):
+                    self.count('windows_processed')
+                    try:
+                        self._report(camera, frames, detection.violent)
+                    except Exception:
+                        logger.exception(f'Failed to report camera {camera.source.camera_id}')
+            except Exception:
+                logger.exception('Failed to classify a batch of windows')
+            finally:
+                with self._condition:
+                    for camera, _ in windows:
+                        camera.busy = False
+                        # A window that arrived meanwhile waited for this one
+                        if camera.pending is not None:
+                            self._ready.append(camera)
+                    self._condition.notify_all()
+
+    def _report(self, camera, frames, violent):
+        # Only this worker handles the camera right now, so the tracker
+        # needs no lock of its own
+        source, tracker = camera.source, camera.tracker
+        now = self.clock()
+        action = tracker.observe(violent, now)
+        evidence = frames[:: max(1, len(frames) // self.upload_frames)][:self.upload_frames]
+        if action == OPEN:
+            sos_id = self.client.create_sos(source.camera_id, source.latitude, source.longitude)
+            tracker.opened(sos_id, now)
+            self.client.upload_frames(sos_id, evidence)
+            self.count('incidents_opened')
+            logger.info(f'Camera {source.camera_id}: violence, raised SOS {sos_id}')
+        elif action == UPDATE:
+            self.client.upload_frames(tracker.sos_id, evidence)
+            tracker.updated(now)
+            self.count('incident_updates')
+        elif action == CLOSE:
+            self.count('incidents_closed')
+            logger.info(f'Camera {source.camera_id}: quiet for {tracker.cooldown}s, incident closed')
+
+
+def main():
+    from violence_service import BACKENDS, GENDER_MODEL, VIOLENCE_MODEL, SOSClient, get_detector
+
+    parser = argparse.ArgumentParser(description='Watch many cameras for violence and raise one SOS per incident')
+    parser.add_argument('cameras', help='JSON file listing cameras')
+    parser.add_argument('--api-url', default='http://localhost:8000')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help='Inference workers')
+    parser.add_argument('--clip-frames', type=int, default=15, help='Frames per classified window')
+    parser.add_argument('--max-window-age', type=float, default=5.0, help='Drop windows that waited longer (seconds)')
+    parser.add_argument('--batch-windows', type=int, default=4, help='Camera windows classified in one pass')
+    parser.add_argument('--open-after', type=int, default=2, help='Violent windows in a row before raising an SOS')
+    parser.add_argument('--cooldown', type=float, default=60.0, help='Quiet seconds before an incident closes')
+    parser.add_argument('--update-interval', type=float, default=10.0, help='Seconds between frame updates to an open SOS')
+    parser.add_argument('--violence-model', default=VIOLENCE_MODEL)
+    parser.add_argument('--gender-model', default=GENDER_MODEL)
+    parser.add_argument('--offline', action='store_true')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help='onnx/onnx-fp32 take exported directories as models')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    with open(args.cameras) as handle:
+        cameras = [
+            CameraSource(str(item['id']), item['source'], item['latitude'], item['longitude'], item.get('fps', 2.0))
+            for item in json.load(handle)
+        ]
+    scheduler = CameraScheduler(
+        # Workers run batches in parallel; split the cores between them
+        get_detector(args.violence_model, args.gender_model, args.offline, args.backend,
+                     threads=max(1, (os.cpu_count() or 1) // args.workers)),
+        SOSClient(args.api_url),
+        workers=args.workers,
+        clip_frames=args.clip_frames,
+        max_window_age=args.max_window_age,
+        batch_windows=args.batch_windows,
+        tracker_factory=lambda: IncidentTracker(args.open_after, args.cooldown, args.update_interval),
+    )
+    for camera in cameras:
+        scheduler.add_camera(camera)
+    scheduler.start()
+    try:
+        while not scheduler.wait_idle(timeout=60):
+            logger.info(f'{len(cameras)} cameras: {dict(scheduler.stats)}')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        logger.info(f'Stopped: {dict(scheduler.stats)}')
+
+
+if __name__ == '__main__':
+    main()
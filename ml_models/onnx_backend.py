@@ -0,0 +1,163 @@
+"""
+ONNX Runtime backend for the classifiers in violence_service.py, for camera
+boxes without a GPU.
+
+    python onnx_backend.py export locih/violence_classification exported/violence
+    python onnx_backend.py compare locih/violence_classification exported/violence --video clip.mp4
+
+``export`` writes the fp32 graph (its weights may go to model.onnx.data
+beside it), a dynamically int8-quantized copy (weights stored as int8,
+activations quantized on the fly) and the preprocessing and label config
+next to them. ``compare`` checks that ONNX predictions agree with
+eager PyTorch on the same frames, and reports per-frame latency for each.
+Use the exported directory with ``--backend onnx`` in violence_service.py or
+camera_scheduler.py.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+import onnxruntime
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification
+
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model.int8.onnx'
+
+
+def export(name_or_path, output_dir, opset=18, local_files_only=False):
+    """Export a Hugging Face image classifier to ONNX and quantize it"""
+    os.makedirs(output_dir, exist_ok=True)
+    model = AutoModelForImageClassification.from_pretrained(name_or_path, local_files_only=local_files_only).eval()
+    processor = AutoImageProcessor.from_pretrained(name_or_path, local_files_only=local_files_only)
+    # Traced at batch 2 so the batch axis cannot be specialised to 1
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    sample = processor(images=[blank, blank], return_tensors='pt')['pixel_values']
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.inference_mode():
+        torch.onnx.export(
+            model, (sample,), fp32_path,
+            input_names=['pixel_values'], output_names=['logits'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=opset,
+        )
+    quantize(fp32_path, os.path.join(output_dir, INT8_FILE))
+    model.config.save_pretrained(output_dir)
+    processor.save_pretrained(output_dir)
+    return output_dir
+
+
+def quantize(fp32_path, int8_path):
+    """Dynamic int8 quantization of the MatMul/Gemm weights, which dominate ViT inference"""
+    prepared = int8_path + '.prep'
+    try:
+        quant_pre_process(fp32_path, prepared)
+        quantize_dynamic(prepared, int8_path, weight_type=QuantType.QInt8)
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+    return int8_path
+
+
+class OnnxClassifier:
+    """
+    Drop-in replacement for violence_service.Classifier running an exported
+    directory under ONNX Runtime on the CPU. ``intra_op_threads`` bounds the
+    threads one batch uses; with several inference workers, give each about
+    cores / workers.
+    """
+
+    def __init__(self, model_dir, quantized=True, intra_op_threads=None, inter_op_threads=1):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.processor = AutoImageProcessor.from_pretrained(model_dir)
+        self.labels = AutoConfig.from_pretrained(model_dir).id2label
+
+    def logits(self, frames):
+        pixel_values = self.processor(images=frames, return_tensors='np')['pixel_values'].astype(np.float32)
+        return self.session.run(['logits'], {'pixel_values': pixel_values})[0]
+
+    def predict(self, frames):
+        if not frames:
+            return []
+        return [self.labels[index] for index in self.logits(frames).argmax(-1).tolist()]
+
+
+def _numpy(logits):
+    return logits.numpy() if isinstance(logits, torch.Tensor) else np.asarray(logits)
+
+
+def parity(reference, candidate, frames):
+    """How closely ``candidate`` reproduces ``reference`` on the same frames"""
+    expected = _numpy(reference.logits(frames))
+    actual = _numpy(candidate.logits(frames))
+    return {
+        'agreement': float(np.mean(expected.argmax(-1) == actual.argmax(-1))),
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+    }
+
+
+def benchmark(classifier, frames, repeats=5, warmup=1):
+    """Median milliseconds per frame for batches of ``frames``"""
+    for _ in range(warmup):
+        classifier.logits(frames)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        classifier.logits(frames)
+        timings.append((time.perf_counter() - started) * 1000 / len(frames))
+    return statistics.median(timings)
+
+
+def main():
+    from violence_service import Classifier, read_frames
+
+    parser = argparse.ArgumentParser(description='Export and check ONNX versions of the classifiers')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='Write model.onnx and model.int8.onnx')
+    export_parser.add_argument('model', help='Model id or local directory')
+    export_parser.add_argument('output_dir')
+    export_parser.add_argument('--offline', action='store_true')
+    compare_parser = commands.add_parser('compare', help='Parity and latency against eager PyTorch')
+    compare_parser.add_argument('model', help='Model id or local directory the export was made from')
+    compare_parser.add_argument('output_dir')
+    compare_parser.add_argument('--video', help='Sample frames from this clip instead of random noise')
+    compare_parser.add_argument('--frames', type=int, default=15)
+    compare_parser.add_argument('--threads', type=int, default=1, help='Threads per backend, as for one inference worker')
+    compare_parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export(args.model, args.output_dir, local_files_only=args.offline)
+        print(f'Exported to {args.output_dir}')
+        return
+
+    if args.video:
+        frames = read_frames(args.video, args.frames)
+    else:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (360, 640, 3), dtype=np.uint8) for _ in range(args.frames)]
+    torch.set_num_threads(args.threads)
+    eager = Classifier.from_pretrained(args.model, local_files_only=args.offline)
+    baseline = benchmark(eager, frames)
+    print(f'{"backend":<10} {"ms/frame":>9} {"speedup":>8} {"agreement":>10} {"max |dlogit|":>13}')
+    print(f'{"torch":<10} {baseline:>9.2f} {1:>7.2f}x {"-":>10} {"-":>13}')
+    for name, quantized in (('onnx', False), ('onnx-int8', True)):
+        candidate = OnnxClassifier(args.output_dir, quantized=quantized, intra_op_threads=args.threads)
+        latency = benchmark(candidate, frames)
+        check = parity(eager, candidate, frames)
+        print(f'{name:<10} {latency:>9.2f} {baseline / latency:>7.2f}x {check["agreement"]:>10.0%} {check["max_abs_diff"]:>13.4f}')
+
+
+if __name__ == '__main__':
+    main()
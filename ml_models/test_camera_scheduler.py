@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+if cv2 is not None:
+    from camera_scheduler import CLOSE, OPEN, UPDATE, CameraScheduler, CameraSource, IncidentTracker
+
+
+class BrightnessDetector:
+    """Bright frames count as violent; remembers how clips were batched"""
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def detect_batch(self, clips):
+        with self.lock:
+            self.batches.append(len(clips))
+        return [SimpleNamespace(violent=float(np.mean(clip)) > 100) for clip in clips]
+
+
+class RecordingClient:
+    def __init__(self):
+        self.created = []
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def create_sos(self, name, latitude, longitude):
+        with self.lock:
+            self.created.append(name)
+            return len(self.created)
+
+    def upload_frames(self, sos_id, frames):
+        with self.lock:
+            self.uploads.append((sos_id, len(frames)))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@unittest.skipIf(cv2 is None, 'needs opencv and numpy (ml_models/requirements.txt)')
+class IncidentTrackerTestCase(unittest.TestCase):
+    def test_ongoing_violence_is_one_incident(self):
+        tracker = IncidentTracker(open_after=2, cooldown=30, update_interval=10)
+        # A single violent window is not enough
+        self.assertIsNone(tracker.observe(True, 0))
+        self.assertIsNone(tracker.observe(False, 1))
+        self.assertIsNone(tracker.observe(True, 2))
+        self.assertEqual(tracker.observe(True, 3), OPEN)
+        tracker.opened(7, 3)
+
+        actions = [tracker.observe(violent, now) for violent, now in [(True, 5), (False, 8), (True, 14)]]
+        self.assertEqual(actions, [None, None, UPDATE])
+        tracker.updated(14)
+        self.assertIsNone(tracker.observe(True, 15))
+        self.assertEqual(tracker.sos_id, 7)
+
+        # Quiet windows close it only after the cooldown
+        self.assertIsNone(tracker.observe(False, 40))
+        self.assertEqual(tracker.observe(False, 46), CLOSE)
+        self.assertIsNone(tracker.sos_id)
+        self.assertIsNone(tracker.observe(True, 50))
+        self.assertEqual(tracker.observe(True, 51), OPEN)
+
+
+@unittest.skipIf(cv2 is None, 'needs opencv and numpy (ml_models/requirements.txt)')
+class CameraSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_video(self, name, level, frame_count=50):
+        path = f'{self.directory}/{name}.avi'
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (32, 24))
+        for _ in range(frame_count):
+            writer.write(np.full((24, 32, 3), level, dtype=np.uint8))
+        writer.release()
+        return path
+
+    def camera(self, name, level=20):
+        return CameraSource(name, self.write_video(name, level), 22.55, 88.35, fps=10)
+
+    def test_violent_camera_raises_one_sos_with_updates(self):
+        detector, client = BrightnessDetector(), RecordingClient()
+        scheduler = CameraScheduler(
+            detector, client, workers=2, clip_frames=4, max_window_age=60,
+            tracker_factory=lambda: IncidentTracker(open_after=2, cooldown=600, update_interval=0),
+        )
+        for camera in (self.camera('gate'), self.camera('alley', level=220), self.camera('platform')):
+            scheduler.add_camera(camera)
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        self.assertTrue(scheduler.wait_idle(timeout=30))
+
+        # 2s of video sampled at 10fps: 20 frames, 5 windows per camera
+        self.assertEqual(scheduler.stats['frames_sampled'], 60)
+        # Files are never dropped
+        self.assertEqual(scheduler.stats['windows_processed'], 15)
+        self.assertEqual(client.created, ['alley'])
+        self.assertEqual(scheduler.stats['incidents_opened'], 1)
+        self.assertTrue(all(sos_id == 1 for sos_id, _ in client.uploads))
+        # Windows 3, 4 and 5 of the alley update the open SOS
+        self.assertEqual(len(client.uploads), 4)
+
+    def test_stale_and_superseded_windows_are_dropped(self):
+        clock = FakeClock()
+        scheduler = CameraScheduler(BrightnessDetector(), RecordingClient(), max_window_age=2, batch_windows=2, clock=clock)
+        cameras = [scheduler.add_camera(CameraSource(name, f'rtsp://cameras/{name}', 0, 0)) for name in 'abc']
+        frame = np.zeros((2, 2, 3), dtype=np.uint8)
+
+        scheduler.submit(cameras[0], [frame])
+        scheduler.submit(cameras[0], [frame])
+        self.assertEqual((cameras[0].windows, cameras[0].dropped), (2, 1))
+
+        scheduler.submit(cameras[1], [frame])
+        clock.now += 3
+        scheduler.submit(cameras[2], [frame])
+        # a and b waited too long; c is batched alone
+        windows = scheduler._next_windows()
+        self.assertEqual([camera.source.camera_id for camera, _ in windows], ['c'])
+        self.assertEqual(scheduler.stats['windows_dropped'], 3)
+
+    def test_windows_of_several_cameras_share_a_batch(self):
+        scheduler = CameraScheduler(BrightnessDetector(), RecordingClient(), batch_windows=2)
+        cameras = [scheduler.add_camera(CameraSource(name, f'rtsp://cameras/{name}', 0, 0)) for name in 'abc']
+        frame = np.zeros((2, 2, 3), dtype=np.uint8)
+        for camera in cameras:
+            scheduler.submit(camera, [frame])
+
+        first = scheduler._next_windows()
+        self.assertEqual([camera.source.camera_id for camera, _ in first], ['a', 'b'])
+        self.assertTrue(all(camera.busy for camera, _ in first))
+        # While a is being classified, its next window waits instead of joining another batch
+        scheduler.submit(cameras[0], [frame])
+        second = scheduler._next_windows()
+        self.assertEqual([camera.source.camera_id for camera, _ in second], ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    import onnxruntime  # noqa: F401
+    import torch  # noqa: F401
+except ImportError:
+    onnxruntime = None
+
+if onnxruntime is not None:
+    from onnx_backend import INT8_FILE, OnnxClassifier, benchmark, export, parity
+    from test_violence_service import save_tiny_vit
+    from violence_service import Classifier, load_classifier
+
+
+@unittest.skipIf(onnxruntime is None, 'needs onnxruntime, torch and transformers (ml_models/requirements.txt)')
+class OnnxBackendTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.model_dir = os.path.join(cls.directory, 'tiny')
+        cls.export_dir = os.path.join(cls.directory, 'exported')
+        save_tiny_vit(cls.model_dir, ['safe', 'violent'])
+        export(cls.model_dir, cls.export_dir, local_files_only=True)
+        rng = np.random.default_rng(0)
+        cls.frames = [rng.integers(0, 256, (48, 64, 3), dtype=np.uint8) for _ in range(7)]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_fp32_export_matches_eager(self):
+        eager = Classifier.from_pretrained(self.model_dir, local_files_only=True)
+        exported = OnnxClassifier(self.export_dir, quantized=False, intra_op_threads=1)
+        check = parity(eager, exported, self.frames)
+        self.assertEqual(check['agreement'], 1.0)
+        self.assertLess(check['max_abs_diff'], 1e-4)
+        # The batch axis is dynamic
+        self.assertEqual(exported.logits(self.frames[:1]).shape, (1, 2))
+        self.assertEqual(exported.predict(self.frames), eager.predict(self.frames))
+
+    def test_int8_model_is_smaller_and_close(self):
+        eager = Classifier.from_pretrained(self.model_dir, local_files_only=True)
+        quantized = OnnxClassifier(self.export_dir, quantized=True, intra_op_threads=1)
+        fp32_size = sum(
+            os.path.getsize(os.path.join(self.export_dir, name))
+            for name in os.listdir(self.export_dir) if name.startswith('model.onnx')
+        )
+        self.assertLess(os.path.getsize(os.path.join(self.export_dir, INT8_FILE)), fp32_size)
+        self.assertLess(parity(eager, quantized, self.frames)['max_abs_diff'], 0.05)
+        self.assertGreater(benchmark(quantized, self.frames, repeats=2), 0)
+
+    def test_detector_loads_onnx_backend(self):
+        classifier = load_classifier(self.export_dir, backend='onnx', threads=1)
+        self.assertIsInstance(classifier, OnnxClassifier)
+        self.assertEqual(set(classifier.predict(self.frames)) - {'safe', 'violent'}, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
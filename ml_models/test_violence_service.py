@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import cv2
+    import numpy as np
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+except ImportError:
+    cv2 = None
+
+if cv2 is not None:
+    import violence_service
+    from violence_service import Classifier, ViolenceDetector, read_frames, sample_frame_ids
+
+
+def save_tiny_vit(directory, labels):
+    """A randomly initialised ViT small enough to load in milliseconds"""
+    config = ViTConfig(
+        image_size=32, patch_size=8, num_channels=3, hidden_size=32, num_hidden_layers=1,
+        num_attention_heads=2, intermediate_size=64, num_labels=len(labels),
+        id2label=dict(enumerate(labels)), label2id={label: index for index, label in enumerate(labels)},
+    )
+    torch.manual_seed(0)
+    ViTForImageClassification(config).save_pretrained(directory)
+    ViTImageProcessor(size={'height': 32, 'width': 32}).save_pretrained(directory)
+
+
+class StubClassifier:
+    def __init__(self, labels):
+        self.labels = labels
+        self.calls = []
+
+    def predict(self, frames):
+        self.calls.append(len(frames))
+        return self.labels[:len(frames)]
+
+
+@unittest.skipIf(cv2 is None, 'needs opencv, torch and transformers (ml_models/requirements.txt)')
+class ViolenceServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_video(self, frame_count=40):
+        # Frame i is filled with grey level 6*i, so decoded frames identify their position
+        path = f'{self.directory}/clip.avi'
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+        for index in range(frame_count):
+            writer.write(np.full((48, 64, 3), 6 * index, dtype=np.uint8))
+        writer.release()
+        return path
+
+    def test_sampled_positions_match_the_notebook(self):
+        self.assertEqual(sample_frame_ids(120, 4), [0, 30, 60, 90])
+        self.assertEqual(sample_frame_ids(3, 15), [0, 1, 2])
+
+    def test_frames_are_read_at_sampled_positions(self):
+        path = self.write_video()
+        for gap in (1, 1000):
+            # Seeking everywhere, then decoding straight through
+            with mock.patch.object(violence_service, 'SEEK_MIN_GAP', gap):
+                frames = read_frames(path, num_frames=4)
+            self.assertEqual([round(frame.mean() / 6) for frame in frames], [0, 10, 20, 30])
+            self.assertEqual(frames[0].shape, (48, 64, 3))
+
+    def test_batched_pass_matches_per_frame_passes(self):
+        save_tiny_vit(self.directory, ['safe', 'violent'])
+        classifier = Classifier.from_pretrained(self.directory, local_files_only=True)
+        frames = [np.random.RandomState(seed).randint(0, 256, (48, 64, 3), dtype=np.uint8) for seed in range(6)]
+
+        batched = classifier.logits(frames)
+        single = torch.cat([classifier.logits([frame]) for frame in frames])
+        self.assertEqual(batched.shape, (6, 2))
+        self.assertTrue(torch.allclose(batched, single, atol=1e-5))
+        self.assertEqual(classifier.predict(frames), [classifier.labels[i] for i in single.argmax(-1).tolist()])
+
+    def test_violence_is_checked_only_for_the_target_gender(self):
+        frames = [np.zeros((8, 8, 3), dtype=np.uint8)] * 3
+        violence = StubClassifier(['violent', 'safe', 'violent'])
+
+        detection = ViolenceDetector(violence, StubClassifier(['male', 'male', 'female'])).detect_frames(frames)
+        self.assertEqual((detection.gender, detection.violent, violence.calls), ('male', False, []))
+
+        detection = ViolenceDetector(violence, StubClassifier(['female', 'female', 'male'])).detect_frames(frames)
+        self.assertEqual((detection.gender, detection.violent), ('female', True))
+        # All frames in one call
+        self.assertEqual(violence.calls, [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
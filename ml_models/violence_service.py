@@ -0,0 +1,256 @@
+"""
+Violence detection on CCTV clips, the service form of violence_final.ipynb.
+
+Sampled frames are decoded straight into memory, seeking to each sampled
+position instead of decoding the whole clip and round-tripping through JPEG
+files. Models are loaded once per process, and each classifier sees all
+sampled frames of a clip in one batched forward pass.
+
+    python violence_service.py clip.mp4 --api-url http://localhost:8000
+
+Both classifiers take a Hugging Face model id or a local directory written
+by save_pretrained(), so tests can swap in a tiny randomly initialised model.
+With ``--backend onnx`` they take directories exported by onnx_backend.py.
+"""
+import argparse
+import collections
+import threading
+from dataclasses import dataclass, field
+
+import cv2
+import requests
+import torch
+from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+VIOLENCE_MODEL = 'locih/violence_classification'
+GENDER_MODEL = 'rizvandwiki/gender-classification-2'
+
+# Below this many frames between samples, decoding through is cheaper than a
+# seek, which restarts decoding at the previous keyframe
+SEEK_MIN_GAP = 48
+
+
+def sample_frame_ids(total_frames, num_frames):
+    """Evenly spaced frame positions, as the notebook picked them"""
+    if total_frames <= num_frames:
+        return list(range(total_frames))
+    interval = total_frames // num_frames
+    return [i * interval for i in range(num_frames)]
+
+
+def read_frames(source, num_frames=15):
+    """
+    Decode ``num_frames`` evenly spaced frames of a video file or stream URL
+    as RGB arrays. Frames between samples are skipped with grab(), which
+    does not convert them, or by seeking when the gap is long.
+    """
+    capture = cv2.VideoCapture(source)
+    try:
+        total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total_frames <= 0:
+            raise ValueError(f'No frames found in {source}. Check if the path is correct.')
+        frames = []
+        position = 0
+        for frame_id in sample_frame_ids(total_frames, num_frames):
+            if frame_id - position >= SEEK_MIN_GAP:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+            else:
+                while position < frame_id and capture.grab():
+                    position += 1
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            position = frame_id + 1
+        return frames
+    finally:
+        capture.release()
+
+
+def encode_jpeg(frame, quality=90):
+    """RGB array to JPEG bytes, for uploading evidence without temp files"""
+    ok, buffer = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError('Could not encode frame')
+    return buffer.tobytes()
+
+
+def majority(labels):
+    """Most common label; ties go to the one seen first"""
+    return collections.Counter(labels).most_common(1)[0][0] if labels else None
+
+
+class Classifier:
+    """An image classification model and its preprocessing, run in batches"""
+
+    def __init__(self, model, processor):
+        self.model = model.eval()
+        self.processor = processor
+        self.labels = model.config.id2label
+
+    @classmethod
+    def from_pretrained(cls, name_or_path, local_files_only=False):
+        return cls(
+            AutoModelForImageClassification.from_pretrained(name_or_path, local_files_only=local_files_only),
+            AutoImageProcessor.from_pretrained(name_or_path, local_files_only=local_files_only),
+        )
+
+    def logits(self, frames):
+        """One forward pass over all frames; returns a (frames, labels) tensor"""
+        inputs = self.processor(images=frames, return_tensors='pt')
+        with torch.inference_mode():
+            return self.model(**inputs).logits
+
+    def predict(self, frames):
+        if not frames:
+            return []
+        return [self.labels[index] for index in self.logits(frames).argmax(-1).tolist()]
+
+
+@dataclass
+class Detection:
+    gender: str
+    violent: bool
+    gender_labels: list
+    violence_labels: list = field(default_factory=list)
+    frames: list = field(default_factory=list, repr=False)
+
+
+class ViolenceDetector:
+    """
+    The notebook's pipeline: classify who is in the frames, and only for
+    ``target_gender`` check them for violence. A clip is violent when most
+    frames get a label other than ``safe_label``.
+    """
+
+    def __init__(self, violence, gender, num_frames=15, target_gender='female', safe_label='safe'):
+        self.violence = violence
+        self.gender = gender
+        self.num_frames = num_frames
+        self.target_gender = target_gender
+        self.safe_label = safe_label
+
+    def detect_batch(self, clips):
+        """
+        Detections for several clips, e.g. from different cameras. Each
+        classifier runs once over the frames of all clips that need it.
+        """
+        frames = [frame for clip in clips for frame in clip]
+        gender_labels = self.gender.predict(frames)
+        detections = []
+        offset = 0
+        for clip in clips:
+            labels = gender_labels[offset:offset + len(clip)]
+            offset += len(clip)
+            detections.append(Detection(gender=majority(labels), violent=False, gender_labels=labels, frames=clip))
+
+        suspects = [detection for detection in detections if detection.gender == self.target_gender]
+        if not suspects:
+            return detections
+        violence_labels = self.violence.predict([frame for detection in suspects for frame in detection.frames])
+        offset = 0
+        for detection in suspects:
+            detection.violence_labels = violence_labels[offset:offset + len(detection.frames)]
+            offset += len(detection.frames)
+            detection.violent = majority(detection.violence_labels) != self.safe_label
+        return detections
+
+    def detect_frames(self, frames):
+        return self.detect_batch([frames])[0]
+
+    def detect(self, source):
+        return self.detect_frames(read_frames(source, self.num_frames))
+
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+BACKENDS = ('torch', 'onnx', 'onnx-fp32')
+
+
+def load_classifier(name_or_path, backend='torch', threads=None, local_files_only=False):
+    """
+    A classifier on the chosen backend. The ONNX backends take a directory
+    written by ``onnx_backend.py export``; ``threads`` caps the CPU threads
+    one forward pass uses.
+    """
+    if backend in ('onnx', 'onnx-fp32'):
+        from onnx_backend import OnnxClassifier
+        return OnnxClassifier(name_or_path, quantized=backend == 'onnx', intra_op_threads=threads)
+    if threads:
+        torch.set_num_threads(threads)
+    return Classifier.from_pretrained(name_or_path, local_files_only)
+
+
+def get_detector(violence_model=VIOLENCE_MODEL, gender_model=GENDER_MODEL, local_files_only=False,
+                 backend='torch', threads=None):
+    """Detector with its models loaded on first use and shared by the process"""
+    key = (violence_model, gender_model, local_files_only, backend, threads)
+    with _detectors_lock:
+        if key not in _detectors:
+            _detectors[key] = ViolenceDetector(
+                load_classifier(violence_model, backend, threads, local_files_only),
+                load_classifier(gender_model, backend, threads, local_files_only),
+            )
+        return _detectors[key]
+
+
+class SOSClient:
+    """Reports detections to the backend's REST API"""
+
+    def __init__(self, api_url='http://localhost:8000', timeout=10, session=None):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def create_sos(self, name, latitude, longitude, sos_type=1):
+        response = self.session.post(f'{self.api_url}/api/create-sos/', json={
+            'name': name,
+            'sos_type': sos_type,
+            'initial_latitude': latitude,
+            'initial_longitude': longitude,
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['sos_id']
+
+    def upload_frames(self, sos_id, frames, description='CCTV frame'):
+        files = [('images', (f'frame_{index + 1}.jpg', encode_jpeg(frame), 'image/jpeg')) for index, frame in enumerate(frames)]
+        data = [('sos_id', str(sos_id))] + [('descriptions', description)] * len(frames)
+        response = self.session.post(f'{self.api_url}/api/upload-sos-images/', files=files, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a CCTV clip for violence and raise an SOS')
+    parser.add_argument('video')
+    parser.add_argument('--api-url', default='http://localhost:8000')
+    parser.add_argument('--camera', default='cam001', help='SOS name to report under')
+    parser.add_argument('--latitude', type=float, default=22.554450)
+    parser.add_argument('--longitude', type=float, default=88.349850)
+    parser.add_argument('--frames', type=int, default=15, help='Frames sampled per clip')
+    parser.add_argument('--violence-model', default=VIOLENCE_MODEL, help='Model id or local directory')
+    parser.add_argument('--gender-model', default=GENDER_MODEL, help='Model id or local directory')
+    parser.add_argument('--offline', action='store_true', help='Only use models already on disk')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help='onnx/onnx-fp32 take exported directories as models')
+    parser.add_argument('--threads', type=int, help='CPU threads per forward pass')
+    args = parser.parse_args()
+
+    detector = get_detector(args.violence_model, args.gender_model, args.offline, args.backend, args.threads)
+    detection = detector.detect_frames(read_frames(args.video, args.frames))
+    print(f'gender: {detection.gender} {detection.gender_labels}')
+    if detection.gender != detector.target_gender:
+        print('females not detected, exiting')
+        return
+    print(f'violence: {detection.violence_labels}')
+    if detection.violent:
+        print('violence detected, sending frames to server')
+        client = SOSClient(args.api_url)
+        sos_id = client.create_sos(args.camera, args.latitude, args.longitude)
+        client.upload_frames(sos_id, detection.frames)
+        print(f'reported as SOS {sos_id}')
+
+
+if __name__ == '__main__':
+    main()